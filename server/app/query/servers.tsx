@@ -19,6 +19,7 @@ export enum Status {
   COMPILING = "COMPILING",
   WAITING_TO_START = "WAITING_TO_START",
   IN_PROGRESS = "IN_PROGRESS",
+  READY = "READY",
   COMPLETE = "COMPLETE",
   KILLED = "KILLED",
   NOT_FOUND = "NOT_FOUND",
@@ -173,51 +174,63 @@ export class RemoteServer {
     return new WebSocket(this.statsWebSocketURL(id));
   }
 
+  protected parseLogRecord(record: string): ServerLog[] {
+    try {
+      const logValue = JSON.parse(record);
+      // command output is logged in batches, one line per line of message
+      return logValue.record.message.split("\n").map((logLine: string) => ({
+        remoteServer: this,
+        logLine: logLine,
+        timestamp: logValue.record.time.timestamp,
+      }));
+    } catch (e) {
+      return [
+        {
+          remoteServer: this,
+          logLine: record,
+          timestamp: Date.now(),
+        },
+      ];
+    }
+  }
+
   openLogSocket(
     id: string,
     setLogs: React.Dispatch<React.SetStateAction<ServerLog[]>>,
   ): WebSocket {
     const ws = this.logsSocket(id);
     ws.onmessage = (event) => {
-      let newLog: ServerLog;
-      try {
-        const logValue = JSON.parse(event.data);
-        newLog = {
-          remoteServer: this,
-          logLine: logValue.record.message,
-          timestamp: logValue.record.time.timestamp,
-        };
-      } catch (e) {
-        newLog = {
-          remoteServer: this,
-          logLine: event.data,
-          timestamp: Date.now(),
-        };
-      }
+      // each frame is a batch of records, one per line
+      const newLogs: ServerLog[] = event.data
+        .split("\n")
+        .filter((record: string) => record.length > 0)
+        .flatMap((record: string) => this.parseLogRecord(record));
 
       // only retain last 10,000 logs
       const maxNumLogs = 10000;
-      setLogs((prevLogs) => {
-        if (
-          prevLogs.length === 0 ||
-          newLog.timestamp >= prevLogs[prevLogs.length - 1].timestamp
-        ) {
-          // most the time, we put the new log at the end of the array
-          return [...prevLogs.slice(-maxNumLogs), newLog];
-        } else {
-          // if the timestamp is out of order, e.g., less than the
-          // end of the array, we put it in the right location
-          const lastPreviousLogIndex = prevLogs.findLastIndex(
-            (log) => log.timestamp < newLog.timestamp,
-          );
-
-          return [
-            ...prevLogs.slice(-maxNumLogs, lastPreviousLogIndex + 1),
-            newLog,
-            ...prevLogs.slice(lastPreviousLogIndex - 1),
-          ];
-        }
-      });
+      for (const newLog of newLogs) {
+        setLogs((prevLogs) => {
+          if (
+            prevLogs.length === 0 ||
+            newLog.timestamp >= prevLogs[prevLogs.length - 1].timestamp
+          ) {
+            // most the time, we put the new log at the end of the array
+            return [...prevLogs.slice(-maxNumLogs), newLog];
+          } else {
+            // if the timestamp is out of order, e.g., less than the
+            // end of the array, we put it in the right location
+            const lastPreviousLogIndex = prevLogs.findLastIndex(
+              (log) => log.timestamp < newLog.timestamp,
+            );
+
+            return [
+              ...prevLogs.slice(-maxNumLogs, lastPreviousLogIndex + 1),
+              newLog,
+              ...prevLogs.slice(lastPreviousLogIndex - 1),
+            ];
+          }
+        });
+      }
     };
     ws.onclose = (event) => {
       console.log(
@@ -239,6 +239,7 @@ export type Database = {
         | "COMPILING"
         | "WAITING_TO_START"
         | "IN_PROGRESS"
+        | "READY"
         | "COMPLETE"
         | "KILLED"
         | "NOT_FOUND"
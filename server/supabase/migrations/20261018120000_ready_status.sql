@@ -0,0 +1 @@
+alter type status add value 'READY' after 'IN_PROGRESS';
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric.ec import (
+    ECDSA,
+    EllipticCurvePrivateKey,
+    EllipticCurvePublicKey,
+)
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from .helpers import Helper, Role
+from .query.status import Status
+from .settings import get_settings
+
+SIGNATURE_HEADER = "X-Draft-Signature"
+# callbacks older than this are rejected, so they can't be replayed later
+MAX_CALLBACK_AGE_SECONDS = 300
+
+
+def load_private_key(private_key_pem_path: Path) -> EllipticCurvePrivateKey:
+    with private_key_pem_path.open("rb") as f:
+        private_key = load_pem_private_key(f.read(), password=None)
+    assert isinstance(private_key, EllipticCurvePrivateKey)
+    return private_key
+
+
+def sign(private_key: EllipticCurvePrivateKey, body: bytes) -> str:
+    signature = private_key.sign(body, ECDSA(hashes.SHA256()))
+    return base64.b64encode(signature).decode("ascii")
+
+
+def verify(public_key: EllipticCurvePublicKey, body: bytes, signature: str) -> bool:
+    try:
+        public_key.verify(base64.b64decode(signature), body, ECDSA(hashes.SHA256()))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class StatusCallback:
+    """A status transition of a query on a helper, pushed to the coordinator."""
+
+    query_id: str
+    role: Role
+    status: Status
+    timestamp: float
+
+    def to_body(self) -> bytes:
+        return json.dumps(
+            {
+                "query_id": self.query_id,
+                "role": self.role.value,
+                "status": self.status.name,
+                "timestamp": self.timestamp,
+            }
+        ).encode("utf8")
+
+    @classmethod
+    def from_body(cls, body: bytes) -> StatusCallback:
+        """Raises ValueError (or KeyError) if body isn't a valid callback."""
+        data = json.loads(body)
+        return cls(
+            query_id=str(data["query_id"]),
+            role=Role(data["role"]),
+            status=Status[data["status"]],
+            timestamp=float(data["timestamp"]),
+        )
+
+
+@dataclass
+class HelperStatusBoard:
+    """
+    HelperStatusBoard holds the latest status pushed by each helper for each
+    query, so that the coordinator can wait for a change without polling.
+    The statuses of up to max_queries queries are kept.
+    """
+
+    max_queries: int = 1024
+    _statuses: OrderedDict[str, dict[Role, Status]] = field(
+        init=False, default_factory=OrderedDict, repr=False
+    )
+    _versions: dict[str, int] = field(init=False, default_factory=dict, repr=False)
+    _condition: threading.Condition = field(
+        init=False, default_factory=threading.Condition, repr=False
+    )
+
+    def update(self, callback: StatusCallback) -> bool:
+        """Returns False if the status is not newer than the one already held."""
+        with self._condition:
+            statuses = self._statuses.setdefault(callback.query_id, {})
+            self._statuses.move_to_end(callback.query_id)
+            if callback.status <= statuses.get(callback.role, Status.UNKNOWN):
+                return False
+            statuses[callback.role] = callback.status
+            self._versions[callback.query_id] = (
+                self._versions.get(callback.query_id, 0) + 1
+            )
+            while len(self._statuses) > self.max_queries:
+                query_id, _ = self._statuses.popitem(last=False)
+                self._versions.pop(query_id, None)
+            self._condition.notify_all()
+            return True
+
+    def statuses(self, query_id: str) -> dict[Role, Status]:
+        with self._condition:
+            return dict(self._statuses.get(query_id, {}))
+
+    def version(self, query_id: str) -> int:
+        with self._condition:
+            return self._versions.get(query_id, 0)
+
+    def wait_for_change(
+        self,
+        query_id: str,
+        version: int,
+        timeout: float,
+        stopped: Optional[threading.Event] = None,
+    ) -> bool:
+        """
+        Blocks until the statuses of query_id change from version, returning
+        False if timeout passes (or stopped is set) first.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._versions.get(query_id, 0) != version
+                or (stopped is not None and stopped.is_set()),
+                timeout=timeout,
+            ) and not (stopped is not None and stopped.is_set())
+
+    def notify_all(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
+@lru_cache
+def get_helper_status_board() -> HelperStatusBoard:
+    return HelperStatusBoard()
+
+
+@dataclass
+class StatusCallbackSender:
+    """
+    StatusCallbackSender pushes the status transitions of queries on this
+    helper to the coordinator, signed with this helper's private key.
+
+    Callbacks are sent in order, by a single background thread, so that
+    setting a status never waits on the network. They go over the coordinator's
+    pooled HelperClient, which retries them, and counts them in its stats.
+    """
+
+    role: Role
+    coordinator: Helper
+    private_key: EllipticCurvePrivateKey = field(repr=False)
+    _executor: ThreadPoolExecutor = field(
+        init=False,
+        default_factory=lambda: ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="status-callback"
+        ),
+        repr=False,
+    )
+
+    def send(self, query_id: str, status: Status):
+        callback = StatusCallback(
+            query_id=query_id, role=self.role, status=status, timestamp=time.time()
+        )
+        self._executor.submit(self._post, callback)
+
+    def _post(self, callback: StatusCallback):
+        body = callback.to_body()
+        try:
+            response = self.coordinator.client.post(
+                self.coordinator.status_callback_url(),
+                content=body,
+                headers={
+                    SIGNATURE_HEADER: sign(self.private_key, body),
+                    "Content-Type": "application/json",
+                },
+            )
+        except httpx.HTTPError as e:
+            # the coordinator falls back to polling, so this isn't fatal
+            get_settings().logger.warning(f"Failed to send {callback}: {e}")
+            return
+        if response.is_error:
+            get_settings().logger.warning(
+                f"Coordinator rejected {callback}: {response.status_code}"
+            )
+
+
+@lru_cache
+def get_status_callback_sender() -> Optional[StatusCallbackSender]:
+    """Returns None on the coordinator, or if there is no private key to sign with."""
+    settings = get_settings()
+    if settings.role == Role.COORDINATOR:
+        return None
+    private_key_path = settings.callback_private_key_path
+    if not private_key_path.exists():
+        # the coordinator still polls for status changes, just less promptly
+        settings.logger.warning(
+            f"No private key at {private_key_path}, status changes won't be pushed."
+        )
+        return None
+    return StatusCallbackSender(
+        role=settings.role,
+        coordinator=settings.helpers[Role.COORDINATOR],
+        private_key=load_private_key(private_key_path),
+    )
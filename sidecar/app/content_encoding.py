@@ -0,0 +1,52 @@
+import zlib
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# fast levels, since logs compress well anyway and downloads are CPU bound
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+
+def available_encodings() -> list[str]:
+    """Supported content encodings, in order of preference."""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Returns the preferred encoding the client accepts, or None for identity.
+    Quality values are only used to exclude an encoding (q=0).
+    """
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in available_encodings():
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def encode_chunks(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        # wbits=31 writes a gzip header and trailer
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
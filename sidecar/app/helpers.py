@@ -1,8 +1,14 @@
+import importlib.util
+import random
+import threading
+import time
 import tomllib
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from enum import IntEnum
 from json import JSONDecodeError
 from pathlib import Path
+from typing import Callable, Optional
 from urllib.parse import ParseResult, urlparse, urlunparse
 
 import httpx
@@ -19,12 +25,121 @@ class Role(IntEnum):
     HELPER_3 = 3
 
 
+# requests between sidecars are small, so fail fast and retry instead
+REQUEST_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.2
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+# the longest broadcast blocks for, however many helpers are unreachable
+BROADCAST_DEADLINE_SECONDS = 10.0
+
+
+@dataclass
+class HelperClient:
+    """
+    HelperClient is a long lived, connection pooled client for the requests
+    sent to one helper, so they share a handshake rather than paying for one each.
+    HTTP/2 is used if h2 is installed.
+
+    Transport errors, and 502, 503 and 504 responses, are retried up to
+    max_retries times, after a jittered exponential backoff.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    max_retries: int = MAX_RETRIES
+    retry_backoff: float = RETRY_BACKOFF_SECONDS
+    requests: int = field(init=False, default=0)
+    failures: int = field(init=False, default=0)
+    retries: int = field(init=False, default=0)
+    connections: int = field(init=False, default=0)
+    total_latency_seconds: float = field(init=False, default=0)
+    max_latency_seconds: float = field(init=False, default=0)
+    _client: Optional[httpx.Client] = field(init=False, default=None, repr=False)
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    http2=importlib.util.find_spec("h2") is not None,
+                    timeout=REQUEST_TIMEOUT,
+                )
+            return self._client
+
+    def _trace(self, event_name: str, _info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections += 1
+
+    def _record(self, latency: float, failed: bool):
+        with self._lock:
+            self.requests += 1
+            self.failures += failed
+            self.total_latency_seconds += latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Raises httpx.RequestError if the last retry fails to get a response."""
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.client.request(
+                    method, url, extensions={"trace": self._trace}, **kwargs
+                )
+            except httpx.TransportError:
+                self._record(time.perf_counter() - start, failed=True)
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                retry = response.status_code in RETRY_STATUS_CODES
+                self._record(time.perf_counter() - start, failed=retry)
+                if not retry or attempt >= self.max_retries:
+                    return response
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(random.uniform(0, self.retry_backoff * 2**attempt))
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "retries": self.retries,
+                "connections": self.connections,
+                "average_latency_seconds": (
+                    self.total_latency_seconds / self.requests if self.requests else 0
+                ),
+                "max_latency_seconds": self.max_latency_seconds,
+            }
+
+
 @dataclass
 class Helper:
     role: Role
     helper_url: ParseResult
     sidecar_url: ParseResult
     public_key: EllipticCurvePublicKey
+    client: HelperClient = field(
+        default_factory=HelperClient, repr=False, compare=False
+    )
 
     def query_status_url(self, query_id: str) -> str:
         return str(
@@ -53,9 +168,23 @@ class Helper:
             )
         )
 
+    def status_callback_url(self) -> str:
+        return str(
+            urlunparse(
+                self.sidecar_url._replace(scheme="https", path="/callbacks/status"),
+            )
+        )
+
+    def build_url(self, commit_hash: str) -> str:
+        return str(
+            urlunparse(
+                self.sidecar_url._replace(scheme="https", path=f"/build/{commit_hash}"),
+            )
+        )
+
     def get_current_query_status(self, query_id: str) -> Status:
         try:
-            r = httpx.get(self.query_status_url(query_id))
+            r = self.client.get(self.query_status_url(query_id))
         except httpx.RequestError:
             return Status.UNKNOWN
         try:
@@ -65,28 +194,65 @@ class Helper:
 
         return Status.from_json(j)
 
+    # the helper replies that the query is already complete, if it is,
+    # so there's no need to check its status first
     def kill_query(self, query_id: str) -> str:
-        status = self.get_current_query_status(query_id)
-        if status >= Status.COMPLETE:
-            return (
-                f"not sending kill signal. helper {self.role} "
-                f"already has status {status}"
-            )
-        r = httpx.post(self.query_kill_url(query_id))
+        try:
+            r = self.client.post(self.query_kill_url(query_id))
+        except httpx.RequestError as e:
+            return f"failed to send kill signal to helper {self.role}: {e}"
         return f"sent kill signal for query({query_id}) to helper {self.role}: {r.text}"
 
     def finish_query(self, query_id: str) -> str:
-        status = self.get_current_query_status(query_id)
-        if status >= Status.COMPLETE:
-            return (
-                f"not sending finish signal. helper {self.role} "
-                f"already has status {status}"
-            )
-        r = httpx.post(self.query_finish_url(query_id))
+        try:
+            r = self.client.post(self.query_finish_url(query_id))
+        except httpx.RequestError as e:
+            return f"failed to send finish signal to helper {self.role}: {e}"
         return (
             f"sent finish signal for query({query_id}) to helper {self.role}: {r.text}"
         )
 
+    def start_build(self, commit_hash: str, data: dict) -> str:
+        try:
+            r = self.client.post(self.build_url(commit_hash), data=data)
+        except httpx.RequestError as e:
+            return f"failed to start build of {commit_hash} on helper {self.role}: {e}"
+        return f"started build of {commit_hash} on helper {self.role}: {r.text}"
+
+
+def broadcast(
+    helpers: list[Helper],
+    send: Callable[[Helper], str],
+    deadline: float = BROADCAST_DEADLINE_SECONDS,
+) -> dict[Role, str]:
+    """
+    Calls send for every helper at once, and returns the response from each
+    as soon as they have all responded, or deadline seconds have passed.
+    """
+    if not helpers:
+        return {}
+    # not a context manager, which would wait for helpers past the deadline
+    # pylint: disable=consider-using-with
+    executor = ThreadPoolExecutor(
+        max_workers=len(helpers), thread_name_prefix="broadcast"
+    )
+    futures = {executor.submit(send, helper): helper for helper in helpers}
+    wait(futures, timeout=deadline)
+    executor.shutdown(wait=False)
+    responses = {}
+    for future, helper in futures.items():
+        if not future.done():
+            responses[
+                helper.role
+            ] = f"no response from helper {helper.role} within {deadline}s"
+        elif future.exception() is not None:
+            responses[
+                helper.role
+            ] = f"failed to signal helper {helper.role}: {future.exception()}"
+        else:
+            responses[helper.role] = future.result()
+    return responses
+
 
 def load_helpers_from_network_config(network_config_path: Path) -> dict[Role, Helper]:
     with network_config_path.open("rb") as f:
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from .query.status_store import SQLiteStatusStore, get_status_store
+from .settings import get_settings
+
+if TYPE_CHECKING:
+    from .query.base import QueryManager
+
+
+@dataclass
+class RetentionQuota:
+    max_bytes: Optional[int] = None
+    max_age_seconds: Optional[float] = None
+
+
+@dataclass
+class Artifact:
+    """The files of one query (or one test data file), which are deleted together."""
+
+    key: str
+    paths: list[Path]
+    size_bytes: int
+    mtime: float
+
+
+@dataclass
+class ArtifactClass:
+    """
+    ArtifactClass is a kind of file the sidecar writes and never deletes: the
+    files in directory matching pattern, grouped into artifacts by key.
+    """
+
+    name: str
+    directory: Path
+    pattern: str
+    quota: RetentionQuota
+    key: Callable[[Path], str] = lambda path: path.name
+
+    def artifacts(self) -> list[Artifact]:
+        artifacts: dict[str, Artifact] = {}
+        if not self.directory.exists():
+            return []
+        for path in self.directory.rglob(self.pattern):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if not path.is_file():
+                continue
+            key = self.key(path)
+            artifact = artifacts.setdefault(key, Artifact(key, [], 0, 0))
+            artifact.paths.append(path)
+            artifact.size_bytes += stat.st_size
+            artifact.mtime = max(artifact.mtime, stat.st_mtime)
+        return sorted(artifacts.values(), key=lambda artifact: artifact.mtime)
+
+    def delete(self, artifact: Artifact):
+        for path in artifact.paths:
+            path.unlink(missing_ok=True)
+
+
+@dataclass
+class StatusStoreClass(ArtifactClass):
+    """
+    The status histories in an SQLiteStatusStore (i.e., in directory/pattern),
+    which are deleted row by row, rather than by deleting files. Their sizes
+    are estimated, and freed pages are reused rather than returned to the OS.
+    """
+
+    store: SQLiteStatusStore = field(kw_only=True, repr=False)
+
+    def artifacts(self) -> list[Artifact]:
+        artifacts = [
+            Artifact(query_id, [], size_bytes, updated_at)
+            for query_id, updated_at, size_bytes in self.store.query_sizes()
+        ]
+        return sorted(artifacts, key=lambda artifact: artifact.mtime)
+
+    def delete(self, artifact: Artifact):
+        self.store.delete(artifact.key)
+
+
+@dataclass
+class ArtifactClassStats:
+    artifacts: int = 0
+    total_bytes: int = 0
+    evicted: int = 0
+    reclaimed_bytes: int = 0
+    skipped_in_use: int = 0
+
+
+def query_key(path: Path) -> str:
+    # e.g. <query_id>.log, <query_id>.log.idx, <query_id>.log.<end>.gz
+    return path.name.split(".", 1)[0]
+
+
+@dataclass
+class Janitor:
+    """
+    Janitor deletes the oldest artifacts of each class once they are older
+    than its max_age_seconds, or the class takes up more than its max_bytes.
+    Artifacts with a key which is in_use (i.e., of running or queued queries)
+    are never deleted, but still count towards max_bytes.
+    """
+
+    artifact_classes: list[ArtifactClass]
+    in_use: Callable[[], set[str]] = set
+    runs: int = field(init=False, default=0)
+    last_run_at: Optional[float] = field(init=False, default=None)
+    last_run_seconds: Optional[float] = field(init=False, default=None)
+    class_stats: dict[str, ArtifactClassStats] = field(init=False)
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    def __post_init__(self):
+        self.class_stats = {
+            artifact_class.name: ArtifactClassStats()
+            for artifact_class in self.artifact_classes
+        }
+
+    def run(self) -> list[Artifact]:
+        """Deletes the artifacts outside their quotas, and returns them."""
+        start = time.perf_counter()
+        evicted = []
+        with self._lock:
+            for artifact_class in self.artifact_classes:
+                evicted.extend(self._collect(artifact_class, time.time()))
+            self.runs += 1
+            self.last_run_at = time.time()
+            self.last_run_seconds = time.perf_counter() - start
+        return evicted
+
+    def _collect(self, artifact_class: ArtifactClass, now: float) -> list[Artifact]:
+        stats = self.class_stats[artifact_class.name]
+        quota = artifact_class.quota
+        artifacts = artifact_class.artifacts()
+        total_bytes = sum(artifact.size_bytes for artifact in artifacts)
+        # checked after listing, so a query started since is still kept
+        in_use = self.in_use()
+        evicted = []
+        for artifact in artifacts:  # oldest first
+            expired = (
+                quota.max_age_seconds is not None
+                and now - artifact.mtime > quota.max_age_seconds
+            )
+            over_quota = quota.max_bytes is not None and total_bytes > quota.max_bytes
+            if not expired and not over_quota:
+                break
+            if artifact.key in in_use:
+                stats.skipped_in_use += 1
+                continue
+            artifact_class.delete(artifact)
+            total_bytes -= artifact.size_bytes
+            stats.evicted += 1
+            stats.reclaimed_bytes += artifact.size_bytes
+            evicted.append(artifact)
+        stats.artifacts = len(artifacts) - len(evicted)
+        stats.total_bytes = total_bytes
+        return evicted
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "last_run_at": self.last_run_at,
+                "last_run_seconds": self.last_run_seconds,
+                "reclaimed_bytes": sum(
+                    stats.reclaimed_bytes for stats in self.class_stats.values()
+                ),
+                "classes": {
+                    artifact_class.name: {
+                        "max_bytes": artifact_class.quota.max_bytes,
+                        "max_age_seconds": artifact_class.quota.max_age_seconds,
+                        **vars(self.class_stats[artifact_class.name]),
+                    }
+                    for artifact_class in self.artifact_classes
+                },
+            }
+
+
+def queries_in_use(query_manager: QueryManager) -> set[str]:
+    """The query ids, and test data files, of the running and queued queries."""
+    queries = [
+        *list(query_manager.running_queries.values()),
+        *list(query_manager.queued_queries.values()),
+    ]
+    in_use = {query.query_id for query in queries}
+    for query in queries:
+        test_data_file = getattr(query, "test_data_file", None)
+        if test_data_file is not None:
+            in_use.add(test_data_file.name)
+    return in_use
+
+
+def status_class(quota: RetentionQuota) -> ArtifactClass:
+    settings = get_settings()
+    store = get_status_store()
+    if isinstance(store, SQLiteStatusStore):
+        return StatusStoreClass(
+            "status",
+            store.db_path.parent,
+            store.db_path.name,
+            quota,
+            store=store,
+        )
+    return ArtifactClass("status", settings.status_dir_path, "*", quota)
+
+
+@lru_cache
+def get_janitor() -> Janitor:
+    settings = get_settings()
+    return Janitor(
+        [
+            ArtifactClass(
+                "logs",
+                settings.log_dir_path,
+                "*",
+                RetentionQuota(
+                    settings.log_retention_max_bytes,
+                    settings.log_retention_max_age_seconds,
+                ),
+                key=query_key,
+            ),
+            status_class(
+                RetentionQuota(
+                    settings.status_retention_max_bytes,
+                    settings.status_retention_max_age_seconds,
+                )
+            ),
+            ArtifactClass(
+                "test_data",
+                settings.root_path / Path("ipa/test_data/input"),
+                "events-*.txt",
+                RetentionQuota(
+                    settings.test_data_retention_max_bytes,
+                    settings.test_data_retention_max_age_seconds,
+                ),
+            ),
+        ]
+    )
@@ -8,6 +8,7 @@ class Paths:
     repo_path: Path
     config_path: Path
     compiled_id: str
+    commit_hash: str
     _test_data_path: Optional[Path] = None
 
     @property
@@ -20,6 +21,16 @@ class Paths:
     def test_data_path(self, test_data_path: Path):
         self._test_data_path = test_data_path
 
+    @property
+    def worktree_path(self) -> Path:
+        return self.repo_path.parent / Path(
+            f"{self.repo_path.name}-worktrees/{self.commit_hash}"
+        )
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.worktree_path / Path("Cargo.toml")
+
     @property
     def target_path(self) -> Path:
         return self.repo_path / Path(f"target-{self.compiled_id}")
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from .log_segments import log_size, open_log
+
+# a checkpoint is kept every this many lines
+INDEX_INTERVAL_LINES = 1000
+# the level of a block which was indexed without one
+UNKNOWN_LEVEL = 1_000_000
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class Checkpoint(NamedTuple):
+    line: int
+    offset: int
+    timestamp: Optional[float]
+
+
+def record_timestamp(line: bytes) -> Optional[float]:
+    try:
+        return float(json.loads(line)["record"]["time"]["timestamp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def record_level(line: bytes) -> int:
+    """The level number of a serialized record, or 0 if it isn't one."""
+    try:
+        return int(json.loads(line)["record"]["level"]["no"])
+    except (ValueError, KeyError, TypeError):
+        return 0
+
+
+def index_file_path(log_file_path: Path) -> Path:
+    return log_file_path.with_name(f"{log_file_path.name}.idx")
+
+
+@dataclass
+class LogIndex:
+    """
+    LogIndex is a sparse index of a (serialized loguru) log file: the byte offset
+    and timestamp of every interval-th line. It lets a reader seek to a line,
+    or a time, by scanning at most interval lines, however large the log is.
+    It also keeps the highest level logged in each block of interval lines,
+    so a search for, e.g., errors only scans the blocks which have any.
+
+    The index is extended with the lines appended since it was last updated,
+    and saved next to the log file, so each line is only indexed once.
+    """
+
+    log_file_path: Path
+    interval: int = INDEX_INTERVAL_LINES
+    checkpoints: list[Checkpoint] = field(init=False, default_factory=list)
+    # the highest level in the block of lines starting at each checkpoint
+    levels: list[int] = field(init=False, default_factory=list)
+    # the number of whole lines indexed, and the offset just after them
+    lines: int = field(init=False, default=0)
+    indexed_offset: int = field(init=False, default=0)
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    def __post_init__(self):
+        self._load()
+
+    @property
+    def index_file_path(self) -> Path:
+        return index_file_path(self.log_file_path)
+
+    def _load(self):
+        if not self.index_file_path.exists():
+            return
+        levels: dict[int, int] = {}
+        with self.index_file_path.open("r", encoding="utf8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a partly written entry, which is written again by update
+                    break
+                if "lines" in entry:
+                    self.lines = entry["lines"]
+                    self.indexed_offset = entry["offset"]
+                elif "block" in entry:
+                    levels[entry["block"]] = entry["level"]
+                else:
+                    self.checkpoints.append(Checkpoint(**entry))
+        # blocks indexed before levels were are assumed to have every level
+        self.levels = [
+            levels.get(block, UNKNOWN_LEVEL) for block in range(len(self.checkpoints))
+        ]
+        if self.indexed_offset > self._log_size():
+            # the log was replaced, so the index is stale
+            self.checkpoints = []
+            self.levels = []
+            self.lines = 0
+            self.indexed_offset = 0
+            self.index_file_path.unlink()
+
+    def _log_size(self) -> int:
+        return log_size(self.log_file_path)
+
+    def update(self):
+        """Indexes the whole lines appended to the log since the last update."""
+        with self._lock:
+            if self._log_size() <= self.indexed_offset:
+                return
+            new_checkpoints = []
+            new_levels: dict[int, int] = {}
+            with open_log(self.log_file_path) as f:
+                f.seek(self.indexed_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    block, position = divmod(self.lines, self.interval)
+                    if position == 0:
+                        new_checkpoints.append(
+                            Checkpoint(
+                                self.lines, self.indexed_offset, record_timestamp(line)
+                            )
+                        )
+                        self.levels.append(-1)
+                    level = record_level(line)
+                    if level > self.levels[block]:
+                        self.levels[block] = new_levels[block] = level
+                    self.lines += 1
+                    self.indexed_offset += len(line)
+            self.checkpoints.extend(new_checkpoints)
+            with self.index_file_path.open("a", encoding="utf8") as f:
+                for checkpoint in new_checkpoints:
+                    f.write(json.dumps(checkpoint._asdict()) + "\n")
+                for block, level in new_levels.items():
+                    f.write(json.dumps({"block": block, "level": level}) + "\n")
+                f.write(
+                    json.dumps({"lines": self.lines, "offset": self.indexed_offset})
+                    + "\n"
+                )
+
+    def blocks(
+        self, start: int = 0, end: Optional[int] = None, min_level: int = 0
+    ) -> list[tuple[Checkpoint, int]]:
+        """
+        Returns the checkpoint and end offset of each block of lines which
+        overlaps [start, end), and has a line logged at min_level or above.
+        """
+        self.update()
+        with self._lock:
+            end = self.indexed_offset if end is None else min(end, self.indexed_offset)
+            first = bisect.bisect_right([c.offset for c in self.checkpoints], start)
+            blocks = []
+            for i in range(max(first - 1, 0), len(self.checkpoints)):
+                checkpoint = self.checkpoints[i]
+                if checkpoint.offset >= end:
+                    break
+                if self.levels[i] < min_level:
+                    continue
+                block_end = (
+                    self.checkpoints[i + 1].offset
+                    if i + 1 < len(self.checkpoints)
+                    else self.indexed_offset
+                )
+                blocks.append((checkpoint, min(block_end, end)))
+            return blocks
+
+    def offset_for_line(self, line: int) -> int:
+        """
+        Returns the offset of line (counting from 0), or the offset after the
+        last whole line if the log has fewer lines.
+        """
+        self.update()
+        with self._lock:
+            i = bisect.bisect_right([c.line for c in self.checkpoints], line) - 1
+            if i < 0:
+                return 0
+            checkpoint = self.checkpoints[i]
+            end = self.indexed_offset
+        offset = checkpoint.offset
+        with open_log(self.log_file_path) as f:
+            f.seek(offset)
+            for _ in range(line - checkpoint.line):
+                if offset >= end:
+                    break
+                offset += len(f.readline())
+        return min(offset, end)
+
+    def offset_for_time(self, timestamp: float) -> int:
+        """
+        Returns the offset of the first line logged at or after timestamp,
+        or the offset after the last whole line if there is none.
+        """
+        self.update()
+        with self._lock:
+            timed = [c for c in self.checkpoints if c.timestamp is not None]
+            i = bisect.bisect_left([c.timestamp for c in timed], timestamp) - 1
+            offset = timed[i].offset if i >= 0 else 0
+            end = self.indexed_offset
+        with open_log(self.log_file_path) as f:
+            f.seek(offset)
+            while offset < end:
+                line = f.readline()
+                line_timestamp = record_timestamp(line)
+                if line_timestamp is not None and line_timestamp >= timestamp:
+                    break
+                offset += len(line)
+        return min(offset, end)
+
+    def resolve(
+        self,
+        offset: Optional[int] = None,
+        line: Optional[int] = None,
+        since: Optional[float] = None,
+    ) -> int:
+        """Returns the offset to start reading from: at offset, line or since."""
+        if offset is not None:
+            return offset
+        if line is not None:
+            return self.offset_for_line(line)
+        if since is not None:
+            return self.offset_for_time(since)
+        return 0
+
+
+@lru_cache(maxsize=256)
+def get_log_index(log_file_path: Path) -> LogIndex:
+    return LogIndex(log_file_path)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator
+from typing import NamedTuple, Optional
+
+from .log_index import LogIndex
+from .log_segments import open_log
+
+
+class LogMatch(NamedTuple):
+    line: int
+    offset: int
+    time: Optional[float]
+    level: Optional[str]
+    message: str
+
+
+def parse_record(line: bytes) -> tuple[Optional[float], Optional[str], int, str]:
+    """
+    Returns the timestamp, level name, level number and message of a serialized
+    record. A line which isn't one is returned as the message, at level 0.
+    """
+    try:
+        record = json.loads(line)["record"]
+        return (
+            float(record["time"]["timestamp"]),
+            record["level"]["name"],
+            int(record["level"]["no"]),
+            record["message"],
+        )
+    except (ValueError, KeyError, TypeError):
+        return None, None, 0, line.decode("utf8", errors="replace").rstrip("\n")
+
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+def search_log(
+    index: LogIndex,
+    start: int = 0,
+    end: Optional[int] = None,
+    min_level: int = 0,
+    text: Optional[str] = None,
+) -> Iterator[LogMatch]:
+    """
+    Yields the records in the indexed log, from offset start up to end, which
+    were logged at min_level or above, and whose message contains text.
+    Blocks of lines without a record at min_level are skipped, unread.
+    """
+    with open_log(index.log_file_path) as f:
+        for checkpoint, block_end in index.blocks(start, end, min_level):
+            # read from the start of the block, to count lines
+            f.seek(checkpoint.offset)
+            line_number, offset = checkpoint.line, checkpoint.offset
+            while offset < block_end:
+                line = f.readline()
+                if not line:
+                    break
+                if offset >= start:
+                    timestamp, level, level_no, message = parse_record(line)
+                    if level_no >= min_level and (text is None or text in message):
+                        yield LogMatch(line_number, offset, timestamp, level, message)
+                line_number += 1
+                offset += len(line)
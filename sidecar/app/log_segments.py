@@ -0,0 +1,240 @@
+"""
+A log file can be rotated into segments, so that all but the live file are
+compressed. A segment is named after the log file and the offset its content
+ends at, e.g. `<query_id>.log.0000000067108864.gz` holds bytes [0, 64MiB) of
+`<query_id>.log`, and the live file holds the bytes from the end of the last
+segment. Readers see one log, at the same offsets whether or not it's rotated.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import os
+import re
+import shutil
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+COPY_BUFFER_BYTES = 1024 * 1024
+
+
+class Segment(NamedTuple):
+    path: Path
+    start: int
+    end: Optional[int]  # None for the live file, which is still growing
+
+    @property
+    def compressed(self) -> bool:
+        return self.path.suffix in COMPRESSED_SUFFIXES
+
+
+def segment_path(log_file_path: Path, end: int) -> Path:
+    return log_file_path.with_name(f"{log_file_path.name}.{end:016d}")
+
+
+def list_segments(log_file_path: Path) -> list[Segment]:
+    """The rotated segments of the log, in order, followed by the live file."""
+    pattern = re.compile(re.escape(log_file_path.name) + r"\.(\d{16})(\.gz|\.zst)?$")
+    ends: dict[int, Path] = {}
+    try:
+        names = os.listdir(log_file_path.parent)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        match = pattern.match(name)
+        if match is None:
+            continue
+        end = int(match.group(1))
+        # prefer the uncompressed segment, while it's being compressed
+        if end not in ends or match.group(2) is None:
+            ends[end] = log_file_path.with_name(name)
+    segments = []
+    start = 0
+    for end in sorted(ends):
+        segments.append(Segment(ends[end], start, end))
+        start = end
+    segments.append(Segment(log_file_path, start, None))
+    return segments
+
+
+def log_size(log_file_path: Path) -> int:
+    """The size of the whole log, uncompressed."""
+    live = list_segments(log_file_path)[-1]
+    try:
+        return live.start + live.path.stat().st_size
+    except FileNotFoundError:
+        return live.start
+
+
+def open_segment(segment: Segment) -> io.RawIOBase:
+    if segment.path.suffix == ".gz":
+        return gzip.open(segment.path, "rb")
+    if segment.path.suffix == ".zst":
+        if zstandard is None:
+            raise OSError(f"zstandard is needed to read {segment.path}")
+        return zstandard.open(segment.path, "rb")
+    return segment.path.open("rb")
+
+
+class SegmentedLogReader(io.RawIOBase):
+    """
+    Reads a log across its (compressed) segments and live file, as if it were
+    one file. Seeking into a compressed segment decompresses it from its start,
+    so segments are kept small enough for that to be cheap.
+    """
+
+    def __init__(self, log_file_path: Path):
+        super().__init__()
+        self.log_file_path = log_file_path
+        self.position = 0
+        self._segments = list_segments(log_file_path)
+        self._segment: Optional[Segment] = None
+        self._file: Optional[io.RawIOBase] = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += log_size(self.log_file_path)
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def _find_segment(self) -> Optional[Segment]:
+        for segment in self._segments:
+            if segment.end is None or self.position < segment.end:
+                return segment
+        return None
+
+    def _open(self, segment: Segment) -> bool:
+        """Returns False if there's no file to read at position (yet)."""
+        self._close_file()
+        try:
+            self._file = open_segment(segment)
+        except FileNotFoundError:
+            # compressed, or rotated, since the segments were listed
+            self._segments = list_segments(self.log_file_path)
+            segment = self._find_segment()
+            try:
+                self._file = open_segment(segment)
+            except FileNotFoundError:
+                # the live file, before it's written to
+                return False
+        self._segment = segment
+        self._file.seek(self.position - segment.start)
+        return True
+
+    def readinto(self, buffer) -> int:
+        for refreshed in (False, True):
+            segment = self._find_segment()
+            if segment is None:
+                return 0
+            if self._file is None or segment != self._segment:
+                if not self._open(segment):
+                    return 0
+            elif self._file.tell() != self.position - segment.start:
+                self._file.seek(self.position - segment.start)
+            size = len(buffer)
+            if segment.end is not None:
+                size = min(size, segment.end - self.position)
+            n = self._file.readinto(memoryview(buffer)[:size])
+            if n:
+                self.position += n
+                return n
+            if segment.end is not None and not refreshed:
+                # a segment shorter than its name says, so list them again
+                self._segments = list_segments(self.log_file_path)
+            elif not refreshed:
+                # at the end of the live file, which may have been rotated
+                segments = list_segments(self.log_file_path)
+                if segments == self._segments:
+                    return 0
+                self._segments = segments
+        return 0
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._segment = None
+
+    def close(self):
+        self._close_file()
+        super().close()
+
+
+def open_log(
+    log_file_path: Path, buffer_size: int = io.DEFAULT_BUFFER_SIZE
+) -> io.BufferedReader:
+    """Opens the whole log for reading, across its segments."""
+    return io.BufferedReader(SegmentedLogReader(log_file_path), buffer_size)
+
+
+def iter_log_bytes(
+    log_file_path: Path, start: int, end: int, chunk_bytes: int
+) -> Iterator[bytes]:
+    """Reads bytes [start, end) of the log, in chunks of up to chunk_bytes."""
+    with open_log(log_file_path) as f:
+        f.seek(start)
+        while start < end:
+            data = f.read(min(chunk_bytes, end - start))
+            if not data:
+                return
+            start += len(data)
+            yield data
+
+
+def compress_segment(path: Path, compression: str) -> Path:
+    """Compresses a rotated segment, replacing it with the compressed file."""
+    suffix = ".zst" if compression == "zstd" and zstandard is not None else ".gz"
+    compressed_path = path.with_name(path.name + suffix)
+    tmp_path = path.with_name(compressed_path.name + ".tmp")
+    with path.open("rb") as src:
+        if suffix == ".zst":
+            with zstandard.open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_BYTES)
+        else:
+            with gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_BYTES)
+    tmp_path.rename(compressed_path)
+    path.unlink()
+    return compressed_path
+
+
+def rotate(log_file_path: Path) -> Optional[Path]:
+    """
+    Renames the live file to a segment, so the next write starts a new live file.
+    Returns the segment, or None if the live file is empty.
+    """
+    live = list_segments(log_file_path)[-1]
+    try:
+        size = log_file_path.stat().st_size
+    except FileNotFoundError:
+        return None
+    if size == 0:
+        return None
+    path = segment_path(log_file_path, live.start + size)
+    log_file_path.rename(path)
+    return path
+
+
+def delete_log(log_file_path: Path):
+    """Deletes the live file, and every segment of the log."""
+    for segment in list_segments(log_file_path):
+        segment.path.unlink(missing_ok=True)
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, NamedTuple, Optional
+
+from .log_segments import log_size, open_log
+
+# frames sent to websockets are batches of up to this many bytes of whole lines
+READ_CHUNK_BYTES = 64 * 1024
+# the tailer wakes on every write, but also rechecks if the query is still running
+RECHECK_SECONDS = 1.0
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVE_SELF = 0x00000800
+IN_DELETE_SELF = 0x00000400
+
+
+def _read_lines(
+    f: BinaryIO, offset: int, end: Optional[int], chunk_bytes: int
+) -> bytes:
+    size = chunk_bytes if end is None else min(end - offset, chunk_bytes)
+    if size <= 0:
+        return b""
+    f.seek(offset)
+    data = f.read(size)
+    newline = data.rfind(b"\n")
+    if newline == -1:
+        return data if len(data) == chunk_bytes else b""
+    return data[: newline + 1]
+
+
+def read_lines(
+    file_path: Path,
+    offset: int,
+    end: Optional[int] = None,
+    chunk_bytes: int = READ_CHUNK_BYTES,
+) -> bytes:
+    """
+    Returns the whole lines in the log file_path from offset, up to end (or the
+    end of the log), reading at most chunk_bytes, across its segments. A line
+    longer than that is returned in pieces.
+    """
+    with open_log(file_path) as f:
+        return _read_lines(f, offset, end, chunk_bytes)
+
+
+def iter_file_chunks(
+    file_path: Path,
+    offset: int = 0,
+    end: Optional[int] = None,
+    chunk_bytes: int = READ_CHUNK_BYTES,
+) -> Iterator[bytes]:
+    """
+    Reads the log file_path in chunks of whole lines, through one reader,
+    so a compressed segment is only decompressed once.
+    """
+    with open_log(file_path) as f:
+        while end is None or offset < end:
+            data = _read_lines(f, offset, end, chunk_bytes)
+            if not data:
+                return
+            offset += len(data)
+            yield data
+
+
+def line_boundary(file_path: Path) -> int:
+    """Returns the offset just after the last whole line in the log file_path."""
+    size = log_size(file_path)
+    start = max(size - READ_CHUNK_BYTES, 0)
+    with open_log(file_path) as f:
+        f.seek(start)
+        data = f.read(size - start)
+    newline = data.rfind(b"\n")
+    return start + newline + 1 if newline != -1 else start
+
+
+async def read_file_batches(
+    file_path: Path, offset: int = 0, end: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """Reads the log file_path in batches of whole lines, off the event loop."""
+    f = await asyncio.to_thread(open_log, file_path)
+    try:
+        while end is None or offset < end:
+            data = await asyncio.to_thread(
+                _read_lines, f, offset, end, READ_CHUNK_BYTES
+            )
+            if not data:
+                return
+            offset += len(data)
+            yield data
+    finally:
+        f.close()
+
+
+@dataclass
+class FileWatcher:
+    """
+    FileWatcher waits for a file to be written to. It uses inotify where it's
+    available (i.e., on Linux), and otherwise falls back to polling every
+    poll_interval seconds. When the file is rotated, the new file is watched.
+    """
+
+    file_path: Path
+    poll_interval: float = 0.1
+    _fd: Optional[int] = field(init=False, default=None, repr=False)
+    _inode: Optional[int] = field(init=False, default=None, repr=False)
+
+    def __post_init__(self):
+        self._watch()
+
+    def _watch(self):
+        try:
+            self._inode = self.file_path.stat().st_ino
+            self._fd = inotify_watch(
+                self.file_path,
+                IN_MODIFY | IN_CLOSE_WRITE | IN_MOVE_SELF | IN_DELETE_SELF,
+            )
+        except OSError:
+            self._fd = None
+
+    def _rewatch_if_replaced(self):
+        try:
+            inode = self.file_path.stat().st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._inode:
+            self.close()
+            self._watch()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    async def wait(self, timeout: float):
+        """Returns once the file may have changed, or timeout seconds pass."""
+        if self._fd is None:
+            await asyncio.sleep(min(timeout, self.poll_interval))
+            self._rewatch_if_replaced()
+            return
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        loop.add_reader(self._fd, event.set)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(self._fd)
+        self._drain()
+        self._rewatch_if_replaced()
+
+    def _drain(self):
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+@lru_cache
+def _libc() -> ctypes.CDLL:
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        raise OSError("libc not found")
+    return ctypes.CDLL(libc_name, use_errno=True)
+
+
+def inotify_watch(file_path: Path, mask: int) -> int:
+    """
+    Returns a non blocking inotify file descriptor watching file_path.
+    Raises OSError if inotify isn't available.
+    """
+    libc = _libc()
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError("inotify not available")
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    if libc.inotify_add_watch(fd, os.fsencode(file_path), mask) < 0:
+        errno = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(errno, f"inotify_add_watch failed for {file_path}")
+    return fd
+
+
+class LogBatch(NamedTuple):
+    start: int
+    end: int
+    data: bytes
+
+
+@dataclass
+class LogTailer:
+    """
+    LogTailer follows the log file of one running query, from the end of the
+    file when it starts, until the query stops running. New lines are broadcast
+    to every subscriber through a buffer of the last max_batches batches.
+    A subscriber which joins late, or falls behind the buffer, reads what it
+    missed from the file instead.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    log_file_path: Path
+    running: Callable[[], bool] = field(repr=False)
+    max_batches: int = 256
+    offset: int = field(init=False, default=0)
+    finished: bool = field(init=False, default=False)
+    subscribers: int = field(init=False, default=0)
+    _batches: deque[LogBatch] = field(init=False, repr=False)
+    _condition: asyncio.Condition = field(
+        init=False, default_factory=asyncio.Condition, repr=False
+    )
+    _task: Optional[asyncio.Task] = field(init=False, default=None, repr=False)
+
+    def __post_init__(self):
+        self._batches = deque(maxlen=self.max_batches)
+
+    async def start(self):
+        offset = await asyncio.to_thread(line_boundary, self.log_file_path)
+        async with self._condition:
+            self.offset = offset
+            self._condition.notify_all()
+        self._task = asyncio.create_task(self._follow())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _follow(self):
+        watcher = FileWatcher(self.log_file_path)
+        try:
+            while True:
+                # check before reading, so the last lines are always read
+                running = self.running()
+                async for data in read_file_batches(self.log_file_path, self.offset):
+                    end = self.offset + len(data)
+                    async with self._condition:
+                        self._batches.append(LogBatch(self.offset, end, data))
+                        self.offset = end
+                        self._condition.notify_all()
+                if not running:
+                    break
+                await watcher.wait(RECHECK_SECONDS)
+        finally:
+            watcher.close()
+            self.finished = True
+            async with self._condition:
+                self._condition.notify_all()
+
+    async def batches(self, offset: int = 0) -> AsyncIterator[bytes]:
+        """
+        Yields the lines of the log file from offset, in batches, until the
+        query stops running.
+        """
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(
+                    lambda: offset < self.offset or self.finished
+                )
+                if offset >= self.offset:
+                    return
+                end = self.offset
+                # the offset may be within a batch, e.g. when resuming by line
+                batch = next(
+                    (
+                        batch
+                        for batch in self._batches
+                        if batch.start <= offset < batch.end
+                    ),
+                    None,
+                )
+                if batch is None and self._batches:
+                    # before the buffer, which covers the rest up to self.offset
+                    end = self._batches[0].start
+            if batch is not None:
+                data = batch.data[offset - batch.start :]
+                offset = batch.end
+                yield data
+                continue
+            async for data in read_file_batches(self.log_file_path, offset, end):
+                offset += len(data)
+                yield data
+
+
+@dataclass
+class LogTailers:
+    """LogTailers shares one LogTailer between every subscriber to a query's log."""
+
+    _tailers: dict[str, LogTailer] = field(init=False, default_factory=dict, repr=False)
+
+    @asynccontextmanager
+    async def subscribe(
+        self, query_id: str, log_file_path: Path, running: Callable[[], bool]
+    ) -> AsyncIterator[LogTailer]:
+        tailer = self._tailers.get(query_id)
+        new = tailer is None
+        if new:
+            # registered before starting, so concurrent subscribers share it
+            tailer = LogTailer(log_file_path, running)
+            self._tailers[query_id] = tailer
+        tailer.subscribers += 1
+        try:
+            if new:
+                await tailer.start()
+            yield tailer
+        finally:
+            tailer.subscribers -= 1
+            if tailer.subscribers == 0:
+                tailer.stop()
+                del self._tailers[query_id]
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "tailers": len(self._tailers),
+            "subscribers": sum(tailer.subscribers for tailer in self._tailers.values()),
+        }
+
+
+@lru_cache
+def get_log_tailers() -> LogTailers:
+    return LogTailers()
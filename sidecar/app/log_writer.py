@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal, Optional, TextIO
+
+from .log_segments import compress_segment, rotate
+
+if TYPE_CHECKING:
+    from loguru import Message
+
+
+def render_text(record) -> str:
+    """The plain text rendering of a record, as served by the log-file download."""
+    timestamp = record["time"].replace(tzinfo=None).isoformat()
+    return f"{timestamp} - {record['message']}\n"
+
+
+def render_log_line(line: bytes) -> str:
+    """Renders a serialized record from a log file, like render_text."""
+    try:
+        record = json.loads(line)["record"]
+        timestamp = datetime.fromtimestamp(float(record["time"]["timestamp"]))
+        return f"{timestamp.isoformat()} - {record['message']}\n"
+    except (ValueError, KeyError, TypeError):
+        return line.decode("utf8", errors="replace")
+
+
+# log files are rotated into compressed segments once they grow past this size
+LOG_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class LogFiles:
+    log: TextIO
+    text: TextIO
+    # approximately, the size of the log file since it was last rotated
+    written: int = 0
+
+    def close(self):
+        self.log.close()
+        self.text.close()
+
+
+@dataclass
+class QueryLogWriter:
+    """
+    QueryLogWriter is a single loguru sink for every query, which appends each
+    record to the log file of the query it is bound to (by `extra["task"]`),
+    and its plain text rendering to the text file alongside it, so downloads
+    don't have to parse the log.
+
+    At most max_open_files queries have their files kept open, closing the least
+    recently written when another one needs to be opened. Once a query's files are
+    closed by close, its records are dropped (rather than reopening the files)
+    until it is reopened, remembering the last max_closed_tasks closed queries.
+
+    Once a log file grows past max_segment_bytes, it and its text file are
+    rotated into segments (see log_segments), which are compressed off the
+    logging thread.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    log_dir_path: Path
+    max_open_files: int = 64
+    max_closed_tasks: int = 1024
+    max_segment_bytes: int = LOG_SEGMENT_MAX_BYTES
+    compression: Literal["gzip", "zstd"] = "gzip"
+    _files: OrderedDict[str, LogFiles] = field(
+        init=False, default_factory=OrderedDict, repr=False
+    )
+    _closed: OrderedDict[str, None] = field(
+        init=False, default_factory=OrderedDict, repr=False
+    )
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+    _compressor: Optional[ThreadPoolExecutor] = field(
+        init=False, default=None, repr=False
+    )
+
+    def log_file_path(self, task: str) -> Path:
+        return self.log_dir_path / Path(f"{task}.log")
+
+    def text_file_path(self, task: str) -> Path:
+        return self.log_dir_path / Path(f"{task}.txt")
+
+    def _files_for(self, task: str) -> LogFiles:
+        files = self._files.get(task)
+        if files is not None:
+            self._files.move_to_end(task)
+            return files
+        while len(self._files) >= self.max_open_files:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        files = self._open(task)
+        self._files[task] = files
+        return files
+
+    def _open(self, task: str) -> LogFiles:
+        # kept open until evicted, or closed by close
+        # pylint: disable=consider-using-with
+        log = self.log_file_path(task).open("a", encoding="utf8", buffering=1)
+        text = self.text_file_path(task).open("a", encoding="utf8", buffering=1)
+        return LogFiles(log=log, text=text, written=os.fstat(log.fileno()).st_size)
+
+    def _rotate(self, task: str):
+        files = self._files[task]
+        files.close()
+        segments = [
+            rotate(self.log_file_path(task)),
+            rotate(self.text_file_path(task)),
+        ]
+        # reopened straight away, so there's always a live file to follow
+        self._files[task] = self._open(task)
+        if self._compressor is None:
+            self._compressor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="log-compressor"
+            )
+        for segment in segments:
+            if segment is not None:
+                self._compressor.submit(compress_segment, segment, self.compression)
+
+    def write(self, message: Message):
+        task = message.record["extra"].get("task")
+        if task is None:
+            return
+        text = render_text(message.record)
+        with self._lock:
+            if task in self._closed:
+                return
+            files = self._files_for(task)
+            files.log.write(message)
+            files.text.write(text)
+            files.written += len(message)
+            if files.written >= self.max_segment_bytes:
+                self._rotate(task)
+
+    @staticmethod
+    def filter(record) -> bool:
+        return "task" in record["extra"]
+
+    def reopen(self, task: str):
+        """Writes records for task again, e.g., for a query started again."""
+        with self._lock:
+            self._closed.pop(task, None)
+
+    def close(self, task: str):
+        with self._lock:
+            f = self._files.pop(task, None)
+            if f is not None:
+                f.close()
+            self._closed[task] = None
+            self._closed.move_to_end(task)
+            while len(self._closed) > self.max_closed_tasks:
+                self._closed.popitem(last=False)
+
+    def stop(self):
+        with self._lock:
+            while self._files:
+                _, f = self._files.popitem()
+                f.close()
+            compressor, self._compressor = self._compressor, None
+        if compressor is not None:
+            compressor.shutdown(wait=True)
+
+    @property
+    def open_files(self) -> list[str]:
+        with self._lock:
+            return list(self._files)
@@ -1,14 +1,71 @@
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from .janitor import Janitor, get_janitor, queries_in_use
+from .query.admission import AdmissionController
 from .query.base import QueryManager
-from .routes import start, stop, websockets
+from .routes import build, callbacks, metrics, queries, start, stop, websockets
+from .settings import get_settings
+
+
+async def promote_queued_queries(query_manager: QueryManager, interval: float):
+    # resources can free up without a query completing, so check periodically
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(query_manager.promote_queued_queries)
+
+
+async def collect_garbage(janitor: Janitor, interval: float):
+    while True:
+        evicted = await asyncio.to_thread(janitor.run)
+        if evicted:
+            get_settings().logger.info(
+                f"Janitor deleted {len(evicted)} artifacts, "
+                f"{sum(artifact.size_bytes for artifact in evicted)} bytes"
+            )
+        await asyncio.sleep(interval)
 
-app = FastAPI()
-app.state.QUERY_MANAGER = QueryManager(max_parallel_queries=1)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    settings = get_settings()
+    query_manager = _app.state.QUERY_MANAGER
+    query_manager.restore_queue(
+        settings.root_path / Path("queue.json"), start.QUERY_BUILDERS
+    )
+    promote_task = asyncio.create_task(promote_queued_queries(query_manager, 10))
+    janitor = get_janitor()
+    janitor.in_use = partial(queries_in_use, query_manager)
+    janitor_task = asyncio.create_task(
+        collect_garbage(janitor, settings.janitor_interval_seconds)
+    )
+    yield
+    promote_task.cancel()
+    janitor_task.cancel()
+    await asyncio.to_thread(query_manager.shutdown)
+    for helper in settings.helpers.values():
+        helper.client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.state.QUERY_MANAGER = QueryManager(
+    max_parallel_queries=2,
+    max_parallel_builds=1,
+    max_parallel_runs=1,
+    admission=AdmissionController(),
+)
 app.include_router(websockets.router)
 app.include_router(start.router)
 app.include_router(stop.router)
+app.include_router(build.router)
+app.include_router(metrics.router)
+app.include_router(queries.router)
+app.include_router(callbacks.router)
 
 origins = ["https://draft.test", "https://draft-mpc.vercel.app"]
 
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, field
+
+import psutil
+
+
+@dataclass(frozen=True)
+class ResourceEstimate:
+    """The projected peak memory and cores used by a query."""
+
+    memory_bytes: int = 0
+    cores: float = 0
+
+
+@dataclass(frozen=True)
+class HostResources:
+    available_memory_bytes: int
+    load_average: float
+    cores: int
+
+    @classmethod
+    def sample(cls) -> HostResources:
+        return cls(
+            available_memory_bytes=psutil.virtual_memory().available,
+            load_average=psutil.getloadavg()[0],
+            cores=psutil.cpu_count() or 1,
+        )
+
+
+@dataclass
+class AdmissionController:
+    """
+    AdmissionController decides if a query fits in the live headroom of the host.
+
+    Queries which are already running may not have reached their peak yet, so the
+    difference between their estimate and their current memory use is treated as
+    still reserved. memory_reserve_bytes is always kept free for the sidecar and OS.
+    """
+
+    memory_reserve_bytes: int = 512 * 1024**2
+    max_load_per_core: float = 1.0
+    sample_resources: Callable[[], HostResources] = field(
+        default=HostResources.sample, repr=False
+    )
+
+    def fits(
+        self,
+        estimate: ResourceEstimate,
+        running: Iterable[tuple[ResourceEstimate, int]],
+    ) -> bool:
+        """
+        running is the estimate and current memory use (RSS) of each query
+        which has already been admitted.
+        """
+        host = self.sample_resources()
+        outstanding_memory_bytes = sum(
+            max(running_estimate.memory_bytes - rss, 0)
+            for running_estimate, rss in running
+        )
+        memory_fits = (
+            estimate.memory_bytes + outstanding_memory_bytes + self.memory_reserve_bytes
+            <= host.available_memory_bytes
+        )
+        cores_fit = (
+            host.load_average + estimate.cores <= host.cores * self.max_load_per_core
+        )
+        return memory_fits and cores_fit
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "host": asdict(self.sample_resources()),
+            "memory_reserve_bytes": self.memory_reserve_bytes,
+            "max_load_per_core": self.max_load_per_core,
+        }
@@ -1,30 +1,35 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import ClassVar, Optional, TypeVar
+from typing import Any, ClassVar, Optional, TypeVar, Union
 
 import loguru
 
 from ..helpers import Role
 from ..settings import get_settings
+from .admission import AdmissionController, ResourceEstimate
+from .pipeline import Pipeline
+from .queue import AdmissionQueue
+from .sampler import ProcessTreeSampler, ResourceSample
 from .status import Status, StatusHistory
-from .step import Step
+from .status_broker import get_status_broker
+from .status_store import get_status_store
+from .step import Stage, Step
+from .view import QueryView, QueryViewCache
+from .workers import WorkerPool
 
 
 class QueryExistsError(Exception):
     pass
 
 
-def status_file_path(query_id: str) -> Path:
-    settings = get_settings()
-    return settings.status_dir_path / Path(query_id)
-
-
 def log_file_path(query_id: str) -> Path:
     settings = get_settings()
-    return settings.log_dir_path / Path(f"{query_id}.log")
+    return settings.log_writer.log_file_path(query_id)
 
 
 @dataclass
@@ -41,33 +46,41 @@ class Query:
     query_id: str
     current_step: Optional[Step] = field(init=False, default=None, repr=True)
     logger: loguru.Logger = field(init=False, repr=False, compare=False)
-    _logger_id: int = field(init=False, repr=False, compare=False)
     role: Role = field(init=False, repr=True)
     _status_history: StatusHistory = field(init=False, repr=True)
+    # held to check the status and then change it, e.g., from another thread
+    _status_lock: threading.RLock = field(
+        init=False, default_factory=threading.RLock, repr=False, compare=False
+    )
+    pipeline: Optional[Pipeline] = field(init=False, default=None, repr=False)
+    current_stage: Optional[Stage] = field(init=False, default=None, repr=True)
+    timings: dict[str, float] = field(init=False, default_factory=dict, repr=False)
+    # samples the resources used by the current step
+    sampler: Optional[ProcessTreeSampler] = field(init=False, default=None, repr=False)
     step_classes: ClassVar[list[type[Step]]] = []
+    query_type: ClassVar[Optional[str]] = None
 
     def __post_init__(self):
         settings = get_settings()
 
         self.logger = settings.logger.bind(task=self.query_id)
+        # e.g., a build repeated after an earlier one was cleaned up
+        settings.log_writer.reopen(self.query_id)
         self.role = settings.role
 
         self._status_history = StatusHistory(
-            file_path=self.status_file_path, logger=self.logger
+            query_id=self.query_id,
+            store=get_status_store(),
+            logger=self.logger,
+            query_type=self.query_type,
+            broker=get_status_broker(),
         )
 
-        self._logger_id = self.logger.add(
-            self.log_file_path,
-            serialize=True,
-            filter=lambda record: record["extra"].get("task") == self.query_id,
-            enqueue=True,
-        )
+        # records bound to this query are written to log_file_path
+        # by the shared QueryLogWriter sink, so there is no sink to add here
+        self.log_file_path.touch(exist_ok=True)
         self.logger.debug(f"adding new Query {self}.")
 
-    @property
-    def status_file_path(self) -> Path:
-        return status_file_path(self.query_id)
-
     @property
     def log_file_path(self) -> Path:
         return log_file_path(self.query_id)
@@ -86,8 +99,18 @@ class Query:
 
     @status.setter
     def status(self, status: Status):
-        if self.status != status and self.status <= Status.COMPLETE:
-            self._status_history.add(status)
+        with self._status_lock:
+            if self.status != status and self.status <= Status.COMPLETE:
+                self._status_history.add(status)
+                self.on_status_change(status)
+
+    def reset_status(self):
+        """Discards the status history left by an earlier run of this query."""
+        with self._status_lock:
+            self._status_history.clear()
+
+    def on_status_change(self, status: Status):
+        """Called after the status of the query changes."""
 
     @property
     def status_event_json(self):
@@ -102,15 +125,38 @@ class Query:
         for step_class in self.step_classes:
             yield step_class.build_from_query(self)
 
+    def enter_stage(self, stage: Stage) -> bool:
+        """
+        Waits for a slot in stage, if the query is run by a pipeline.
+        Returns False if the query finished while waiting.
+        """
+        if stage == self.current_stage:
+            return True
+        self.leave_stage()
+        if self.pipeline is not None:
+            self.logger.info(f"Waiting for {stage} stage.")
+            if not self.pipeline.acquire(self, stage):
+                return False
+        self.current_stage = stage
+        return True
+
+    def leave_stage(self):
+        if self.pipeline is not None and self.current_stage is not None:
+            self.pipeline.release(self, self.current_stage)
+        self.current_stage = None
+
     def start(self):
+        # running from here on, including while waiting for a stage slot, so
+        # pollers (e.g., the coordinator) don't see an UNKNOWN or QUEUED query
+        self.status = max(self.status, Status.STARTING)
         try:
             for step in self.steps:
-                if self.finished:
+                if self.finished or not self.enter_stage(step.stage):
                     break
                 self.logger.info(f"Starting: {step}")
                 self.status = step.status
                 self.current_step = step
-                step.start()
+                self._run_step(step)
                 if not step.success:
                     self.crash()
         # pylint: disable=broad-exception-caught
@@ -119,9 +165,23 @@ class Query:
             # as well as command failure
             self.logger.error(e)
             self.crash()
+        self.leave_stage()
         if not self.finished:
             self.finish()
 
+    def _run_step(self, step: Step):
+        settings = get_settings()
+        self.sampler = ProcessTreeSampler(
+            lambda: step.pid,
+            interval=settings.resource_sample_interval_seconds,
+            max_samples=settings.resource_sample_buffer_size,
+        )
+        self.sampler.start()
+        try:
+            step.start()
+        finally:
+            self.sampler.stop()
+
     def finish(self):
         self.status = Status.COMPLETE
         self.logger.info(f"Finishing: {self=}")
@@ -130,8 +190,12 @@ class Query:
         self._cleanup()
 
     def kill(self):
-        if self.running:
-            self.status = Status.KILLED
+        # a query can also be killed while it waits to start
+        with self._status_lock:
+            killed = not self.finished
+            if killed:
+                self.status = Status.KILLED
+        if killed:
             self.logger.info(f"Killing: {self=}")
             if self.current_step:
                 self.current_step.terminate()
@@ -147,22 +211,33 @@ class Query:
 
     def _cleanup(self):
         self.current_step = None
-        try:
-            self.logger.remove(self._logger_id)
-        except ValueError:
-            pass
+        # records are queued for the sink, so write those already logged, as
+        # any logged after the log file is closed are dropped
+        self.logger.complete()
+        get_settings().log_writer.close(self.query_id)
+
+    @property
+    def resource_estimate(self) -> ResourceEstimate:
+        """The projected peak resource use of this query, used for admission."""
+        return ResourceEstimate()
+
+    @property
+    def resource_sample(self) -> Optional[ResourceSample]:
+        """The latest sample of the resources used by the current step."""
+        sampler = self.sampler
+        if self.current_step is None or sampler is None:
+            return None
+        return sampler.latest
 
     @property
     def cpu_usage_percent(self) -> float:
-        if self.current_step:
-            return self.current_step.cpu_usage_percent
-        return 0
+        sample = self.resource_sample
+        return sample.cpu_percent if sample is not None else 0
 
     @property
     def memory_rss_usage(self) -> int:
-        if self.current_step:
-            return self.current_step.memory_rss_usage
-        return 0
+        sample = self.resource_sample
+        return sample.memory_rss_usage if sample is not None else 0
 
 
 QueryTypeT = TypeVar("QueryTypeT", bound=Query)
@@ -172,41 +247,247 @@ class MaxQueriesRunningError(Exception):
     pass
 
 
+QueryBuilder = Callable[..., Query]
+
+
 @dataclass
 class QueryManager:
     """
     The QueryManager allows for a fixed number of queries to run at once,
-    and stores those queries in a dictionary.
+    and stores those queries in a dictionary. Each query runs through a
+    Pipeline, so that one query can build while another is in its run stage.
+
+    Queries submitted while there is no capacity wait in an AdmissionQueue,
+    and are started as soon as a running query completes. If an
+    AdmissionController is set, a query is also only admitted once its
+    resource estimate fits in the host's headroom.
+
+    Queries and builds run on their own bounded WorkerPools, rather than on the
+    threadpool which serves the HTTP layer, and are stopped by shutdown.
 
     Accessing running queries allows the finish and kill methods to be called
     from another caller (typically a route handler in the HTTP layer.
     """
 
+    # pylint: disable=too-many-instance-attributes
     max_parallel_queries: int = field(init=True, repr=False, default=1)
+    max_parallel_builds: int = field(init=True, repr=False, default=1)
+    max_parallel_runs: int = field(init=True, repr=False, default=1)
+    admission: Optional[AdmissionController] = field(
+        init=True, repr=False, default=None
+    )
+    pipeline: Pipeline = field(init=False, repr=False)
+    queue: AdmissionQueue = field(init=False, repr=False)
     running_queries: dict[str, Query] = field(
         init=False, repr=True, default_factory=dict
     )
+    running_builds: dict[str, Query] = field(
+        init=False, repr=True, default_factory=dict
+    )
+    queued_queries: dict[str, Query] = field(
+        init=False, repr=True, default_factory=dict
+    )
+    query_workers: WorkerPool = field(init=False, repr=False)
+    build_workers: WorkerPool = field(init=False, repr=False)
+    closed: bool = field(init=False, repr=False, default=False)
+    views: QueryViewCache = field(
+        init=False, repr=False, default_factory=QueryViewCache
+    )
+    _lock: threading.RLock = field(
+        init=False, default_factory=threading.RLock, repr=False
+    )
 
-    def get_from_query_id(self, cls, query_id: str) -> Optional[Query]:
+    def __post_init__(self):
+        self.pipeline = Pipeline(
+            max_parallel_builds=self.max_parallel_builds,
+            max_parallel_runs=self.max_parallel_runs,
+        )
+        self.queue = AdmissionQueue()
+        self.query_workers = WorkerPool("query", max(self.max_parallel_queries, 1))
+        self.build_workers = WorkerPool("build", max(self.max_parallel_builds, 1))
+
+    def get_from_query_id(
+        self, cls, query_id: str
+    ) -> Optional[Union[Query, QueryView]]:
+        """
+        Finished queries are returned as a (cached) read only QueryView.
+        Other queries which aren't managed here (e.g., left by a previous
+        process) are loaded as cls, so that they can still be killed.
+        """
         if query_id in self.running_queries:
             return self.running_queries[query_id]
-        if status_file_path(query_id).exists():
-            return cls(query_id)
-        return None
+        if query_id in self.running_builds:
+            return self.running_builds[query_id]
+        if query_id in self.queued_queries:
+            return self.queued_queries[query_id]
+        view = self.views.get(query_id)
+        if view is None:
+            return None
+        if view.finished:
+            return view
+        return cls(query_id)
+
+    def submit(
+        self,
+        query: Query,
+        query_type: str,
+        params: dict[str, Any],
+        priority: int = 0,
+    ) -> Optional[int]:
+        """
+        Reserves capacity for query, returning None, in which case the caller
+        is expected to call start_query. Otherwise, the query is added to the queue
+        and its position in the queue is returned.
+
+        query_type and params are persisted with the queue, and passed to the
+        matching QueryBuilder to rebuild the query after a restart.
+        """
+        with self._lock:
+            if self.can_admit(query) and not self.queue:
+                self.running_queries[query.query_id] = query
+                return None
+            query.status = Status.QUEUED
+            self.queued_queries[query.query_id] = query
+            return self.queue.push(query.query_id, query_type, params, priority)
+
+    def queue_position(self, query_id: str) -> Optional[int]:
+        return self.queue.position(query_id)
+
+    def remove_from_queue(self, query_id: str) -> bool:
+        with self._lock:
+            self.queued_queries.pop(query_id, None)
+            return self.queue.remove(query_id)
+
+    def restore_queue(self, path: Path, query_builders: dict[str, QueryBuilder]):
+        """
+        Loads a queue persisted to path (e.g., before a restart),
+        rebuilding each query with the QueryBuilder for its query_type.
+        """
+        with self._lock:
+            self.queue = AdmissionQueue(path=path)
+            for entry in list(self.queue.entries):
+                query = query_builders[entry.query_type](
+                    query_id=entry.query_id, **entry.params
+                )
+                if query.finished:
+                    self.queue.remove(entry.query_id)
+                    continue
+                query.status = Status.QUEUED
+                self.queued_queries[query.query_id] = query
+        self.promote_queued_queries()
+
+    def promote_queued_queries(self):
+        """Starts queued queries, in order, while there is capacity."""
+        while True:
+            with self._lock:
+                entry = self.queue.peek()
+                if entry is None or self.closed:
+                    return
+                query = self.queued_queries.get(entry.query_id)
+                if query is None or query.finished:
+                    # e.g., killed while it was queued
+                    self.remove_from_queue(entry.query_id)
+                    continue
+                if not self.can_admit(query):
+                    return
+                self.remove_from_queue(entry.query_id)
+                self.running_queries[query.query_id] = query
+            query.logger.info("Promoting query from the queue.")
+            self.start_query(query)
+
+    def start_query(self, query: Query) -> Future:
+        """Runs query on the query WorkerPool."""
+        return self.query_workers.submit(self.run_query, query)
+
+    def start_build(self, query: Query) -> Optional[Future]:
+        """
+        Runs query on the build WorkerPool,
+        returning None if the build is already running (or waiting for a worker).
+
+        A build can be repeated, e.g., after it crashed or its target was evicted,
+        so an admitted build starts from an empty status history.
+        """
+        with self._lock:
+            if query.query_id in self.running_builds:
+                return None
+            query.reset_status()
+            self.running_builds[query.query_id] = query
+        return self.build_workers.submit(self.run_build, query)
 
     def run_query(self, query: Query):
-        if not self.capacity_available:
-            raise MaxQueriesRunningError(
-                f"Only {self.max_parallel_queries} allowed. Currently running {self}"
-            )
-
-        self.running_queries[query.query_id] = query
+        with self._lock:
+            # capacity was already reserved for queries admitted by submit
+            if query.query_id not in self.running_queries:
+                if not self.can_admit(query):
+                    raise MaxQueriesRunningError(
+                        f"Only {self.max_parallel_queries} allowed. "
+                        f"Currently running {self}"
+                    )
+                self.running_queries[query.query_id] = query
+
+        query.pipeline = self.pipeline
         try:
             query.start()
         finally:
             # always remove this
-            del self.running_queries[query.query_id]
+            with self._lock:
+                del self.running_queries[query.query_id]
+            self.promote_queued_queries()
+
+    def run_build(self, query: Query):
+        """
+        Builds (e.g., compiling a commit ahead of a query) run alongside queries,
+        and don't count towards max_parallel_queries.
+        """
+        with self._lock:
+            # builds started by start_build are registered before they run
+            if self.running_builds.setdefault(query.query_id, query) is not query:
+                raise QueryExistsError(f"{query.query_id} is already running.")
+
+        query.pipeline = self.pipeline
+        try:
+            query.start()
+        finally:
+            # always remove this
+            with self._lock:
+                del self.running_builds[query.query_id]
+
+    def shutdown(self):
+        """
+        Kills running queries and builds, and waits for the WorkerPools to stop.
+        Queued queries are left in the queue, to be restored after a restart.
+        """
+        with self._lock:
+            self.closed = True
+            queries = [*self.running_queries.values(), *self.running_builds.values()]
+        for query in queries:
+            query.kill()
+        self.query_workers.shutdown()
+        self.build_workers.shutdown()
+
+    def can_admit(self, query: Optional[Query] = None) -> bool:
+        if len(self.running_queries) >= self.max_parallel_queries:
+            return False
+        if self.admission is None or not self.running_queries:
+            # always admit a query onto an idle host, so that a query
+            # with a large estimate still runs eventually
+            return True
+        estimate = query.resource_estimate if query else ResourceEstimate()
+        return self.admission.fits(
+            estimate,
+            [
+                (running_query.resource_estimate, running_query.memory_rss_usage)
+                for running_query in self.running_queries.values()
+            ],
+        )
 
     @property
     def capacity_available(self):
-        return len(self.running_queries) < self.max_parallel_queries
+        return self.can_admit()
+
+    @property
+    def worker_stats(self) -> dict:
+        return {
+            "query": self.query_workers.stats,
+            "build": self.build_workers.stats,
+        }
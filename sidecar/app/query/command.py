@@ -11,6 +11,10 @@ from typing import Optional, TextIO
 import loguru
 import psutil
 
+READ_CHUNK_BYTES = 64 * 1024
+# how long terminate waits for the process to exit, before killing it
+TERMINATE_TIMEOUT_SECONDS = 10
+
 
 @dataclass
 class Command:
@@ -18,6 +22,9 @@ class Command:
     env: Optional[dict] = field(default_factory=lambda: {**os.environ}, repr=False)
     cwd: Optional[Path] = field(default=None, repr=True)
     process: Optional[subprocess.Popen] = field(init=False, default=None, repr=True)
+    _process_psutil: Optional[psutil.Process] = field(
+        init=False, default=None, repr=False
+    )
 
     @property
     def returncode(self):
@@ -39,11 +46,19 @@ class Command:
         return self.started and not self.finished
 
     @property
-    def process_psutil(self) -> Optional[psutil.Process]:
+    def pid(self) -> Optional[int]:
         process = self.process
-        if process is None:
+        return None if process is None else process.pid
+
+    @property
+    def process_psutil(self) -> Optional[psutil.Process]:
+        pid = self.pid
+        if pid is None:
             return None
-        return psutil.Process(process.pid)
+        # kept, so cpu_percent is measured since the last call, not from now
+        if self._process_psutil is None or self._process_psutil.pid != pid:
+            self._process_psutil = psutil.Process(pid)
+        return self._process_psutil
 
     @property
     def cpu_usage_percent(self) -> float:
@@ -73,17 +88,25 @@ class Command:
         self.process = self.build_process()
         self.process.wait()
 
-    def terminate(self):
+    def terminate(self, timeout: float = TERMINATE_TIMEOUT_SECONDS):
+        """Terminates the process, escalating to kill after timeout seconds."""
         process = self.process
-        if process is not None:
+        if process is not None and process.returncode is None:
             process.terminate()
-            process.wait()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.kill(timeout=timeout)
 
-    def kill(self):
+    def kill(self, timeout: float = TERMINATE_TIMEOUT_SECONDS):
         process = self.process
-        if process is not None:
+        if process is not None and process.returncode is None:
             process.kill()
-            process.wait()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                # e.g., stuck in uninterruptible I/O, so leave start to reap it
+                pass
 
 
 @dataclass(kw_only=True)
@@ -107,8 +130,34 @@ class FileOutputCommand(Command):
         self.output_file.close()
 
 
+@dataclass
+class LineSplitter:
+    """
+    LineSplitter splits chunks of output into lines,
+    holding onto a trailing partial line until the rest of it arrives.
+    """
+
+    partial: bytes = b""
+
+    def feed(self, chunk: bytes) -> list[str]:
+        *lines, self.partial = (self.partial + chunk).split(b"\n")
+        return [line.decode(errors="replace") for line in lines]
+
+    def flush(self) -> list[str]:
+        partial, self.partial = self.partial, b""
+        return [partial.decode(errors="replace")] if partial else []
+
+
 @dataclass(kw_only=True)
 class LoggerOutputCommand(Command):
+    """
+    LoggerOutputCommand logs the stdout and stderr of the process.
+
+    Both pipes are drained in chunks of up to READ_CHUNK_BYTES, and the lines
+    in each chunk are logged as a single record (one line per line of message),
+    rather than paying for a record per line.
+    """
+
     logger: loguru.Logger = field(repr=False)
 
     def build_process(self):
@@ -118,29 +167,34 @@ class LoggerOutputCommand(Command):
             cwd=self.cwd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
         )
 
+    def log_lines(self, lines: list[str]):
+        if lines:
+            self.logger.info("\n".join(lines))
+
     def start(self):
         self.process = self.build_process()
-        stdout_fileno = self.process.stdout.fileno()
-        stderr_fileno = self.process.stderr.fileno()
-        while self.process.poll() is None:
-            readable, _, _ = select.select([stdout_fileno, stderr_fileno], [], [])
+        splitters = {
+            self.process.stdout.fileno(): LineSplitter(),
+            self.process.stderr.fileno(): LineSplitter(),
+        }
+        for fd in splitters:
+            os.set_blocking(fd, False)
+        while splitters:
+            readable, _, _ = select.select(list(splitters), [], [])
             for fd in readable:
-                if fd == stdout_fileno:
-                    stdout_line = self.process.stdout.readline()
-                    if stdout_line:
-                        self.logger.info(stdout_line.rstrip("\n"))
-                elif fd == stderr_fileno:
-                    stderr_line = self.process.stderr.readline()
-                    if stderr_line:
-                        self.logger.info(stderr_line.rstrip("\n"))
-        for line in self.process.stdout:
-            self.logger.info(line.rstrip("\n"))
-
-        for line in self.process.stderr:
-            self.logger.info(line.rstrip("\n"))
+                try:
+                    chunk = os.read(fd, READ_CHUNK_BYTES)
+                except BlockingIOError:
+                    continue
+                if chunk:
+                    self.log_lines(splitters[fd].feed(chunk))
+                else:
+                    self.log_lines(splitters.pop(fd).flush())
+        self.process.stdout.close()
+        self.process.stderr.close()
+        self.process.wait()
 
 
 class ParallelCommandContextManager:
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import ClassVar
+from typing import ClassVar, Optional
 
 from .base import Query
 from .command import LoggerOutputCommand
@@ -35,4 +35,5 @@ class DemoLoggerStep(LoggerOutputCommandStep):
 class DemoLoggerQuery(Query):
     num_lines: int
     total_runtime: int
+    query_type: ClassVar[Optional[str]] = "demo-logger"
     step_classes: ClassVar[list[type[Step]]] = [DemoLoggerStep]
@@ -1,18 +1,39 @@
 from __future__ import annotations
 
+import os
+import socket
+import threading
 import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import StrEnum
 from pathlib import Path
-from typing import ClassVar
+from typing import Callable, ClassVar, Iterable, Optional
 
 import loguru
 
+from ..callbacks import (
+    HelperStatusBoard,
+    get_helper_status_board,
+    get_status_callback_sender,
+)
+from ..helpers import Helper, Role, broadcast
 from ..local_paths import Paths
 from ..settings import get_settings
+from ..target_cache import get_target_cache
+from ..worktrees import get_worktree_pool
+from .admission import ResourceEstimate
 from .base import Query
 from .command import FileOutputCommand, LoggerOutputCommand
-from .step import CommandStep, LoggerOutputCommandStep, Status, Step
+from .step import CommandStep, LoggerOutputCommandStep, Stage, Status, Step
+
+# Rough peak resource use, used to estimate the cost of a query for admission.
+# cargo builds are memory hungry, and run on every core.
+COMPILE_MEMORY_BYTES = 4 * 1024**3
+RUN_BASE_MEMORY_BYTES = 256 * 1024**2
+RUN_MEMORY_BYTES_PER_ROW = 4 * 1024
+MALICIOUS_SECURITY_MEMORY_FACTOR = 4
 
 
 class GateType(StrEnum):
@@ -20,25 +41,130 @@ class GateType(StrEnum):
     DESCRIPTIVE = "descriptive-gate"
 
 
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+def helper_compiled_id(
+    commit_hash: str,
+    gate_type: str,
+    stall_detection: bool,
+    multi_threading: bool,
+    disable_metrics: bool,
+    reveal_aggregation: bool,
+) -> str:
+    return (
+        f"{commit_hash}_{gate_type}"
+        f"{'_stall-detection' if stall_detection else ''}"
+        f"{'_multi-threading' if multi_threading else ''}"
+        f"{'_disable-metrics' if disable_metrics else ''}"
+        f"{'_reveal-aggregation' if reveal_aggregation else ''}"
+    )
+
+
+def events_file_name(size: int, max_breakdown_key: int, max_trigger_value: int) -> str:
+    # every parameter of the generator, as the file is reused by later queries
+    return f"events-{size}-{max_breakdown_key}-{max_trigger_value}.txt"
+
+
+def build_query_id(compiled_id: str) -> str:
+    return f"build-{compiled_id}"
+
+
 @dataclass(kw_only=True)
-class IPAQuery(Query):
+class IPAQuery(Query, ABC):
+    """
+    IPAQuery builds a binary from commit_hash before running it.
+
+    If binary_path has already been built for this compiled_id (e.g., by a
+    previous query, or a prebuild), the checkout and compile steps are skipped.
+    """
+
     paths: Paths
     commit_hash: str
 
+    @property
+    @abstractmethod
+    def binary_path(self) -> Path:
+        """The binary built from commit_hash, which the query runs."""
+
+    def estimate_resources(
+        self,
+        size: Optional[int],
+        malicious_security: bool,
+        multi_threading: bool,
+    ) -> ResourceEstimate:
+        run_memory_bytes = RUN_BASE_MEMORY_BYTES
+        if size is not None:
+            run_memory_bytes += (
+                size
+                * RUN_MEMORY_BYTES_PER_ROW
+                * (MALICIOUS_SECURITY_MEMORY_FACTOR if malicious_security else 1)
+            )
+        cores = float(os.cpu_count() or 1) if multi_threading else 1.0
+        if self.binary_path.exists():
+            return ResourceEstimate(memory_bytes=run_memory_bytes, cores=cores)
+        return ResourceEstimate(
+            memory_bytes=max(run_memory_bytes, COMPILE_MEMORY_BYTES),
+            cores=float(os.cpu_count() or 1),
+        )
+
+    @property
+    def steps(self) -> Iterable[Step]:
+        prebuilt = get_target_cache().lookup(self.paths.compiled_id, self.binary_path)
+        if prebuilt:
+            self.logger.info(
+                f"Found cached build of {self.binary_path}, "
+                "skipping checkout and compile."
+            )
+        for step_class in self.step_classes:
+            if prebuilt and issubclass(
+                step_class, (SharedRepoCommandStep, CachedCompileStep)
+            ):
+                continue
+            yield step_class.build_from_query(self)
+
+    def start(self):
+        # keep the compiled target from being evicted,
+        # and the worktree from being removed, while they are in use
+        with (
+            get_target_cache().pin(self.paths.compiled_id),
+            get_worktree_pool().use(self.commit_hash),
+        ):
+            super().start()
+
     def send_kill_signals(self):
         self.logger.info("sending kill signals")
-        settings = get_settings()
-        for helper in settings.other_helpers:
-            response = helper.kill_query(self.query_id)
+        responses = broadcast(
+            get_settings().other_helpers,
+            lambda helper: helper.kill_query(self.query_id),
+        )
+        for response in responses.values():
             self.logger.info(response)
 
     def crash(self):
-        super().crash()
+        # before crashing, which closes the log the responses are written to
         self.send_kill_signals()
+        super().crash()
+
+
+@dataclass(kw_only=True)
+class SharedRepoCommandStep(LoggerOutputCommandStep, ABC):
+    """
+    Steps which modify the shared IPA repo (rather than a per-commit worktree)
+    hold the git lock, so they can safely run from concurrent queries.
+    """
+
+    stage: ClassVar[Stage] = Stage.BUILD
+
+    def run(self):
+        with get_worktree_pool().git_lock:
+            # the command can depend on the repo (see IPACheckoutCommitStep),
+            # which another query may have changed since this step was built
+            self.command = self.build_command()
+            super().run()
 
 
 @dataclass(kw_only=True)
-class IPACloneStep(LoggerOutputCommandStep):
+class IPACloneStep(SharedRepoCommandStep):
     repo_path: Path
     repo_url: ClassVar[str] = "https://github.com/private-attribution/ipa.git"
     status: ClassVar[Status] = Status.STARTING
@@ -62,7 +188,7 @@ class IPACloneStep(LoggerOutputCommandStep):
 
 
 @dataclass(kw_only=True)
-class IPAUpdateRemoteOriginStep(LoggerOutputCommandStep):
+class IPAUpdateRemoteOriginStep(SharedRepoCommandStep):
     repo_path: Path
     status: ClassVar[Status] = Status.STARTING
 
@@ -82,7 +208,7 @@ class IPAUpdateRemoteOriginStep(LoggerOutputCommandStep):
 
 
 @dataclass(kw_only=True)
-class IPAFetchUpstreamStep(LoggerOutputCommandStep):
+class IPAFetchUpstreamStep(SharedRepoCommandStep):
     repo_path: Path
     status: ClassVar[Status] = Status.STARTING
 
@@ -101,8 +227,14 @@ class IPAFetchUpstreamStep(LoggerOutputCommandStep):
 
 
 @dataclass(kw_only=True)
-class IPACheckoutCommitStep(LoggerOutputCommandStep):
+class IPACheckoutCommitStep(SharedRepoCommandStep):
+    """
+    Checks out commit_hash into its own worktree, leaving the shared repo
+    (and the worktrees of other commits) untouched.
+    """
+
     repo_path: Path
+    worktree_path: Path
     commit_hash: str
     status: ClassVar[Status] = Status.STARTING
 
@@ -110,30 +242,62 @@ class IPACheckoutCommitStep(LoggerOutputCommandStep):
     def build_from_query(cls, query: IPAQuery):
         return cls(
             repo_path=query.paths.repo_path,
+            worktree_path=query.paths.worktree_path,
             commit_hash=query.commit_hash,
             logger=query.logger,
         )
 
     def build_command(self) -> LoggerOutputCommand:
+        if self.worktree_path.exists():
+            return LoggerOutputCommand(
+                cmd=f"git -C {self.worktree_path} checkout -f {self.commit_hash}",
+                logger=self.logger,
+            )
         return LoggerOutputCommand(
-            cmd=f"git -C {self.repo_path} checkout -f {self.commit_hash}",
+            cmd=f"git -C {self.repo_path} worktree add --force --detach "
+            f"{self.worktree_path} {self.commit_hash}",
             logger=self.logger,
         )
 
 
 @dataclass(kw_only=True)
-class IPACorrdinatorCompileStep(LoggerOutputCommandStep):
-    manifest_path: Path
+class CachedCompileStep(LoggerOutputCommandStep, ABC):
+    """
+    Records new builds in the target cache. IPAQuery already looked the binary
+    up in the cache, but it may since have been built by another query, while
+    this one waited for the build stage, in which case cargo isn't run.
+    """
+
+    stage: ClassVar[Stage] = Stage.BUILD
+
+    compiled_id: str
     target_path: Path
+    binary_path: Path
+
+    def pre_run(self):
+        # not looked up again, which would count a second miss for the query
+        if self.binary_path.exists():
+            self.logger.info(f"Using cached build of {self.binary_path}")
+            self.skip = True
+
+    def post_run(self):
+        if not self.skip and self.command.returncode == 0:
+            get_target_cache().record_build(self.compiled_id, self.target_path)
+
+
+@dataclass(kw_only=True)
+class IPACorrdinatorCompileStep(CachedCompileStep):
+    manifest_path: Path
     logger: loguru.Logger = field(repr=False)
     status: ClassVar[Status] = Status.COMPILING
 
     @classmethod
     def build_from_query(cls, query: IPAQuery):
-        manifest_path = query.paths.repo_path / Path("Cargo.toml")
         return cls(
-            manifest_path=manifest_path,
+            manifest_path=query.paths.manifest_path,
+            compiled_id=query.paths.compiled_id,
             target_path=query.paths.target_path,
+            binary_path=query.paths.report_collector_binary_path,
             logger=query.logger,
         )
 
@@ -149,9 +313,8 @@ class IPACorrdinatorCompileStep(LoggerOutputCommandStep):
 
 # pylint: disable=R0902
 @dataclass(kw_only=True)
-class IPAHelperCompileStep(LoggerOutputCommandStep):
+class IPAHelperCompileStep(CachedCompileStep):
     manifest_path: Path
-    target_path: Path
     gate_type: GateType
     stall_detection: bool
     multi_threading: bool
@@ -161,8 +324,8 @@ class IPAHelperCompileStep(LoggerOutputCommandStep):
     status: ClassVar[Status] = Status.COMPILING
 
     @classmethod
-    def build_from_query(cls, query: IPAHelperQuery):
-        manifest_path = query.paths.repo_path / Path("Cargo.toml")
+    def build_from_query(cls, query: IPAHelperQuery | IPAHelperBuildQuery):
+        manifest_path = query.paths.manifest_path
         gate_type = query.gate_type
         stall_detection = query.stall_detection
         multi_threading = query.multi_threading
@@ -170,7 +333,9 @@ class IPAHelperCompileStep(LoggerOutputCommandStep):
         reveal_aggregation = query.reveal_aggregation
         return cls(
             manifest_path=manifest_path,
+            compiled_id=query.paths.compiled_id,
             target_path=query.paths.target_path,
+            binary_path=query.paths.helper_binary_path,
             gate_type=gate_type,
             stall_detection=stall_detection,
             multi_threading=multi_threading,
@@ -195,19 +360,46 @@ class IPAHelperCompileStep(LoggerOutputCommandStep):
 
 @dataclass(kw_only=True)
 class IPACoordinatorGenerateTestDataStep(CommandStep):
+    """
+    Generates the test data for size, unless it's already there. The data is
+    written to a file of its own, and only moved into place once complete,
+    so it's never truncated while another query's report collector reads it.
+    """
+
+    query_id: str
     output_file_path: Path
     report_collector_binary_path: Path
     size: int
     max_breakdown_key: int
     max_trigger_value: int
     status: ClassVar[Status] = Status.COMPILING
+    stage: ClassVar[Stage] = Stage.BUILD
+
+    @property
+    def partial_file_path(self) -> Path:
+        return self.output_file_path.with_name(
+            f"{self.output_file_path.name}.{self.query_id}.partial"
+        )
 
     def pre_run(self):
+        # the data is generated with a fixed seed, and the file is named for
+        # the other parameters (see events_file_name), so it can be reused
+        if self.output_file_path.exists():
+            self.skip = True
         self.output_file_path.parent.mkdir(parents=True, exist_ok=True)
 
+    def post_run(self):
+        if self.skip:
+            return
+        if self.command.returncode == 0:
+            self.partial_file_path.replace(self.output_file_path)
+        else:
+            self.partial_file_path.unlink(missing_ok=True)
+
     @classmethod
     def build_from_query(cls, query: IPACoordinatorQuery):
         return cls(
+            query_id=query.query_id,
             output_file_path=query.test_data_file,
             report_collector_binary_path=query.paths.report_collector_binary_path,
             size=query.size,
@@ -220,57 +412,153 @@ class IPACoordinatorGenerateTestDataStep(CommandStep):
             cmd=f"{self.report_collector_binary_path} gen-ipa-inputs -n {self.size} "
             f"--max-breakdown-key {self.max_breakdown_key} --report-filter all "
             f"--max-trigger-value {self.max_trigger_value} --seed 123",
-            output_file_path=self.output_file_path,
+            output_file_path=self.partial_file_path,
         )
 
 
 @dataclass(kw_only=True)
 class IPACoordinatorWaitForHelpersStep(Step):
+    """
+    Waits until every helper is READY, i.e., its helper binary is accepting
+    connections, so the report collector can start right away. Helpers push their status
+    transitions to /callbacks/status, which wakes this step up; helpers are
+    only polled (all at once, over their pooled clients) before they've
+    pushed anything, or when no push arrives within the interval. The interval
+    backs off while no helper changes status, and resets when one does.
+    """
+
     query_id: str
+    timings: dict[str, float] = field(repr=False)
+    max_unknown_status_wait_time: float = 100
+    # a helper can't admit this query while all of its slots hold queries
+    # which wait for the coordinator to run them after this one (when more
+    # queries were submitted at once than it admits, in another order), so
+    # give up on this query, which kills it everywhere, to run those instead
+    max_queued_status_wait_time: float = 300
     status: ClassVar[Status] = Status.WAITING_TO_START
+    _stopped: threading.Event = field(
+        init=False, default_factory=threading.Event, repr=False
+    )
 
     @classmethod
     def build_from_query(cls, query: IPAQuery):
         return cls(
             query_id=query.query_id,
+            timings=query.timings,
         )
 
-    def run(self):
+    def poll_helpers(
+        self, helpers: list[Helper], executor: ThreadPoolExecutor
+    ) -> dict[Role, Status]:
+        statuses = executor.map(
+            lambda helper: helper.get_current_query_status(self.query_id),
+            helpers,
+        )
+        return {helper.role: status for helper, status in zip(helpers, statuses)}
+
+    def current_statuses(
+        self,
+        board: HelperStatusBoard,
+        waiting: dict[Role, Helper],
+        poll_all: bool,
+        executor: ThreadPoolExecutor,
+    ) -> tuple[dict[Role, Status], int]:
+        """
+        Returns the statuses of the waiting helpers, and the number of polls (0 or 1).
+        Helpers which haven't pushed a status yet are polled, and, as a fallback
+        for lost callbacks, all of them are if poll_all.
+        """
+        pushed = board.statuses(self.query_id)
+        statuses = {role: pushed.get(role, Status.UNKNOWN) for role in waiting}
+        poll = [
+            helper for role, helper in waiting.items() if poll_all or role not in pushed
+        ]
+        if not poll:
+            return statuses, 0
+        for role, status in self.poll_helpers(poll, executor).items():
+            statuses[role] = max(statuses[role], status)
+        return statuses, 1
+
+    def run(self):  # pylint: disable=too-many-locals,too-many-branches
         settings = get_settings()
-        for helper in settings.other_helpers:
-            max_unknonwn_status_wait_time = 100
-            current_unknown_status_wait_time = 0
-            loop_wait_time = 1
-            while True:
-                status = helper.get_current_query_status(self.query_id)
-                match status:
-                    case Status.IN_PROGRESS:
-                        break
-                    case Status.KILLED | Status.NOT_FOUND | Status.CRASHED:
-                        self.success = False
-                        return
-                    case Status.STARTING | Status.COMPILING | Status.WAITING_TO_START:
-                        # keep waiting while it's in a startup state
-                        continue
-                    case Status.UNKNOWN | Status.NOT_FOUND:
-                        # eventually fail if the status is unknown or not found
-                        # for ~100 seconds
-                        current_unknown_status_wait_time += loop_wait_time
-                        if (
-                            current_unknown_status_wait_time
-                            >= max_unknonwn_status_wait_time
-                        ):
+        board = get_helper_status_board()
+        start_time = time.time()
+        waiting = {helper.role: helper for helper in settings.other_helpers}
+        previous_statuses: dict[Role, Status] = {}
+        unknown_status_wait_time = {role: 0.0 for role in waiting}
+        queued_status_wait_time = {role: 0.0 for role in waiting}
+        interval = settings.helper_poll_interval
+        polls = 0
+        timed_out = False
+        checked_at = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=len(waiting), thread_name_prefix="helper-poll"
+        ) as executor:
+            while waiting:
+                version = board.version(self.query_id)
+                statuses, polled = self.current_statuses(
+                    board, waiting, timed_out, executor
+                )
+                polls += polled
+                # a push can wake this up well before the interval has passed
+                now = time.monotonic()
+                elapsed, checked_at = now - checked_at, now
+
+                for role, status in statuses.items():
+                    match status:
+                        case Status.READY:
+                            del waiting[role]
+                        case Status.UNKNOWN:
+                            # eventually fail if the status is unknown
+                            # for ~max_unknown_status_wait_time seconds
+                            unknown_status_wait_time[role] += elapsed
+                            if (
+                                unknown_status_wait_time[role]
+                                >= self.max_unknown_status_wait_time
+                            ):
+                                self.success = False
+                                return
+                        case Status.QUEUED:
+                            queued_status_wait_time[role] += elapsed
+                            if (
+                                queued_status_wait_time[role]
+                                >= self.max_queued_status_wait_time
+                            ):
+                                self.success = False
+                                return
+                        case Status.NOT_FOUND:
                             self.success = False
                             return
-
-                time.sleep(1)
-        time.sleep(3)  # allow enough time for the command to start
+                        case _ if status >= Status.COMPLETE:
+                            self.success = False
+                            return
+                        # otherwise, keep waiting while it's in a startup state
+
+                if not waiting:
+                    break
+                if statuses == previous_statuses:
+                    interval = min(
+                        interval * settings.helper_poll_backoff,
+                        settings.helper_poll_max_interval,
+                    )
+                else:
+                    interval = settings.helper_poll_interval
+                previous_statuses = statuses
+                timed_out = not board.wait_for_change(
+                    self.query_id, version, interval, self._stopped
+                )
+                if self._stopped.is_set():
+                    return
+
+        self.timings["wait_for_helpers_seconds"] = time.time() - start_time
+        self.timings["wait_for_helpers_polls"] = polls
 
     def terminate(self):
-        return
+        self._stopped.set()
+        get_helper_status_board().notify_all()
 
     def kill(self):
-        return
+        self.terminate()
 
     @property
     def cpu_usage_percent(self) -> float:
@@ -329,6 +617,7 @@ class IPACoordinatorQuery(IPAQuery):
     per_user_credit_cap: int
     malicious_security: bool
 
+    query_type: ClassVar[Optional[str]] = "ipa-query"
     step_classes: ClassVar[list[type[Step]]] = [
         IPACloneStep,
         IPAUpdateRemoteOriginStep,
@@ -340,16 +629,39 @@ class IPACoordinatorQuery(IPAQuery):
         IPACoordinatorStartStep,
     ]
 
+    @property
+    def binary_path(self) -> Path:
+        return self.paths.report_collector_binary_path
+
+    @property
+    def resource_estimate(self) -> ResourceEstimate:
+        return self.estimate_resources(
+            size=self.size,
+            malicious_security=self.malicious_security,
+            multi_threading=False,
+        )
+
     def send_finish_signals(self):
         self.logger.info("sending finish signals")
-        settings = get_settings()
-        for helper in settings.other_helpers:
-            resp = helper.finish_query(self.query_id)
-            self.logger.info(resp)
+        responses = broadcast(
+            get_settings().other_helpers,
+            lambda helper: helper.finish_query(self.query_id),
+        )
+        for response in responses.values():
+            self.logger.info(response)
 
     def finish(self):
-        super().finish()
+        # before finishing, which closes the log the responses are written to
         self.send_finish_signals()
+        super().finish()
+
+
+def port_open(host: str, port: int, timeout: float) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
 
 
 @dataclass(kw_only=True)
@@ -363,7 +675,13 @@ class IPAStartHelperStep(LoggerOutputCommandStep):
     mk_public_path: Path
     mk_private_path: Path
     port: int
+    # called once the helper binary is accepting connections on port
+    on_ready: Callable[[], None] = field(default=lambda: None, repr=False)
+    probe_interval: float = 0.1
     status: ClassVar[Status] = Status.IN_PROGRESS
+    _probe_stopped: threading.Event = field(
+        init=False, default_factory=threading.Event, repr=False
+    )
 
     @classmethod
     def build_from_query(cls, query: IPAHelperQuery):
@@ -382,9 +700,33 @@ class IPAStartHelperStep(LoggerOutputCommandStep):
             mk_public_path=mk_public_path,
             mk_private_path=mk_private_path,
             port=query.port,
+            on_ready=query.ready,
             logger=query.logger,
         )
 
+    def probe_port(self):
+        """Calls on_ready once the running helper binary accepts a connection."""
+        while not self._probe_stopped.is_set():
+            # don't mistake another process still holding the port for this one
+            if self.command.running and port_open(
+                "localhost", self.port, self.probe_interval
+            ):
+                self.logger.info(f"Helper is accepting connections on {self.port}")
+                self.on_ready()
+                return
+            self._probe_stopped.wait(self.probe_interval)
+
+    def run(self):
+        probe = threading.Thread(
+            target=self.probe_port, name="helper-probe", daemon=True
+        )
+        probe.start()
+        try:
+            super().run()
+        finally:
+            self._probe_stopped.set()
+            probe.join()
+
     def build_command(self) -> LoggerOutputCommand:
         return LoggerOutputCommand(
             cmd=f"{self.helper_binary_path} --network {self.network_path} "
@@ -398,13 +740,23 @@ class IPAStartHelperStep(LoggerOutputCommandStep):
 
 @dataclass(kw_only=True)
 class IPAHelperQuery(IPAQuery):
+    # pylint: disable=too-many-instance-attributes
     port: int
     gate_type: GateType
     stall_detection: bool
     multi_threading: bool
     disable_metrics: bool
     reveal_aggregation: bool
+    # only used to estimate resource use, helpers don't generate the input
+    size: Optional[int] = None
+    malicious_security: bool = False
+
+    max_unknown_coordinator_wait_time: float = 100
+    _finished: threading.Event = field(
+        init=False, default_factory=threading.Event, repr=False, compare=False
+    )
 
+    query_type: ClassVar[Optional[str]] = "ipa-helper"
     step_classes: ClassVar[list[type[Step]]] = [
         IPACloneStep,
         IPAUpdateRemoteOriginStep,
@@ -413,3 +765,121 @@ class IPAHelperQuery(IPAQuery):
         IPAHelperCompileStep,
         IPAStartHelperStep,
     ]
+
+    @property
+    def binary_path(self) -> Path:
+        return self.paths.helper_binary_path
+
+    def enter_stage(self, stage: Stage) -> bool:
+        # each helper binary waits on the other helpers, so if two helpers each
+        # ran a different query first, neither query could finish. The
+        # coordinator runs one query at a time, so waiting for it to run this
+        # one orders the run stage the same way on every helper.
+        if stage == Stage.RUN and self.current_stage != Stage.RUN:
+            # don't hold up the builds of other queries meanwhile
+            self.leave_stage()
+            if not self.wait_for_coordinator():
+                return False
+        return super().enter_stage(stage)
+
+    def wait_for_coordinator(self) -> bool:
+        """
+        Waits until the coordinator is running this query, i.e., waiting for
+        the helpers to start. Returns False if this query finishes first, and
+        crashes it if the coordinator's query finishes, or stays unknown.
+        """
+        settings = get_settings()
+        coordinator = settings.helpers[Role.COORDINATOR]
+        self.logger.info("Waiting for the coordinator to run the query.")
+        interval = settings.helper_poll_interval
+        unknown_since = None
+        while not self.finished:
+            status = coordinator.get_current_query_status(self.query_id)
+            if Status.WAITING_TO_START <= status < Status.COMPLETE:
+                return True
+            if status >= Status.COMPLETE:
+                self.logger.error(f"Coordinator's query is {status.name}.")
+                self.crash()
+                return False
+            if status in (Status.UNKNOWN, Status.NOT_FOUND):
+                unknown_since = unknown_since or time.monotonic()
+                if (
+                    time.monotonic() - unknown_since
+                    >= self.max_unknown_coordinator_wait_time
+                ):
+                    self.logger.error(f"Coordinator's query is {status.name}.")
+                    self.crash()
+                    return False
+            else:
+                unknown_since = None
+            self._finished.wait(interval)
+            interval = min(
+                interval * settings.helper_poll_backoff,
+                settings.helper_poll_max_interval,
+            )
+        return False
+
+    def ready(self):
+        # the query may have been killed while the port was probed, or is
+        # being killed now, from another thread
+        with self._status_lock:
+            if self.status == Status.IN_PROGRESS:
+                self.status = Status.READY
+
+    def on_status_change(self, status: Status):
+        if status >= Status.COMPLETE:
+            self._finished.set()
+        # push the transition, so the coordinator doesn't need to poll for it
+        sender = get_status_callback_sender()
+        if sender is not None:
+            sender.send(self.query_id, status)
+
+
+@dataclass(kw_only=True)
+class IPABuildQuery(IPAQuery, ABC):
+    """
+    IPABuildQuery only checks out and compiles a binary, so that a later query
+    for the same compiled_id can skip straight to running it.
+    """
+
+    query_type: ClassVar[Optional[str]] = "build"
+
+    def send_kill_signals(self):
+        # a build only runs on this sidecar, so there are no helpers to signal
+        return
+
+
+@dataclass(kw_only=True)
+class IPAHelperBuildQuery(IPABuildQuery):
+    gate_type: GateType
+    stall_detection: bool
+    multi_threading: bool
+    disable_metrics: bool
+    reveal_aggregation: bool
+
+    step_classes: ClassVar[list[type[Step]]] = [
+        IPACloneStep,
+        IPAUpdateRemoteOriginStep,
+        IPAFetchUpstreamStep,
+        IPACheckoutCommitStep,
+        IPAHelperCompileStep,
+    ]
+
+    @property
+    def binary_path(self) -> Path:
+        return self.paths.helper_binary_path
+
+
+@dataclass(kw_only=True)
+class IPACoordinatorBuildQuery(IPABuildQuery):
+    step_classes: ClassVar[list[type[Step]]] = [
+        IPACloneStep,
+        IPAUpdateRemoteOriginStep,
+        IPAFetchUpstreamStep,
+        IPACheckoutCommitStep,
+        IPACorrdinatorCompileStep,
+    ]
+
+    @property
+    def binary_path(self) -> Path:
+        return self.paths.report_collector_binary_path
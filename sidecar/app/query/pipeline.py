@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .step import Stage
+
+if TYPE_CHECKING:
+    from .base import Query
+
+
+@dataclass
+class StageSlots:
+    """
+    StageSlots allows up to `capacity` queries in a stage at once.
+    Other queries wait, in the order they arrived, for a slot to free up.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    stage: Stage
+    capacity: int
+    active: dict[str, float] = field(init=False, default_factory=dict)
+    waiting: list[str] = field(init=False, default_factory=list)
+    completed: int = field(init=False, default=0)
+    total_wait_time: float = field(init=False, default=0.0)
+    total_time: float = field(init=False, default=0.0)
+    _condition: threading.Condition = field(
+        init=False, default_factory=threading.Condition, repr=False
+    )
+
+    def acquire(self, query: Query, poll_interval: float = 0.5) -> bool:
+        """
+        Blocks until a slot is available, returning False instead
+        if the query finishes (e.g., is killed) while it waits.
+        """
+        wait_start = time.time()
+        with self._condition:
+            self.waiting.append(query.query_id)
+            try:
+                while (
+                    len(self.active) >= self.capacity
+                    or self.waiting[0] != query.query_id
+                ):
+                    if query.finished:
+                        return False
+                    self._condition.wait(timeout=poll_interval)
+            finally:
+                self.waiting.remove(query.query_id)
+                self._condition.notify_all()
+            now = time.time()
+            self.active[query.query_id] = now
+            self.total_wait_time += now - wait_start
+            query.timings[f"{self.stage}_wait_seconds"] = now - wait_start
+        return True
+
+    def release(self, query: Query):
+        with self._condition:
+            start_time = self.active.pop(query.query_id, None)
+            if start_time is not None:
+                duration = time.time() - start_time
+                self.completed += 1
+                self.total_time += duration
+                query.timings[f"{self.stage}_seconds"] = duration
+            self._condition.notify_all()
+
+    @property
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "capacity": self.capacity,
+                "active": list(self.active),
+                "waiting": list(self.waiting),
+                "queue_depth": len(self.waiting),
+                "completed": self.completed,
+                "average_wait_seconds": (
+                    self.total_wait_time / self.completed if self.completed else 0.0
+                ),
+                "average_seconds": (
+                    self.total_time / self.completed if self.completed else 0.0
+                ),
+            }
+
+
+@dataclass
+class Pipeline:
+    """
+    Pipeline splits queries into a build stage and a run stage,
+    each with its own capacity, so that one query can build while
+    another one runs.
+    """
+
+    max_parallel_builds: int = 1
+    max_parallel_runs: int = 1
+    stages: dict[Stage, StageSlots] = field(init=False)
+
+    def __post_init__(self):
+        self.stages = {
+            Stage.BUILD: StageSlots(Stage.BUILD, self.max_parallel_builds),
+            Stage.RUN: StageSlots(Stage.RUN, self.max_parallel_runs),
+        }
+
+    def acquire(self, query: Query, stage: Stage) -> bool:
+        return self.stages[stage].acquire(query)
+
+    def release(self, query: Query, stage: Stage):
+        self.stages[stage].release(query)
+
+    @property
+    def stats(self) -> dict:
+        return {str(stage): slots.stats for stage, slots in self.stages.items()}
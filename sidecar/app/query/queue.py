@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+
+@dataclass
+class QueueEntry:
+    query_id: str
+    query_type: str
+    params: dict[str, Any]
+    priority: int = 0
+    sequence: int = 0
+    submitted_at: float = field(default_factory=time.time)
+
+    @property
+    def sort_key(self) -> tuple[int, int]:
+        # higher priority first, then first in first out
+        return (-self.priority, self.sequence)
+
+
+@dataclass
+class AdmissionQueue:
+    """
+    AdmissionQueue holds queries waiting for capacity, in priority order and
+    first in first out within a priority.
+
+    If path is set, the queue is written there after every change, and can be
+    loaded again after a restart. The params of each entry must be JSON
+    serializable, and are used to rebuild the query.
+    """
+
+    path: Optional[Path] = None
+    entries: list[QueueEntry] = field(init=False, default_factory=list)
+    _sequence: int = field(init=False, default=0, repr=False)
+    _lock: threading.RLock = field(
+        init=False, default_factory=threading.RLock, repr=False
+    )
+
+    def __post_init__(self):
+        if self.path is not None and self.path.exists():
+            with self.path.open("r", encoding="utf8") as f:
+                self.entries = [QueueEntry(**entry) for entry in json.load(f)]
+            self.entries.sort(key=lambda entry: entry.sort_key)
+            self._sequence = max((entry.sequence for entry in self.entries), default=0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, query_id: str) -> bool:
+        return self.position(query_id) is not None
+
+    def _save(self):
+        if self.path is None:
+            return
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf8") as f:
+            json.dump([asdict(entry) for entry in self.entries], f)
+        tmp_path.replace(self.path)
+
+    def push(
+        self,
+        query_id: str,
+        query_type: str,
+        params: dict[str, Any],
+        priority: int = 0,
+    ) -> int:
+        """Adds a query to the queue, returning its (zero-indexed) position."""
+        with self._lock:
+            self._sequence += 1
+            entry = QueueEntry(
+                query_id=query_id,
+                query_type=query_type,
+                params=params,
+                priority=priority,
+                sequence=self._sequence,
+            )
+            self.entries.append(entry)
+            self.entries.sort(key=lambda entry: entry.sort_key)
+            self._save()
+            return self.entries.index(entry)
+
+    def peek(self) -> Optional[QueueEntry]:
+        with self._lock:
+            if not self.entries:
+                return None
+            return self.entries[0]
+
+    def pop(self) -> Optional[QueueEntry]:
+        with self._lock:
+            if not self.entries:
+                return None
+            entry = self.entries.pop(0)
+            self._save()
+            return entry
+
+    def remove(self, query_id: str) -> bool:
+        with self._lock:
+            position = self.position(query_id)
+            if position is None:
+                return False
+            del self.entries[position]
+            self._save()
+            return True
+
+    def position(self, query_id: str) -> Optional[int]:
+        with self._lock:
+            for position, entry in enumerate(self.entries):
+                if entry.query_id == query_id:
+                    return position
+            return None
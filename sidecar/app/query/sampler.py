@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+import psutil
+
+SAMPLE_INTERVAL_SECONDS = 1.0
+# 10 minutes of samples, at the default interval
+MAX_SAMPLES = 600
+
+
+@dataclass(frozen=True)
+class ResourceSample:
+    """The resources used by a process and all of its descendants, summed."""
+
+    # pylint: disable=too-many-instance-attributes
+    sequence: int
+    timestamp: float
+    processes: int = 0
+    cpu_percent: float = 0.0
+    memory_rss_usage: int = 0
+    read_bytes: int = 0
+    write_bytes: int = 0
+    num_threads: int = 0
+    ctx_switches: int = 0
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class ProcessTreeSampler:
+    """
+    ProcessTreeSampler samples the process tree rooted at pid() every interval
+    seconds, on a background thread, into a buffer of the last max_samples.
+    The psutil.Process of each process is kept between samples, so its CPU
+    use is measured over the interval. I/O bytes and context switches are
+    totals, of the processes alive when sampled.
+
+    While there is no process (e.g., for a step which doesn't run one), the
+    samples are all 0.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    pid: Callable[[], Optional[int]] = field(repr=False)
+    interval: float = SAMPLE_INTERVAL_SECONDS
+    max_samples: int = MAX_SAMPLES
+    sequence: int = field(init=False, default=0)
+    _samples: deque[ResourceSample] = field(init=False, repr=False)
+    _processes: dict[int, psutil.Process] = field(
+        init=False, default_factory=dict, repr=False
+    )
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+    _stopped: threading.Event = field(
+        init=False, default_factory=threading.Event, repr=False
+    )
+    _thread: Optional[threading.Thread] = field(init=False, default=None, repr=False)
+
+    def __post_init__(self):
+        self._samples = deque(maxlen=self.max_samples)
+
+    def _process(self, process: psutil.Process) -> psutil.Process:
+        # the cached Process has the last CPU times, unless the pid was reused
+        cached = self._processes.get(process.pid)
+        return cached if cached == process else process
+
+    def _tree(self, pid: int) -> list[psutil.Process]:
+        try:
+            root = self._process(psutil.Process(pid))
+            return [root, *map(self._process, root.children(recursive=True))]
+        except psutil.NoSuchProcess:
+            return []
+
+    def sample(self) -> ResourceSample:
+        pid = self.pid()
+        processes = [] if pid is None else self._tree(pid)
+        totals = {
+            "processes": 0,
+            "cpu_percent": 0.0,
+            "memory_rss_usage": 0,
+            "read_bytes": 0,
+            "write_bytes": 0,
+            "num_threads": 0,
+            "ctx_switches": 0,
+        }
+        sampled = {}
+        for process in processes:
+            try:
+                with process.oneshot():
+                    cpu_percent = process.cpu_percent()
+                    rss = process.memory_info().rss
+                    num_threads = process.num_threads()
+                    ctx_switches = sum(process.num_ctx_switches())
+                    # not available on every platform
+                    io = getattr(process, "io_counters", lambda: None)()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            sampled[process.pid] = process
+            totals["processes"] += 1
+            totals["cpu_percent"] += cpu_percent
+            totals["memory_rss_usage"] += rss
+            totals["num_threads"] += num_threads
+            totals["ctx_switches"] += ctx_switches
+            if io is not None:
+                totals["read_bytes"] += io.read_bytes
+                totals["write_bytes"] += io.write_bytes
+        self._processes = sampled
+        with self._lock:
+            self.sequence += 1
+            sample = ResourceSample(self.sequence, time.time(), **totals)
+            self._samples.append(sample)
+        return sample
+
+    def _run(self):
+        self.sample()
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="resource-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 1)
+
+    @property
+    def latest(self) -> Optional[ResourceSample]:
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def samples_since(self, sequence: int) -> list[ResourceSample]:
+        """The samples still buffered which were taken after sequence."""
+        with self._lock:
+            return [sample for sample in self._samples if sample.sequence > sequence]
@@ -4,18 +4,25 @@ import time
 from dataclasses import dataclass, field
 from enum import IntEnum, auto
 from pathlib import Path
-from typing import NamedTuple, Optional
+from typing import TYPE_CHECKING, NamedTuple, Optional, Sequence
 
 import loguru
 
+if TYPE_CHECKING:
+    from .status_broker import StatusBroker
+    from .status_store import StatusStore
+
 
 class Status(IntEnum):
     UNKNOWN = auto()
     NOT_FOUND = auto()
+    QUEUED = auto()
     STARTING = auto()
     COMPILING = auto()
     WAITING_TO_START = auto()
     IN_PROGRESS = auto()
+    # the helper binary is accepting connections
+    READY = auto()
     COMPLETE = auto()
     KILLED = auto()
     CRASHED = auto()
@@ -34,25 +41,55 @@ StatusChangeEvent = NamedTuple(
 )
 
 
+def read_status_history(file_path: Path) -> list[StatusChangeEvent]:
+    status_history = []
+    with file_path.open("r", encoding="utf8") as f:
+        for line in f:
+            status_str, timestamp = line.split(",")
+            status_history.append(
+                StatusChangeEvent(status=Status[status_str], timestamp=float(timestamp))
+            )
+    return status_history
+
+
+def status_event_json(status_history: Sequence[StatusChangeEvent]) -> dict:
+    if not status_history:
+        current_status_event = StatusChangeEvent(
+            status=Status.UNKNOWN, timestamp=time.time()
+        )
+    else:
+        current_status_event = status_history[-1]
+    status_event = {
+        "status": current_status_event.status.name,
+        "start_time": current_status_event.timestamp,
+    }
+    if current_status_event.status >= Status.COMPLETE and len(status_history) >= 2:
+        status_event["start_time"] = status_history[-2].timestamp
+        status_event["end_time"] = current_status_event.timestamp
+    return status_event
+
+
 @dataclass
 class StatusHistory:
-    file_path: Path = field(init=True, repr=False)
+    query_id: str = field(init=True, repr=False)
+    store: StatusStore = field(init=True, repr=False, compare=False)
     logger: loguru.Logger = field(init=True, repr=False, compare=False)
+    query_type: Optional[str] = field(init=True, repr=False, default=None)
+    broker: Optional[StatusBroker] = field(
+        init=True, repr=False, compare=False, default=None
+    )
     _status_history: list[StatusChangeEvent] = field(
         init=False, default_factory=list, repr=True
     )
 
     def __post_init__(self):
-        if self.file_path.exists():
-            self.logger.debug(f"Loading status history from file {self.file_path}")
-            with self.file_path.open("r", encoding="utf8") as f:
-                for line in f:
-                    status_str, timestamp = line.split(",")
-                    self._status_history.append(
-                        StatusChangeEvent(
-                            status=Status[status_str], timestamp=float(timestamp)
-                        )
-                    )
+        self.logger.debug(f"Loading status history from {self.store}")
+        self._status_history = self.store.load(self.query_id)
+
+    def clear(self):
+        """Forgets the history, e.g., before the query is started again."""
+        self.store.delete(self.query_id)
+        self._status_history = []
 
     @property
     def locking_status(self):
@@ -64,12 +101,12 @@ class StatusHistory:
             timestamp = time.time()
         assert status > self.current_status
         assert self.current_status < self.locking_status
-        self._status_history.append(
-            StatusChangeEvent(status=status, timestamp=timestamp)
-        )
-        with self.file_path.open("a", encoding="utf8") as f:
-            self.logger.debug(f"updating status: {status=}")
-            f.write(f"{status.name},{timestamp}\n")
+        event = StatusChangeEvent(status=status, timestamp=timestamp)
+        self._status_history.append(event)
+        self.logger.debug(f"updating status: {status=}")
+        self.store.append(self.query_id, self.query_type, event)
+        if self.broker is not None:
+            self.broker.publish(self.query_id, self.status_event_json)
 
     @property
     def current_status_event(self):
@@ -83,11 +120,4 @@ class StatusHistory:
 
     @property
     def status_event_json(self):
-        status_event = {
-            "status": self.current_status_event.status.name,
-            "start_time": self.current_status_event.timestamp,
-        }
-        if self.current_status >= Status.COMPLETE and len(self._status_history) >= 2:
-            status_event["start_time"] = self._status_history[-2].timestamp
-            status_event["end_time"] = self.current_status_event.timestamp
-        return status_event
+        return status_event_json(self._status_history)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+
+@dataclass
+class StatusTopic:
+    """
+    StatusTopic holds the latest status event of one query, and is shared by
+    every subscriber to that query. version is bumped on every publish.
+    """
+
+    query_id: str
+    event_json: Optional[dict] = None
+    version: int = 0
+    subscribers: int = field(init=False, default=0)
+    waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = field(
+        init=False, default_factory=set, repr=False
+    )
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+@dataclass
+class StatusBroker:
+    """
+    StatusBroker is an in-process pub/sub of status changes. StatusHistory
+    publishes each change (from whichever thread runs the query), and
+    subscribers wait for them on an event loop. Changes to queries without
+    subscribers are dropped.
+    """
+
+    published: int = field(init=False, default=0)
+    _topics: dict[str, StatusTopic] = field(
+        init=False, default_factory=dict, repr=False
+    )
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    def publish(self, query_id: str, event_json: dict):
+        with self._lock:
+            topic = self._topics.get(query_id)
+            if topic is None:
+                return
+            topic.event_json = event_json
+            topic.version += 1
+            self.published += 1
+            waiters, topic.waiters = topic.waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # the subscriber's loop has closed
+                pass
+
+    @contextmanager
+    def subscribe(self, query_id: str) -> Iterator[StatusTopic]:
+        with self._lock:
+            topic = self._topics.setdefault(query_id, StatusTopic(query_id))
+            topic.subscribers += 1
+        try:
+            yield topic
+        finally:
+            with self._lock:
+                topic.subscribers -= 1
+                if topic.subscribers == 0:
+                    del self._topics[query_id]
+
+    async def wait_for_change(
+        self, topic: StatusTopic, version: int, timeout: Optional[float]
+    ) -> bool:
+        """Returns False if timeout passes before topic changes from version."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            if topic.version != version:
+                return True
+            topic.waiters.add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                topic.waiters.discard(waiter)
+        return True
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "topics": len(self._topics),
+                "subscribers": sum(
+                    topic.subscribers for topic in self._topics.values()
+                ),
+                "published": self.published,
+            }
+
+
+@lru_cache
+def get_status_broker() -> StatusBroker:
+    return StatusBroker()
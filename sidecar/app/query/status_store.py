@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from ..settings import get_settings
+from .status import Status, StatusChangeEvent, read_status_history
+
+
+@dataclass(frozen=True)
+class QueryRecord:
+    """A row of the query index: the current status of one query."""
+
+    query_id: str
+    query_type: Optional[str]
+    status: Status
+    created_at: float
+    updated_at: float
+    end_time: Optional[float] = None
+
+    def to_json(self) -> dict:
+        return {
+            "query_id": self.query_id,
+            "query_type": self.query_type,
+            "status": self.status.name,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "end_time": self.end_time,
+        }
+
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+class StatusStore(ABC):
+    """
+    StatusStore persists the StatusHistory of every query,
+    and indexes the current status of each query so they can be listed.
+    """
+
+    @abstractmethod
+    def load(self, query_id: str) -> list[StatusChangeEvent]:
+        ...
+
+    @abstractmethod
+    def append(
+        self, query_id: str, query_type: Optional[str], event: StatusChangeEvent
+    ):
+        ...
+
+    @abstractmethod
+    def delete(self, query_id: str):
+        ...
+
+    @abstractmethod
+    def version(self, query_id: str) -> Optional[int]:
+        """
+        Returns a value which changes whenever the history of query_id changes,
+        or None if there is no history for it.
+        """
+
+    @abstractmethod
+    def list_queries(
+        self,
+        status: Optional[Status] = None,
+        query_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[QueryRecord]:
+        """
+        Lists queries, most recently created first. since and until
+        filter on when the query was created.
+        """
+
+    def exists(self, query_id: str) -> bool:
+        return self.version(query_id) is not None
+
+
+def query_record(
+    query_id: str, query_type: Optional[str], history: list[StatusChangeEvent]
+) -> QueryRecord:
+    current = history[-1]
+    return QueryRecord(
+        query_id=query_id,
+        query_type=query_type,
+        status=current.status,
+        created_at=history[0].timestamp,
+        updated_at=current.timestamp,
+        end_time=current.timestamp if current.status >= Status.COMPLETE else None,
+    )
+
+
+@dataclass
+class FileStatusStore(StatusStore):
+    """
+    FileStatusStore appends the history of each query to its own file
+    in status_dir_path. Listing queries has to read every file, and the
+    query_type of a query isn't recorded.
+    """
+
+    status_dir_path: Path
+
+    def file_path(self, query_id: str) -> Path:
+        return self.status_dir_path / Path(query_id)
+
+    def load(self, query_id: str) -> list[StatusChangeEvent]:
+        file_path = self.file_path(query_id)
+        if not file_path.exists():
+            return []
+        return read_status_history(file_path)
+
+    def append(
+        self, query_id: str, query_type: Optional[str], event: StatusChangeEvent
+    ):
+        with self.file_path(query_id).open("a", encoding="utf8") as f:
+            f.write(f"{event.status.name},{event.timestamp}\n")
+
+    def delete(self, query_id: str):
+        self.file_path(query_id).unlink(missing_ok=True)
+
+    def version(self, query_id: str) -> Optional[int]:
+        try:
+            return os.stat(self.file_path(query_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def list_queries(
+        self,
+        status: Optional[Status] = None,
+        query_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[QueryRecord]:
+        if query_type is not None:
+            return []
+        records = []
+        for file_path in self.status_dir_path.iterdir():
+            if not file_path.is_file():
+                continue
+            history = read_status_history(file_path)
+            if not history:
+                continue
+            record = query_record(file_path.name, None, history)
+            if status is not None and record.status != status:
+                continue
+            if since is not None and record.created_at < since:
+                continue
+            if until is not None and record.created_at >= until:
+                continue
+            records.append(record)
+        records.sort(key=lambda record: record.created_at, reverse=True)
+        return records[offset : offset + limit]
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    query_id TEXT PRIMARY KEY,
+    query_type TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    end_time REAL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS queries_created_at ON queries (created_at);
+CREATE INDEX IF NOT EXISTS queries_status ON queries (status, created_at);
+CREATE INDEX IF NOT EXISTS queries_query_type ON queries (query_type, created_at);
+CREATE INDEX IF NOT EXISTS queries_updated_at ON queries (updated_at);
+CREATE TABLE IF NOT EXISTS status_events (
+    query_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS status_events_query_id
+    ON status_events (query_id, timestamp);
+"""
+
+
+@dataclass
+class SQLiteStatusStore(StatusStore):
+    """
+    SQLiteStatusStore keeps every status change, and an index of the current
+    status of each query, in an SQLite database in WAL mode.
+    """
+
+    db_path: Path
+    _connection: sqlite3.Connection = field(init=False, repr=False)
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    def __post_init__(self):
+        self._connection = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SQLITE_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def load(self, query_id: str) -> list[StatusChangeEvent]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, timestamp FROM status_events "
+                "WHERE query_id = ? ORDER BY rowid",
+                (query_id,),
+            ).fetchall()
+        return [
+            StatusChangeEvent(status=Status[status], timestamp=timestamp)
+            for status, timestamp in rows
+        ]
+
+    def _append(
+        self, query_id: str, query_type: Optional[str], event: StatusChangeEvent
+    ):
+        end_time = event.timestamp if event.status >= Status.COMPLETE else None
+        self._connection.execute(
+            "INSERT INTO status_events (query_id, status, timestamp) VALUES (?, ?, ?)",
+            (query_id, event.status.name, event.timestamp),
+        )
+        self._connection.execute(
+            "INSERT INTO queries "
+            "(query_id, query_type, status, created_at, updated_at, end_time, version) "
+            "VALUES (?, ?, ?, ?, ?, ?, 1) "
+            "ON CONFLICT (query_id) DO UPDATE SET "
+            "query_type = COALESCE(excluded.query_type, query_type), "
+            "status = excluded.status, "
+            "updated_at = excluded.updated_at, "
+            "end_time = excluded.end_time, "
+            "version = version + 1",
+            (
+                query_id,
+                query_type,
+                event.status.name,
+                event.timestamp,
+                event.timestamp,
+                end_time,
+            ),
+        )
+
+    def append(
+        self, query_id: str, query_type: Optional[str], event: StatusChangeEvent
+    ):
+        with self._lock, self._transaction():
+            self._append(query_id, query_type, event)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # with isolation_level=None, transactions are managed explicitly
+        self._connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def delete(self, query_id: str):
+        with self._lock, self._transaction():
+            self._connection.execute(
+                "DELETE FROM status_events WHERE query_id = ?", (query_id,)
+            )
+            self._connection.execute(
+                "DELETE FROM queries WHERE query_id = ?", (query_id,)
+            )
+
+    def query_sizes(self) -> list[tuple[str, float, int]]:
+        """
+        Returns the query_id, updated_at and size in bytes of every query.
+        The size is an estimate: the query's share of the pages in use,
+        by number of rows.
+        """
+        with self._lock:
+            (page_size,) = self._connection.execute("PRAGMA page_size").fetchone()
+            (page_count,) = self._connection.execute("PRAGMA page_count").fetchone()
+            (free_pages,) = self._connection.execute("PRAGMA freelist_count").fetchone()
+            rows = self._connection.execute(
+                "SELECT queries.query_id, queries.updated_at, "
+                "COUNT(status_events.rowid) FROM queries "
+                "LEFT JOIN status_events ON status_events.query_id = queries.query_id "
+                "GROUP BY queries.query_id"
+            ).fetchall()
+        used_bytes = (page_count - free_pages) * page_size
+        # one row in queries, and one per status change
+        total_rows = sum(num_events + 1 for _, _, num_events in rows)
+        return [
+            (query_id, updated_at, used_bytes * (num_events + 1) // total_rows)
+            for query_id, updated_at, num_events in rows
+        ]
+
+    def version(self, query_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT version FROM queries WHERE query_id = ?", (query_id,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def list_queries(
+        self,
+        status: Optional[Status] = None,
+        query_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[QueryRecord]:
+        conditions = []
+        params: list = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status.name)
+        if query_type is not None:
+            conditions.append("query_type = ?")
+            params.append(query_type)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT query_id, query_type, status, created_at, updated_at, end_time "
+                f"FROM queries {where}"
+                "ORDER BY created_at DESC, query_id LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [
+            QueryRecord(
+                query_id=query_id,
+                query_type=query_type,
+                status=Status[status],
+                created_at=created_at,
+                updated_at=updated_at,
+                end_time=end_time,
+            )
+            for query_id, query_type, status, created_at, updated_at, end_time in rows
+        ]
+
+    def migrate_status_files(self, status_dir_path: Path) -> int:
+        """
+        Imports the status files written by FileStatusStore, moving each file
+        into status_dir_path/migrated once it has been imported.
+        Returns the number of queries imported.
+        """
+        migrated_dir_path = status_dir_path / Path("migrated")
+        file_paths = [p for p in status_dir_path.iterdir() if p.is_file()]
+        if not file_paths:
+            return 0
+        migrated_dir_path.mkdir(exist_ok=True)
+        num_migrated = 0
+        for file_path in file_paths:
+            history = read_status_history(file_path)
+            with self._lock, self._transaction():
+                exists = self._connection.execute(
+                    "SELECT 1 FROM queries WHERE query_id = ?", (file_path.name,)
+                ).fetchone()
+                if history and not exists:
+                    for event in history:
+                        self._append(file_path.name, None, event)
+                    num_migrated += 1
+            file_path.rename(migrated_dir_path / file_path.name)
+        return num_migrated
+
+
+@lru_cache
+def get_status_store() -> StatusStore:
+    settings = get_settings()
+    if settings.status_backend == "file":
+        return FileStatusStore(settings.status_dir_path)
+    store = SQLiteStatusStore(settings.root_path / Path("status.db"))
+    num_migrated = store.migrate_status_files(settings.status_dir_path)
+    if num_migrated:
+        settings.logger.info(f"Migrated {num_migrated} status files to {store}")
+    return store
@@ -3,6 +3,7 @@ from __future__ import annotations
 import os
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+from enum import StrEnum
 from typing import TYPE_CHECKING, ClassVar, Optional
 
 import loguru
@@ -14,10 +15,21 @@ if TYPE_CHECKING:
     from .base import QueryTypeT
 
 
+class Stage(StrEnum):
+    """
+    Steps which prepare a query (e.g., checkout and compile) are in the BUILD stage,
+    so that they can overlap with another query in the RUN stage.
+    """
+
+    BUILD = "build"
+    RUN = "run"
+
+
 @dataclass(kw_only=True)
 class Step(ABC):
     skip: bool = field(init=False, default=False)
     status: ClassVar[Status] = Status.UNKNOWN
+    stage: ClassVar[Stage] = Stage.RUN
     success: Optional[bool] = field(init=False, default=None)
 
     @classmethod
@@ -55,6 +67,11 @@ class Step(ABC):
     def kill(self):
         ...
 
+    @property
+    def pid(self) -> Optional[int]:
+        """The process run by the step, if any, which is sampled while it runs."""
+        return None
+
     @property
     @abstractmethod
     def cpu_usage_percent(self) -> float:
@@ -91,6 +108,10 @@ class CommandStep(Step, ABC):
     def kill(self):
         self.command.kill()
 
+    @property
+    def pid(self) -> Optional[int]:
+        return self.command.pid
+
     @property
     def cpu_usage_percent(self) -> float:
         return self.command.cpu_usage_percent
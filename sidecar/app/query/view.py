@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import loguru
+
+from ..settings import get_settings
+from .status import Status, StatusChangeEvent, status_event_json
+from .status_store import StatusStore, get_status_store
+from .step import Stage
+
+
+@dataclass(frozen=True)
+class QueryView:
+    """
+    QueryView is a read only snapshot of a query which is not running on this server,
+    loaded from the StatusStore. It has the same read API as Query, but nothing
+    is computed (or logged) when it is read.
+    """
+
+    query_id: str
+    status_history: tuple[StatusChangeEvent, ...]
+    version: int
+    _status_event_json: dict[str, Any] = field(repr=False, compare=False)
+    current_stage: Optional[Stage] = field(init=False, default=None)
+
+    @classmethod
+    def load(cls, query_id: str, store: StatusStore, version: int) -> QueryView:
+        status_history = tuple(store.load(query_id))
+        return cls(
+            query_id=query_id,
+            status_history=status_history,
+            version=version,
+            _status_event_json=status_event_json(status_history),
+        )
+
+    @property
+    def status(self) -> Status:
+        if not self.status_history:
+            return Status.UNKNOWN
+        return self.status_history[-1].status
+
+    @property
+    def status_event_json(self) -> dict[str, Any]:
+        return dict(self._status_event_json)
+
+    @property
+    def started(self) -> bool:
+        return self.status >= Status.STARTING
+
+    @property
+    def finished(self) -> bool:
+        return self.status >= Status.COMPLETE
+
+    @property
+    def running(self) -> bool:
+        return False
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return {}
+
+    @property
+    def log_file_path(self) -> Path:
+        return get_settings().log_writer.log_file_path(self.query_id)
+
+    @property
+    def logger(self) -> loguru.Logger:
+        return get_settings().logger.bind(task=self.query_id)
+
+    @property
+    def cpu_usage_percent(self) -> float:
+        return 0
+
+    @property
+    def memory_rss_usage(self) -> int:
+        return 0
+
+
+@dataclass
+class QueryViewCache:
+    """
+    QueryViewCache keeps the QueryViews of up to max_size queries, evicting the
+    least recently used. A view is reloaded if the version of its history
+    in the StatusStore has changed since it was loaded.
+    """
+
+    max_size: int = 4096
+    hits: int = field(init=False, default=0)
+    misses: int = field(init=False, default=0)
+    _views: OrderedDict[str, QueryView] = field(
+        init=False, default_factory=OrderedDict, repr=False
+    )
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    def get(self, query_id: str) -> Optional[QueryView]:
+        store = get_status_store()
+        version = store.version(query_id)
+        if version is None:
+            self.invalidate(query_id)
+            return None
+
+        with self._lock:
+            view = self._views.get(query_id)
+            if view is not None and view.version == version:
+                self._views.move_to_end(query_id)
+                self.hits += 1
+                return view
+            self.misses += 1
+
+        view = QueryView.load(query_id, store, version)
+        with self._lock:
+            self._views[query_id] = view
+            self._views.move_to_end(query_id)
+            while len(self._views) > self.max_size:
+                self._views.popitem(last=False)
+        return view
+
+    def invalidate(self, query_id: str):
+        with self._lock:
+            self._views.pop(query_id, None)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._views),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class WorkerPool:
+    """
+    WorkerPool runs long, blocking work (e.g., a query) on a bounded pool of
+    named threads, rather than on the threadpool shared with the HTTP handlers.
+
+    It keeps track of how busy the pool is, for metrics.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    name: str
+    max_workers: int
+    pending: int = field(init=False, default=0)
+    busy: int = field(init=False, default=0)
+    completed: int = field(init=False, default=0)
+    busy_seconds: float = field(init=False, default=0.0)
+    created_at: float = field(init=False, default_factory=time.time)
+    _executor: ThreadPoolExecutor = field(init=False, repr=False)
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    def __post_init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=f"{self.name}-worker",
+        )
+
+    def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        start_time = time.time()
+        with self._lock:
+            self.pending -= 1
+            self.busy += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.busy -= 1
+                self.completed += 1
+                self.busy_seconds += time.time() - start_time
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        with self._lock:
+            self.pending += 1
+        return self._executor.submit(self._run, fn, *args)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            uptime = time.time() - self.created_at
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "busy": self.busy,
+                "pending": self.pending,
+                "completed": self.completed,
+                "utilization": self.busy / self.max_workers,
+                "average_utilization": (
+                    self.busy_seconds / (uptime * self.max_workers) if uptime else 0.0
+                ),
+            }
@@ -0,0 +1,86 @@
+from dataclasses import asdict
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Form, Request, status
+
+from ..helpers import Role, broadcast
+from ..query.base import Query
+from ..query.ipa import (
+    IPABuildQuery,
+    IPACoordinatorBuildQuery,
+    IPAHelperBuildQuery,
+    build_query_id,
+)
+from ..settings import get_settings
+from .http_helpers import (
+    HelperBuildOptions,
+    get_query_from_query_id,
+    ipa_helper_query_fields,
+    ipa_paths,
+)
+
+router = APIRouter(
+    prefix="/build",
+    tags=[
+        "build",
+    ],
+)
+
+
+@router.post("/{commit_hash}", status_code=status.HTTP_202_ACCEPTED)
+def start_build(
+    commit_hash: str,
+    options: Annotated[HelperBuildOptions, Depends()],
+    request: Request,
+    fan_out: Annotated[bool, Form()] = False,
+):
+    """
+    Compiles commit_hash in the background, ahead of a query for it.
+
+    A helper builds the helper binary with the given features, and the
+    coordinator builds report_collector. With fan_out, the coordinator also
+    starts the same build on every other helper.
+    """
+    query_manager = request.app.state.QUERY_MANAGER
+    settings = get_settings()
+
+    query: IPABuildQuery
+    if settings.role == Role.COORDINATOR:
+        query = IPACoordinatorBuildQuery(
+            query_id=build_query_id(commit_hash),
+            paths=ipa_paths(commit_hash, commit_hash),
+            commit_hash=commit_hash,
+        )
+    else:
+        fields = ipa_helper_query_fields(commit_hash, options)
+        query = IPAHelperBuildQuery(
+            query_id=build_query_id(fields["paths"].compiled_id), **fields
+        )
+    if query_manager.start_build(query) is None:
+        message = "Build already running"
+    else:
+        message = "Build started successfully"
+
+    helper_responses = []
+    if fan_out and settings.role == Role.COORDINATOR:
+        data = asdict(options)
+        responses = broadcast(
+            settings.other_helpers,
+            lambda helper: helper.start_build(commit_hash, data),
+        )
+        helper_responses = list(responses.values())
+
+    return {
+        "message": message,
+        "build_id": query.query_id,
+        "helper_responses": helper_responses,
+    }
+
+
+@router.get("/{build_id}/status")
+def get_build_status(
+    build_id: str,
+    request: Request,
+):
+    query = get_query_from_query_id(request.app.state.QUERY_MANAGER, Query, build_id)
+    return query.status_event_json
@@ -0,0 +1,51 @@
+import time
+
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from ..callbacks import (
+    MAX_CALLBACK_AGE_SECONDS,
+    SIGNATURE_HEADER,
+    StatusCallback,
+    get_helper_status_board,
+    verify,
+)
+from ..helpers import Role
+from ..settings import get_settings
+
+router = APIRouter(
+    prefix="/callbacks",
+    tags=[
+        "callbacks",
+    ],
+)
+
+
+@router.post("/status")
+async def status_callback(
+    request: Request,
+    signature: str = Header(alias=SIGNATURE_HEADER),
+):
+    """
+    Receives a status transition pushed by a helper, signed with its private key,
+    and wakes anything waiting on the status of that query.
+    """
+    body = await request.body()
+    try:
+        callback = StatusCallback.from_body(body)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid callback") from e
+
+    settings = get_settings()
+    helper = settings.helpers.get(callback.role)
+    if helper is None or callback.role == Role.COORDINATOR:
+        raise HTTPException(status_code=403, detail="Unknown helper")
+    if not verify(helper.public_key, body, signature):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    if abs(time.time() - callback.timestamp) > MAX_CALLBACK_AGE_SECONDS:
+        raise HTTPException(status_code=403, detail="Callback expired")
+
+    changed = get_helper_status_board().update(callback)
+    return {
+        "message": f"{callback.status.name} from helper {callback.role}",
+        "changed": changed,
+    }
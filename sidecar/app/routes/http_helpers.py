@@ -1,30 +1,107 @@
-from typing import Type
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Annotated, Any, Optional, Type, Union
 
-from fastapi import HTTPException
+from fastapi import Form, HTTPException, Response, status
 
+from ..local_paths import Paths
 from ..query.base import Query, QueryManager
+from ..query.ipa import GateType, helper_compiled_id
+from ..query.view import QueryView
+from ..settings import get_settings
 
 
 def get_query_from_query_id(
     query_manager: QueryManager,
     query_cls: Type[Query],
     query_id: str,
-) -> Query:
+) -> Union[Query, QueryView]:
     query = query_manager.get_from_query_id(query_cls, query_id)
     if query is None:
         raise HTTPException(status_code=404, detail=f"Query<{query_id}> not found")
     return query
 
 
-def check_capacity(
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+def submit_query(
     query_manager: QueryManager,
-) -> None:
-    if not query_manager.capacity_available:
+    query: Query,
+    query_type: str,
+    params: dict[str, Any],
+    priority: int,
+    response: Response,
+) -> dict[str, Any]:
+    queue_position = query_manager.submit(query, query_type, params, priority)
+    if queue_position is None:
+        query_manager.start_query(query)
+        return {"message": "Process started successfully", "query_id": query.query_id}
+
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {
+        "message": "Capacity unavailable, query queued",
+        "query_id": query.query_id,
+        "queue_position": queue_position,
+    }
+
+
+def ipa_paths(compiled_id: str, commit_hash: str) -> Paths:
+    settings = get_settings()
+    return Paths(
+        repo_path=settings.root_path / Path("ipa"),
+        config_path=settings.config_path,
+        compiled_id=compiled_id,
+        commit_hash=commit_hash,
+    )
+
+
+@dataclass
+class HelperBuildOptions:
+    """The features a helper binary is built with, as posted in a form."""
+
+    gate_type: Annotated[str, Form()]
+    stall_detection: Annotated[bool, Form()]
+    multi_threading: Annotated[bool, Form()]
+    disable_metrics: Annotated[bool, Form()]
+    reveal_aggregation: Annotated[bool, Form()]
+
+
+def ipa_helper_query_fields(
+    commit_hash: str, options: HelperBuildOptions
+) -> dict[str, Any]:
+    """
+    Fields of the helper queries (IPAHelperQuery and IPAHelperBuildQuery)
+    that build the helper binary with the given options.
+    """
+    compiled_id = helper_compiled_id(commit_hash, **asdict(options))
+    return {
+        **asdict(options),
+        "paths": ipa_paths(compiled_id, commit_hash),
+        "commit_hash": commit_hash,
+        "gate_type": GateType[options.gate_type.upper()],
+    }
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Returns the [start, end) of the one range in a Range header, or None if
+    there isn't one, and so the whole content is served. Raises a 416 if the
+    range is outside the content.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (header or "").strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        # no range, more than one, or not bytes
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        end = size if last == "" else min(int(last) + 1, size)
+    if start >= end:
         raise HTTPException(
-            status_code=503,
-            detail=(
-                f"Capacity unavailable. Currently running "
-                f"{len(query_manager.running_queries)} of "
-                f"{query_manager.max_parallel_queries} queries."
-            ),
+            status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
         )
+    return start, end
@@ -0,0 +1,87 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter, Request
+
+from ..janitor import get_janitor
+from ..log_tailer import get_log_tailers
+from ..query.status_broker import get_status_broker
+from ..settings import get_settings
+from ..target_cache import get_target_cache
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=[
+        "metrics",
+    ],
+)
+
+
+@router.get("/target-cache")
+def target_cache():
+    return get_target_cache().stats
+
+
+@router.get("/pipeline")
+def pipeline(
+    request: Request,
+):
+    query_manager = request.app.state.QUERY_MANAGER
+    return query_manager.pipeline.stats
+
+
+@router.get("/admission")
+def admission(
+    request: Request,
+):
+    query_manager = request.app.state.QUERY_MANAGER
+    return {
+        "enabled": query_manager.admission is not None,
+        **(query_manager.admission.stats if query_manager.admission else {}),
+        "running_queries": {
+            query_id: {
+                "estimate": asdict(query.resource_estimate),
+                "memory_rss_usage": query.memory_rss_usage,
+            }
+            for query_id, query in query_manager.running_queries.items()
+        },
+    }
+
+
+@router.get("/workers")
+def workers(
+    request: Request,
+):
+    query_manager = request.app.state.QUERY_MANAGER
+    return query_manager.worker_stats
+
+
+@router.get("/query-views")
+def query_views(
+    request: Request,
+):
+    query_manager = request.app.state.QUERY_MANAGER
+    return query_manager.views.stats
+
+
+@router.get("/status-broker")
+def status_broker():
+    return get_status_broker().stats
+
+
+@router.get("/log-tailers")
+def log_tailers():
+    return get_log_tailers().stats
+
+
+@router.get("/helpers")
+def helpers():
+    """Connection and latency metrics of the requests sent to each helper."""
+    return {
+        helper.role.name: helper.client.stats for helper in get_settings().other_helpers
+    }
+
+
+@router.get("/janitor")
+def janitor():
+    """The artifacts kept, and the bytes reclaimed, by the janitor."""
+    return get_janitor().stats
@@ -0,0 +1,55 @@
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from ..query.status import Status
+from ..query.status_store import get_status_store
+
+router = APIRouter(
+    prefix="/queries",
+    tags=[
+        "queries",
+    ],
+)
+
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+@router.get("")
+def list_queries(
+    status: Optional[str] = None,
+    query_type: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    """
+    Lists queries (including running ones) with their current status,
+    most recently created first. since and until are unix timestamps,
+    and filter on when the query was created.
+    """
+    status_filter = None
+    if status is not None:
+        try:
+            status_filter = Status[status.upper()]
+        except KeyError as e:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown status {status}"
+            ) from e
+
+    records = get_status_store().list_queries(
+        status=status_filter,
+        query_type=query_type,
+        since=since,
+        until=until,
+        # fetch one extra, to know if there is another page
+        limit=limit + 1,
+        offset=offset,
+    )
+    return {
+        "queries": [record.to_json() for record in records[:limit]],
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if len(records) > limit else None,
+    }
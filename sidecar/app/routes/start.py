@@ -1,17 +1,38 @@
 import json
-from datetime import datetime
+from dataclasses import asdict
+from itertools import islice
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Form, Request, status
+from fastapi import APIRouter, Depends, Form, HTTPException
+from fastapi import Query as QueryParam
+from fastapi import Request, Response, status
 from fastapi.responses import StreamingResponse
 
-from ..local_paths import Paths
-from ..query.base import Query
+from ..content_encoding import encode_chunks, negotiate_encoding
+from ..log_index import get_log_index
+from ..log_search import search_log
+from ..log_segments import iter_log_bytes, log_size
+from ..log_tailer import iter_file_chunks
+from ..log_writer import render_log_line
+from ..query.base import Query, QueryBuilder
 from ..query.demo_logger import DemoLoggerQuery
-from ..query.ipa import GateType, IPACoordinatorQuery, IPAHelperQuery
+from ..query.ipa import IPACoordinatorQuery, IPAHelperQuery, events_file_name
 from ..settings import get_settings
-from .http_helpers import check_capacity, get_query_from_query_id
+from .http_helpers import (
+    HelperBuildOptions,
+    get_query_from_query_id,
+    ipa_helper_query_fields,
+    ipa_paths,
+    parse_byte_range,
+    submit_query,
+)
+
+# log downloads are read, rendered and compressed in chunks of this size
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+# log searches return pages of this many records by default
+SEARCH_PAGE_LIMIT = 100
+SEARCH_MAX_PAGE_LIMIT = 1000
 
 router = APIRouter(
     prefix="/start",
@@ -33,51 +54,75 @@ def capacity_available(
     return {"capacity_available": query_manager.capacity_available}
 
 
-@router.get("/running-queries")
-def running_queries(
+@router.get("/queue")
+def queued_queries(
     request: Request,
 ):
     query_manager = request.app.state.QUERY_MANAGER
-    return {"running_queries": list(query_manager.running_queries.keys())}
+    return {
+        "queued_queries": [
+            {
+                "query_id": entry.query_id,
+                "query_type": entry.query_type,
+                "priority": entry.priority,
+                "submitted_at": entry.submitted_at,
+            }
+            for entry in query_manager.queue.entries
+        ]
+    }
 
 
-@router.post("/demo-logger/{query_id}", status_code=status.HTTP_201_CREATED)
-def demo_logger(
-    query_id: str,
-    num_lines: Annotated[int, Form()],
-    total_runtime: Annotated[int, Form()],
-    background_tasks: BackgroundTasks,
+@router.get("/running-queries")
+def running_queries(
     request: Request,
 ):
     query_manager = request.app.state.QUERY_MANAGER
-    check_capacity(query_manager)
+    return {"running_queries": list(query_manager.running_queries.keys())}
+
 
-    query = DemoLoggerQuery(
+def build_demo_logger_query(
+    query_id: str,
+    num_lines: int,
+    total_runtime: int,
+) -> Query:
+    return DemoLoggerQuery(
         query_id=query_id,
         num_lines=num_lines,
         total_runtime=total_runtime,
     )
-    background_tasks.add_task(query_manager.run_query, query)
-    return {"message": "Process started successfully", "query_id": query_id}
 
 
 # pylint: disable=too-many-arguments
 # pylint: disable=too-many-positional-arguments
-@router.post("/ipa-helper/{query_id}")
-def start_ipa_helper(
+@router.post("/demo-logger/{query_id}", status_code=status.HTTP_201_CREATED)
+def demo_logger(
     query_id: str,
-    commit_hash: Annotated[str, Form()],
-    gate_type: Annotated[str, Form()],
-    stall_detection: Annotated[bool, Form()],
-    multi_threading: Annotated[bool, Form()],
-    disable_metrics: Annotated[bool, Form()],
-    reveal_aggregation: Annotated[bool, Form()],
-    background_tasks: BackgroundTasks,
+    num_lines: Annotated[int, Form()],
+    total_runtime: Annotated[int, Form()],
     request: Request,
+    response: Response,
+    priority: Annotated[int, Form()] = 0,
 ):
-    query_manager = request.app.state.QUERY_MANAGER
-    check_capacity(query_manager)
+    params = {"num_lines": num_lines, "total_runtime": total_runtime}
+    query = build_demo_logger_query(query_id=query_id, **params)
+    return submit_query(
+        request.app.state.QUERY_MANAGER,
+        query,
+        "demo-logger",
+        params,
+        priority,
+        response,
+    )
 
+
+def build_ipa_helper_query(
+    query_id: str,
+    commit_hash: str,
+    size: Optional[int] = None,
+    malicious_security: bool = False,
+    **options,
+) -> Query:
+    """Builds an IPAHelperQuery, where options are those of HelperBuildOptions."""
     settings = get_settings()
     role = settings.role
     if not role or role == role.COORDINATOR:
@@ -85,32 +130,43 @@ def start_ipa_helper(
             f"Cannot start helper without helper role. Currently running {role=}."
         )
 
-    compiled_id = (
-        f"{commit_hash}_{gate_type}"
-        f"{'_stall-detection' if stall_detection else ''}"
-        f"{'_multi-threading' if multi_threading else ''}"
-        f"{'_disable-metrics' if disable_metrics else ''}"
-        f"{'_reveal-aggregation' if reveal_aggregation else ''}"
-    )
-
-    paths = Paths(
-        repo_path=settings.root_path / Path("ipa"),
-        config_path=settings.config_path,
-        compiled_id=compiled_id,
-    )
-    query = IPAHelperQuery(
-        paths=paths,
-        commit_hash=commit_hash,
+    return IPAHelperQuery(
         query_id=query_id,
-        gate_type=GateType[gate_type.upper()],
-        stall_detection=stall_detection,
-        multi_threading=multi_threading,
-        disable_metrics=disable_metrics,
-        reveal_aggregation=reveal_aggregation,
         port=settings.helper_port,
+        size=size,
+        malicious_security=malicious_security,
+        **ipa_helper_query_fields(commit_hash, HelperBuildOptions(**options)),
+    )
+
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+@router.post("/ipa-helper/{query_id}")
+def start_ipa_helper(
+    query_id: str,
+    commit_hash: Annotated[str, Form()],
+    options: Annotated[HelperBuildOptions, Depends()],
+    request: Request,
+    response: Response,
+    priority: Annotated[int, Form()] = 0,
+    size: Annotated[Optional[int], Form()] = None,
+    malicious_security: Annotated[bool, Form()] = False,
+):
+    params = {
+        "commit_hash": commit_hash,
+        **asdict(options),
+        "size": size,
+        "malicious_security": malicious_security,
+    }
+    query = build_ipa_helper_query(query_id=query_id, **params)
+    return submit_query(
+        request.app.state.QUERY_MANAGER,
+        query,
+        "ipa-helper",
+        params,
+        priority,
+        response,
     )
-    background_tasks.add_task(query_manager.run_query, query)
-    return {"message": "Process started successfully", "query_id": query_id}
 
 
 @router.get("/{query_id}/status")
@@ -118,59 +174,165 @@ def get_query_status(
     query_id: str,
     request: Request,
 ):
-    query = get_query_from_query_id(request.app.state.QUERY_MANAGER, Query, query_id)
+    query_manager = request.app.state.QUERY_MANAGER
+    query = get_query_from_query_id(query_manager, Query, query_id)
+    queue_position = query_manager.queue_position(query_id)
+    if queue_position is not None:
+        return {**query.status_event_json, "queue_position": queue_position}
     return query.status_event_json
 
 
+@router.get("/{query_id}/timings")
+def get_query_timings(
+    query_id: str,
+    request: Request,
+):
+    query = get_query_from_query_id(request.app.state.QUERY_MANAGER, Query, query_id)
+    return {"stage": query.current_stage, "timings": query.timings}
+
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+# pylint: disable=too-many-locals
 @router.get("/{query_id}/log-file")
 def get_ipa_helper_log_file(
     query_id: str,
     request: Request,
+    log_format: Annotated[Literal["text", "raw"], QueryParam(alias="format")] = "text",
+    line: Annotated[Optional[int], QueryParam(ge=0)] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
 ):
+    """
+    Downloads the log, rendered as text, or raw (one JSON record per line),
+    compressed with zstd or gzip if the client accepts them. The whole log
+    supports (single) Range requests, across its rotated segments. Either can
+    start at a line (counting from 0) or the time since, and end at the time until.
+    """
     query = get_query_from_query_id(request.app.state.QUERY_MANAGER, Query, query_id)
     settings = get_settings()
+    filename = f"{query_id}-{settings.role.name.title()}.log"
+    media_type = "text/plain" if log_format == "text" else "application/json"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    # a Range is of the identity encoding, so isn't combined with compression
+    encoding = None
+    if "range" not in request.headers:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
 
-    def iterfile():
-        with open(query.log_file_path, "rb") as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    d = datetime.fromtimestamp(
-                        float(data["record"]["time"]["timestamp"])
-                    )
-                    message = data["record"]["message"]
-                    yield f"{d.isoformat()} - {message}\n"
-                except (json.JSONDecodeError, KeyError):
-                    yield line
+    file_path = query.log_file_path
+    if log_format == "text":
+        file_path = settings.log_writer.text_file_path(query_id)
+    if line is None and since is None and until is None and file_path.exists():
+        if encoding is None:
+            size = log_size(file_path)
+            byte_range = parse_byte_range(request.headers.get("range"), size)
+            start, end = byte_range or (0, size)
+            headers.update(
+                {"Accept-Ranges": "bytes", "Content-Length": str(end - start)}
+            )
+            if byte_range is not None:
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            return StreamingResponse(
+                iter_log_bytes(file_path, start, end, DOWNLOAD_CHUNK_BYTES),
+                status_code=(
+                    status.HTTP_206_PARTIAL_CONTENT
+                    if byte_range is not None
+                    else status.HTTP_200_OK
+                ),
+                headers=headers,
+                media_type=media_type,
+            )
+        return StreamingResponse(
+            encode_chunks(
+                iter_file_chunks(file_path, chunk_bytes=DOWNLOAD_CHUNK_BYTES),
+                encoding,
+            ),
+            headers=headers,
+            media_type=media_type,
+        )
 
+    # part of the log, or a log written before there were text renderings,
+    # is rendered from the log itself
+    index = get_log_index(query.log_file_path)
+    start = index.resolve(line=line, since=since)
+    end = index.offset_for_time(until) if until is not None else None
+    chunks = iter_file_chunks(
+        query.log_file_path, start, end, chunk_bytes=DOWNLOAD_CHUNK_BYTES
+    )
+    if log_format == "text":
+        chunks = (
+            "".join(
+                render_log_line(log_line) for log_line in chunk.splitlines(True)
+            ).encode("utf8")
+            for chunk in chunks
+        )
     return StreamingResponse(
-        iterfile(),
-        headers={
-            "Content-Disposition": (
-                f'attachment; filename="{query_id}-{settings.role.name.title()}.log"'
-            )
-        },
-        media_type="text/plain",
+        encode_chunks(chunks, encoding), headers=headers, media_type=media_type
     )
 
 
 # pylint: disable=too-many-arguments
 # pylint: disable=too-many-positional-arguments
-@router.post("/ipa-query/{query_id}")
-def start_ipa_query(
+@router.get("/{query_id}/logs")
+def search_logs(
     query_id: str,
-    commit_hash: Annotated[str, Form()],
-    size: Annotated[int, Form()],
-    max_breakdown_key: Annotated[int, Form()],
-    max_trigger_value: Annotated[int, Form()],
-    per_user_credit_cap: Annotated[int, Form()],
-    malicious_security: Annotated[bool, Form()],
-    background_tasks: BackgroundTasks,
     request: Request,
+    level: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    q: Optional[str] = None,
+    offset: Annotated[Optional[int], QueryParam(ge=0)] = None,
+    limit: Annotated[
+        int, QueryParam(ge=1, le=SEARCH_MAX_PAGE_LIMIT)
+    ] = SEARCH_PAGE_LIMIT,
+    stream: bool = False,
 ):
-    query_manager = request.app.state.QUERY_MANAGER
-    check_capacity(query_manager)
+    """
+    Searches the log for the records logged at level or above, between the
+    times since and until, whose message contains q. Returns a page of up to
+    limit records, and the offset to pass to get the next page (or None if
+    it's the last), or, with stream, every record as a line of JSON.
+    """
+    query = get_query_from_query_id(request.app.state.QUERY_MANAGER, Query, query_id)
+    min_level = 0
+    if level is not None:
+        try:
+            min_level = get_settings().logger.level(level.upper()).no
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown log level {level}"
+            ) from e
+    index = get_log_index(query.log_file_path)
+    start = index.resolve(offset=offset, since=since)
+    end = index.offset_for_time(until) if until is not None else None
+    matches = search_log(index, start, end, min_level, q)
+    if stream:
+        return StreamingResponse(
+            (json.dumps(match._asdict()) + "\n" for match in matches),
+            media_type="application/x-ndjson",
+        )
+    # one more than a page, to know if there's another
+    page = list(islice(matches, limit + 1))
+    matches.close()
+    return {
+        "records": [match._asdict() for match in page[:limit]],
+        "next_offset": page[limit].offset if len(page) > limit else None,
+    }
+
 
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+def build_ipa_query(
+    query_id: str,
+    commit_hash: str,
+    size: int,
+    max_breakdown_key: int,
+    max_trigger_value: int,
+    per_user_credit_cap: int,
+    malicious_security: bool,
+) -> Query:
     settings = get_settings()
     role = settings.role
     if role != role.COORDINATOR:
@@ -179,17 +341,14 @@ def start_ipa_query(
             "Cannot start query without coordinator role."
         )
 
-    paths = Paths(
-        repo_path=settings.root_path / Path("ipa"),
-        config_path=settings.config_path,
-        compiled_id=commit_hash,
-    )
+    paths = ipa_paths(commit_hash, commit_hash)
     test_data_path = paths.repo_path / Path("test_data/input")
-    query = IPACoordinatorQuery(
+    return IPACoordinatorQuery(
         query_id=query_id,
         paths=paths,
         commit_hash=commit_hash,
-        test_data_file=test_data_path / Path(f"events-{size}.txt"),
+        test_data_file=test_data_path
+        / Path(events_file_name(size, max_breakdown_key, max_trigger_value)),
         size=size,
         max_breakdown_key=max_breakdown_key,
         max_trigger_value=max_trigger_value,
@@ -197,5 +356,43 @@ def start_ipa_query(
         malicious_security=malicious_security,
     )
 
-    background_tasks.add_task(query_manager.run_query, query)
-    return {"message": "Process started successfully", "query_id": query_id}
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
+@router.post("/ipa-query/{query_id}")
+def start_ipa_query(
+    query_id: str,
+    commit_hash: Annotated[str, Form()],
+    size: Annotated[int, Form()],
+    max_breakdown_key: Annotated[int, Form()],
+    max_trigger_value: Annotated[int, Form()],
+    per_user_credit_cap: Annotated[int, Form()],
+    malicious_security: Annotated[bool, Form()],
+    request: Request,
+    response: Response,
+    priority: Annotated[int, Form()] = 0,
+):
+    params = {
+        "commit_hash": commit_hash,
+        "size": size,
+        "max_breakdown_key": max_breakdown_key,
+        "max_trigger_value": max_trigger_value,
+        "per_user_credit_cap": per_user_credit_cap,
+        "malicious_security": malicious_security,
+    }
+    query = build_ipa_query(query_id=query_id, **params)
+    return submit_query(
+        request.app.state.QUERY_MANAGER,
+        query,
+        "ipa-query",
+        params,
+        priority,
+        response,
+    )
+
+
+QUERY_BUILDERS: dict[str, QueryBuilder] = {
+    "demo-logger": build_demo_logger_query,
+    "ipa-helper": build_ipa_helper_query,
+    "ipa-query": build_ipa_query,
+}
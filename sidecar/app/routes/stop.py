@@ -17,7 +17,9 @@ def finish(
     query_id: str,
     request: Request,
 ):
-    query = get_query_from_query_id(request.app.state.QUERY_MANAGER, Query, query_id)
+    query_manager = request.app.state.QUERY_MANAGER
+    query = get_query_from_query_id(query_manager, Query, query_id)
+    query_manager.remove_from_queue(query_id)
 
     query.logger.info(f"{query=}")
     if query.status < Status.COMPLETE:
@@ -32,7 +34,9 @@ def kill(
     query_id: str,
     request: Request,
 ):
-    query = get_query_from_query_id(request.app.state.QUERY_MANAGER, Query, query_id)
+    query_manager = request.app.state.QUERY_MANAGER
+    query = get_query_from_query_id(query_manager, Query, query_id)
+    query_manager.remove_from_queue(query_id)
 
     query.logger.info(f"kill called for {query_id=}")
     if query.status < Status.COMPLETE:
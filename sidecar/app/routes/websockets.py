@@ -1,13 +1,21 @@
 import asyncio
-import time
 from contextlib import asynccontextmanager
+from typing import Optional, Union
 
 from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from websockets import ConnectionClosedError, ConnectionClosedOK
 
+from ..log_index import get_log_index
+from ..log_tailer import get_log_tailers, read_file_batches
 from ..query.base import Query
+from ..query.sampler import SAMPLE_INTERVAL_SECONDS
+from ..query.status_broker import get_status_broker
+from ..query.view import QueryView
 from .http_helpers import get_query_from_query_id
 
+# status changes are pushed, this only bounds how long a missed change goes unseen
+STATUS_RECHECK_SECONDS = 30
+
 router = APIRouter(
     prefix="/ws",
     tags=[
@@ -27,47 +35,90 @@ async def use_websocket(websocket):
         await websocket.close()
 
 
+def is_live(query: Union[Query, QueryView]) -> bool:
+    """
+    True until a query on this server finishes, including while it's queued or
+    waiting for a stage. A QueryView is a snapshot, which never changes.
+    """
+    return isinstance(query, Query) and not query.finished
+
+
 @router.websocket("/status/{query_id}")
 async def status_websocket(
     websocket: WebSocket,
     query_id: str,
+    heartbeat: Optional[float] = None,
 ):
+    """
+    Sends the status of the query, and then each time it changes until the query
+    finishes. If heartbeat is set, the status is also resent after that many
+    seconds without a change.
+    """
     query_manager = websocket.app.state.QUERY_MANAGER
     query = query_manager.get_from_query_id(Query, query_id)
     if query is None:
         raise HTTPException(status_code=404, detail="Query not found")
 
+    broker = get_status_broker()
     async with use_websocket(websocket) as websocket:
-        while query.running:
-            await websocket.send_json(query.status_event_json)
-            await asyncio.sleep(1)
+        # subscribe before reading the status, so no change is missed
+        with broker.subscribe(query_id) as topic:
+            version = topic.version
+            status_event = query.status_event_json
+            await websocket.send_json(status_event)
+            while is_live(query):
+                # in case the query finishes without publishing, check it regularly
+                timeout = min(
+                    heartbeat or STATUS_RECHECK_SECONDS, STATUS_RECHECK_SECONDS
+                )
+                changed = await broker.wait_for_change(topic, version, timeout)
+                version = topic.version
+                if changed or heartbeat is not None:
+                    status_event = query.status_event_json
+                    await websocket.send_json(status_event)
 
-        await websocket.send_json(query.status_event_json)
+            if query.status_event_json != status_event:
+                await websocket.send_json(query.status_event_json)
 
 
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-positional-arguments
 @router.websocket("/logs/{query_id}")
 async def logs_websocket(
     websocket: WebSocket,
     query_id: str,
+    offset: Optional[int] = None,
+    line: Optional[int] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
 ):
+    """
+    Sends the log of the query, and follows it until the query finishes.
+    Each frame is a batch of log records, one per line.
+
+    A reconnecting client can resume from a byte offset, or a line (counting
+    from 0), rather than the start of the log. since and until select a time
+    window instead, which isn't followed.
+    """
     query = get_query_from_query_id(websocket.app.state.QUERY_MANAGER, Query, query_id)
+    index = get_log_index(query.log_file_path)
+    start = await asyncio.to_thread(index.resolve, offset, line, since)
 
     async with use_websocket(websocket) as websocket:
-        with open(query.log_file_path, "r", encoding="utf8") as log_file:
-            if query.finished:
-                query.logger.info(f"{query_id=} complete. sending all logs.")
-                for line in log_file:
-                    await websocket.send_text(line)
-            else:
-                query.logger.info(f"{query_id=} running. tailing log file.")
-                while query.running:
-                    line = log_file.readline()
-                    if not line:
-                        await asyncio.sleep(0.1)
-                    else:
-                        await websocket.send_text(line)
-                for line in log_file:
-                    await websocket.send_text(line)
+        if query.finished or until is not None:
+            end = None
+            if until is not None:
+                end = await asyncio.to_thread(index.offset_for_time, until)
+            query.logger.info(f"{query_id=} complete. sending logs.")
+            async for data in read_file_batches(query.log_file_path, start, end):
+                await websocket.send_text(data.decode("utf8", errors="replace"))
+        else:
+            query.logger.info(f"{query_id=} running. tailing log file.")
+            async with get_log_tailers().subscribe(
+                query_id, query.log_file_path, lambda: is_live(query)
+            ) as tailer:
+                async for data in tailer.batches(start):
+                    await websocket.send_text(data.decode("utf8", errors="replace"))
 
 
 @router.websocket("/stats/{query_id}")
@@ -81,12 +132,15 @@ async def stats_websocket(
         if query.finished:
             query.logger.warning(f"{query_id=} is finished.")
             return
-        while query.running:
-            await websocket.send_json(
-                {
-                    "cpu_percent": query.cpu_usage_percent,
-                    "memory_rss_usage": query.memory_rss_usage,
-                    "timestamp": time.time(),
-                }
-            )
-            await asyncio.sleep(1)
+        sampler, sequence = None, 0
+        while is_live(query):
+            if query.sampler is not sampler:
+                # each step has its own sampler, so start from its first sample
+                sampler, sequence = query.sampler, 0
+            if sampler is None:
+                await asyncio.sleep(SAMPLE_INTERVAL_SECONDS)
+                continue
+            for sample in sampler.samples_since(sequence):
+                await websocket.send_json(sample.to_json())
+                sequence = sample.sequence
+            await asyncio.sleep(sampler.interval)
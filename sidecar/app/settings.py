@@ -3,13 +3,14 @@ from __future__ import annotations
 import sys
 from functools import lru_cache
 from pathlib import Path
-from typing import TYPE_CHECKING, Annotated, Any
+from typing import TYPE_CHECKING, Annotated, Any, Literal, Optional
 
 from loguru import logger
 from pydantic.functional_validators import BeforeValidator
 from pydantic_settings import BaseSettings
 
 from .helpers import Helper, Role, load_helpers_from_network_config
+from .log_writer import LOG_SEGMENT_MAX_BYTES, QueryLogWriter
 
 if TYPE_CHECKING:
     from loguru import Logger
@@ -25,8 +26,36 @@ class Settings(BaseSettings):
     network_config_path: Annotated[Path, BeforeValidator(gen_path)]
     role: Role
     helper_port: int
+    target_cache_max_bytes: Optional[int] = None
+    # worktrees of commits no query is using are kept for the next query of
+    # the same commit, removing the least recently used past this many
+    max_idle_worktrees: int = 4
+    status_backend: Literal["sqlite", "file"] = "sqlite"
+    helper_poll_interval: float = 1.0
+    helper_poll_backoff: float = 1.5
+    helper_poll_max_interval: float = 10.0
+    # used by helpers to sign the status callbacks they push to the coordinator,
+    # by default the helper's own key, see callback_private_key_path
+    private_key_pem_path: Optional[Path] = None
+    # query logs are rotated into segments of this size, which are compressed
+    log_segment_max_bytes: int = LOG_SEGMENT_MAX_BYTES
+    log_compression: Literal["gzip", "zstd"] = "gzip"
+    # the janitor deletes the oldest logs, status histories and test data of
+    # finished queries once they're older, or larger in total, than these
+    janitor_interval_seconds: float = 600.0
+    # the process tree of each running step is sampled at this interval,
+    # and the last resource_sample_buffer_size samples are kept
+    resource_sample_interval_seconds: float = 1.0
+    resource_sample_buffer_size: int = 600
+    log_retention_max_bytes: Optional[int] = None
+    log_retention_max_age_seconds: Optional[float] = None
+    status_retention_max_bytes: Optional[int] = None
+    status_retention_max_age_seconds: Optional[float] = None
+    test_data_retention_max_bytes: Optional[int] = None
+    test_data_retention_max_age_seconds: Optional[float] = None
     _helpers: dict[Role, Helper]
     _logger: "Logger"  # underscore prevents Pydantic from attempting to load this
+    _log_writer: QueryLogWriter
 
     def model_post_init(self, __context) -> None:
         self._helpers = load_helpers_from_network_config(self.network_config_path)
@@ -49,11 +78,27 @@ class Settings(BaseSettings):
             level="INFO",
             format=logger_format,
         )
+        # one sink writes the log file of every query, see Query.logger
+        self._log_writer = QueryLogWriter(
+            self.log_dir_path,
+            max_segment_bytes=self.log_segment_max_bytes,
+            compression=self.log_compression,
+        )
+        self._logger.add(
+            self._log_writer,
+            serialize=True,
+            filter=QueryLogWriter.filter,
+            enqueue=True,
+        )
 
     @property
     def logger(self) -> "Logger":
         return self._logger
 
+    @property
+    def log_writer(self) -> QueryLogWriter:
+        return self._log_writer
+
     @property
     def helper(self) -> Helper:
         return self._helpers[self.role]
@@ -66,6 +111,14 @@ class Settings(BaseSettings):
     def other_helpers(self) -> list[Helper]:
         return [helper for helper in self._helpers.values() if helper.role != self.role]
 
+    @property
+    def callback_private_key_path(self) -> Path:
+        # the helper binary's TLS key (see IPAStartHelperStep), whose
+        # certificate the coordinator already has from the network config
+        if self.private_key_pem_path is not None:
+            return self.private_key_pem_path
+        return self.config_path / Path(f"h{self.role.value}.key")
+
     @property
     def status_dir_path(self) -> Path:
         return self.root_path / Path("status")
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import json
+import shutil
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from .settings import get_settings
+
+TARGET_DIR_PREFIX = "target-"
+
+
+def directory_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+@dataclass
+class CachedTarget:
+    compiled_id: str
+    target_path: str
+    size_bytes: int
+    created: float
+    last_used: float
+    hits: int = 0
+
+
+@dataclass
+class TargetCache:
+    """
+    TargetCache keeps a manifest of the compiled `target-{compiled_id}` directories
+    inside the IPA repo, so that a build which already exists can be reused.
+
+    If max_bytes is set, the least recently used targets are deleted once the
+    total size of the cache exceeds it. Targets which are pinned (by a running
+    query) are never evicted.
+    """
+
+    manifest_path: Path
+    max_bytes: Optional[int] = None
+    hits: int = field(init=False, default=0)
+    misses: int = field(init=False, default=0)
+    _entries: dict[str, CachedTarget] = field(init=False, default_factory=dict)
+    _pins: Counter[str] = field(init=False, default_factory=Counter, repr=False)
+    _lock: threading.RLock = field(
+        init=False, default_factory=threading.RLock, repr=False
+    )
+
+    def __post_init__(self):
+        if self.manifest_path.exists():
+            with self.manifest_path.open("r", encoding="utf8") as f:
+                manifest = json.load(f)
+            self.hits = manifest.get("hits", 0)
+            self.misses = manifest.get("misses", 0)
+            for entry in manifest.get("targets", []):
+                target = CachedTarget(**entry)
+                if Path(target.target_path).exists():
+                    self._entries[target.compiled_id] = target
+
+    def _save(self):
+        manifest = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "targets": [asdict(target) for target in self._entries.values()],
+        }
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf8") as f:
+            json.dump(manifest, f)
+        tmp_path.replace(self.manifest_path)
+
+    def adopt_existing(self, repo_path: Path):
+        """Add target directories built before the manifest existed."""
+        if not repo_path.exists():
+            return
+        with self._lock:
+            for target_path in repo_path.glob(f"{TARGET_DIR_PREFIX}*"):
+                compiled_id = target_path.name.removeprefix(TARGET_DIR_PREFIX)
+                if compiled_id in self._entries or not target_path.is_dir():
+                    continue
+                mtime = target_path.stat().st_mtime
+                self._entries[compiled_id] = CachedTarget(
+                    compiled_id=compiled_id,
+                    target_path=str(target_path),
+                    size_bytes=directory_size(target_path),
+                    created=mtime,
+                    last_used=mtime,
+                )
+            self._save()
+
+    @contextmanager
+    def pin(self, compiled_id: str) -> Iterator[None]:
+        with self._lock:
+            self._pins[compiled_id] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[compiled_id] -= 1
+                if self._pins[compiled_id] <= 0:
+                    del self._pins[compiled_id]
+
+    def lookup(self, compiled_id: str, binary_path: Path) -> bool:
+        """
+        Returns True if binary_path has already been built for compiled_id,
+        recording a cache hit or miss.
+        """
+        with self._lock:
+            target = self._entries.get(compiled_id)
+            if binary_path.exists():
+                self.hits += 1
+                if target is not None:
+                    target.hits += 1
+                    target.last_used = time.time()
+                self._save()
+                return True
+            self.misses += 1
+            self._save()
+            return False
+
+    def record_build(self, compiled_id: str, target_path: Path):
+        size_bytes = directory_size(target_path)
+        now = time.time()
+        with self._lock:
+            target = self._entries.get(compiled_id)
+            if target is None:
+                target = CachedTarget(
+                    compiled_id=compiled_id,
+                    target_path=str(target_path),
+                    size_bytes=size_bytes,
+                    created=now,
+                    last_used=now,
+                )
+                self._entries[compiled_id] = target
+            else:
+                target.size_bytes = size_bytes
+                target.last_used = now
+            self.evict()
+            self._save()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(target.size_bytes for target in self._entries.values())
+
+    def evict(self) -> list[str]:
+        if self.max_bytes is None:
+            return []
+        evicted = []
+        with self._lock:
+            candidates = sorted(
+                (
+                    target
+                    for target in self._entries.values()
+                    if target.compiled_id not in self._pins
+                ),
+                key=lambda target: target.last_used,
+            )
+            for target in candidates:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                shutil.rmtree(target.target_path, ignore_errors=True)
+                del self._entries[target.compiled_id]
+                evicted.append(target.compiled_id)
+            self._save()
+        return evicted
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "total_bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate,
+                "targets": [
+                    {**asdict(target), "pinned": target.compiled_id in self._pins}
+                    for target in sorted(
+                        self._entries.values(),
+                        key=lambda target: target.last_used,
+                        reverse=True,
+                    )
+                ],
+            }
+
+
+@lru_cache
+def get_target_cache() -> TargetCache:
+    settings = get_settings()
+    target_cache = TargetCache(
+        manifest_path=settings.root_path / Path("target_cache.json"),
+        max_bytes=settings.target_cache_max_bytes,
+    )
+    target_cache.adopt_existing(settings.root_path / Path("ipa"))
+    return target_cache
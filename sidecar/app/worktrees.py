@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+import threading
+from collections import Counter, OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+from .settings import get_settings
+
+
+@dataclass
+class WorktreePool:
+    """
+    WorktreePool hands out one `git worktree` per commit hash, so that queries
+    building different commits never change the source tree under each other.
+
+    Worktrees are reference counted by the queries using them. Once the last one
+    is done, a worktree is kept idle for the next query of its commit, removing
+    the least recently used once there are more than max_idle_worktrees.
+    git_lock serializes git commands which modify the shared repository (clone,
+    fetch, adding and removing worktrees), and is never taken while holding _lock.
+    """
+
+    repo_path: Path
+    worktrees_path: Path
+    max_idle_worktrees: int = 4
+    git_lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+    _refs: Counter[str] = field(init=False, default_factory=Counter)
+    _idle: OrderedDict[str, None] = field(init=False, default_factory=OrderedDict)
+    _lock: threading.Lock = field(
+        init=False, default_factory=threading.Lock, repr=False
+    )
+
+    def worktree_path(self, commit_hash: str) -> Path:
+        return self.worktrees_path / Path(commit_hash)
+
+    @contextmanager
+    def use(self, commit_hash: str) -> Iterator[Path]:
+        with self._lock:
+            self._refs[commit_hash] += 1
+            self._idle.pop(commit_hash, None)
+        try:
+            yield self.worktree_path(commit_hash)
+        finally:
+            evicted = []
+            with self._lock:
+                self._refs[commit_hash] -= 1
+                if self._refs[commit_hash] <= 0:
+                    del self._refs[commit_hash]
+                    self._idle[commit_hash] = None
+                    while len(self._idle) > self.max_idle_worktrees:
+                        evicted.append(self._idle.popitem(last=False)[0])
+            for evicted_hash in evicted:
+                self.remove(evicted_hash)
+
+    @property
+    def active_worktrees(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._refs)
+
+    @property
+    def idle_worktrees(self) -> list[str]:
+        """Idle worktrees, from least to most recently used."""
+        with self._lock:
+            return list(self._idle)
+
+    def remove(self, commit_hash: str):
+        """Removes the worktree of commit_hash, unless it's in use or idle again."""
+        worktree_path = self.worktree_path(commit_hash)
+        if not worktree_path.exists():
+            return
+        with self.git_lock:
+            with self._lock:
+                # a query may have started using it, since it was evicted
+                if commit_hash in self._refs or commit_hash in self._idle:
+                    return
+            subprocess.run(
+                [
+                    "git",
+                    "-C",
+                    str(self.repo_path),
+                    "worktree",
+                    "remove",
+                    "--force",
+                    str(worktree_path),
+                ],
+                capture_output=True,
+                check=False,
+            )
+            # fall back to deleting the directory if git no longer knows about it
+            shutil.rmtree(worktree_path, ignore_errors=True)
+            subprocess.run(
+                ["git", "-C", str(self.repo_path), "worktree", "prune"],
+                capture_output=True,
+                check=False,
+            )
+
+    def gc(self):
+        """Remove every worktree which isn't in use, e.g., after a restart."""
+        if not self.worktrees_path.exists():
+            return
+        with self._lock:
+            self._idle.clear()
+        for worktree_path in self.worktrees_path.iterdir():
+            self.remove(worktree_path.name)
+
+
+@lru_cache
+def get_worktree_pool() -> WorktreePool:
+    settings = get_settings()
+    repo_path = settings.root_path / Path("ipa")
+    worktree_pool = WorktreePool(
+        repo_path=repo_path,
+        worktrees_path=settings.root_path / Path("ipa-worktrees"),
+        max_idle_worktrees=settings.max_idle_worktrees,
+    )
+    worktree_pool.gc()
+    return worktree_pool
@@ -0,0 +1,110 @@
+# pylint: disable=duplicate-code
+"""
+Measures MB/s of (rendered) log downloaded from /start/{query_id}/log-file:
+from the text rendering, compressed, and rendered from the log in chunks (for
+logs without a text rendering). Rendering the log line by line, as it was before
+there were text renderings, is measured in process, without a request.
+
+    python -m sidecar.benchmarks.log_download --num-lines 500000
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+import click
+
+
+def render_per_line(log_file_path: Path):
+    # how the log was rendered before there were text renderings
+    with open(log_file_path, "rb") as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+                d = datetime.fromtimestamp(float(data["record"]["time"]["timestamp"]))
+                message = data["record"]["message"]
+                yield f"{d.isoformat()} - {message}\n"
+            except (json.JSONDecodeError, KeyError):
+                yield line
+
+
+def measure(download) -> tuple[float, int]:
+    """Returns the seconds taken, and the number of bytes sent."""
+    start_time = time.perf_counter()
+    num_bytes = download()
+    return time.perf_counter() - start_time, num_bytes
+
+
+@click.command()
+@click.option("--num-lines", type=int, default=500_000)
+def main(num_lines: int):
+    # pylint: disable=import-outside-toplevel,too-many-locals
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.update(
+            {
+                "ROLE": "1",
+                "ROOT_PATH": tmp_dir,
+                "CONFIG_PATH": str(Path("local_dev/config")),
+                "NETWORK_CONFIG_PATH": str(
+                    Path("local_dev/config") / Path("network.toml")
+                ),
+                "HELPER_PORT": str(17440),
+            }
+        )
+        # settings are loaded from the environment, so import after setting it
+        from fastapi.testclient import TestClient
+
+        from sidecar.app.main import app
+        from sidecar.app.query.base import Query
+        from sidecar.app.query.status import Status
+        from sidecar.app.settings import get_settings
+
+        query = Query(str(uuid4()))
+        query.status = Status.STARTING
+        for i in range(num_lines):
+            # debug isn't logged to stderr, only to the log file
+            query.logger.debug(f"step {i}: processed a batch of records in 12ms")
+        query.status = Status.COMPLETE
+        query.logger.complete()
+        get_settings().log_writer.close(query.query_id)
+        url = f"/start/{query.query_id}/log-file"
+        client = TestClient(app)
+
+        def download(accept_encoding: str):
+            def _download() -> int:
+                num_bytes = 0
+                with client.stream(
+                    "GET", url, headers={"Accept-Encoding": accept_encoding}
+                ) as response:
+                    assert response.status_code == 200
+                    for chunk in response.iter_raw():
+                        num_bytes += len(chunk)
+                return num_bytes
+
+            return _download
+
+        def per_line() -> int:
+            return sum(len(s.encode()) for s in render_per_line(query.log_file_path))
+
+        results = [
+            ("rendered per line", measure(per_line)),
+            ("text rendering", measure(download("identity"))),
+            ("text, gzip", measure(download("gzip"))),
+        ]
+        text_file_path = get_settings().log_writer.text_file_path(query.query_id)
+        text_size = text_file_path.stat().st_size
+        text_file_path.unlink()
+        results.append(("rendered in chunks", measure(download("identity"))))
+
+    click.echo(f"{'':<20} {'MB/s':>10} {'MB sent':>10}")
+    for name, (seconds, num_bytes) in results:
+        mb_per_second = text_size / seconds / 1024**2
+        click.echo(f"{name:<20} {mb_per_second:>10,.1f} {num_bytes / 1024**2:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
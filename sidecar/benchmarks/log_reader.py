@@ -0,0 +1,104 @@
+# pylint: disable=duplicate-code
+"""
+Measures the throughput (lines per second) of logging subprocess output
+with LoggerOutputCommand, compared to the previous line by line reader.
+
+    python -m sidecar.benchmarks.log_reader --num-lines 200000
+"""
+
+import select
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import click
+from loguru import logger
+
+from sidecar.app.query.command import LoggerOutputCommand
+
+
+@dataclass(kw_only=True)
+class ReadlineLoggerOutputCommand(LoggerOutputCommand):
+    """The previous reader: readline after select, and a record per line."""
+
+    def build_process(self):
+        return subprocess.Popen(
+            shlex.split(self.cmd),
+            env=self.env,
+            cwd=self.cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+    def start(self):
+        # pylint: disable=attribute-defined-outside-init
+        self.process = self.build_process()
+        stdout_fileno = self.process.stdout.fileno()
+        stderr_fileno = self.process.stderr.fileno()
+        while self.process.poll() is None:
+            readable, _, _ = select.select([stdout_fileno, stderr_fileno], [], [])
+            for fd in readable:
+                if fd == stdout_fileno:
+                    stdout_line = self.process.stdout.readline()
+                    if stdout_line:
+                        self.logger.info(stdout_line.rstrip("\n"))
+                elif fd == stderr_fileno:
+                    stderr_line = self.process.stderr.readline()
+                    if stderr_line:
+                        self.logger.info(stderr_line.rstrip("\n"))
+        for line in self.process.stdout:
+            self.logger.info(line.rstrip("\n"))
+
+        for line in self.process.stderr:
+            self.logger.info(line.rstrip("\n"))
+
+
+GENERATOR_SCRIPT = """
+import sys
+for i in range(int(sys.argv[1])):
+    stream = sys.stdout if i % 2 else sys.stderr
+    stream.write(f"line {i} of some typical compiler output\\n")
+"""
+
+
+def measure(command_cls: type[LoggerOutputCommand], num_lines: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        script_path = Path(tmp_dir) / "generate.py"
+        script_path.write_text(GENERATOR_SCRIPT)
+        sink_id = logger.add(
+            Path(tmp_dir) / "benchmark.log", serialize=True, enqueue=True
+        )
+        command = command_cls(
+            cmd=f"{sys.executable} {script_path} {num_lines}", logger=logger
+        )
+        start_time = time.perf_counter()
+        command.start()
+        # include the time for the sink to write every record
+        logger.complete()
+        elapsed = time.perf_counter() - start_time
+        logger.remove(sink_id)
+        if command.returncode != 0:
+            raise click.ClickException(f"{command.cmd} failed")
+    return num_lines / elapsed
+
+
+@click.command()
+@click.option("--num-lines", type=int, default=200_000)
+@click.option("--repeat", type=int, default=3)
+def main(num_lines: int, repeat: int):
+    logger.remove()
+    for name, command_cls in [
+        ("readline, record per line", ReadlineLoggerOutputCommand),
+        ("chunked, batched records", LoggerOutputCommand),
+    ]:
+        best = max(measure(command_cls, num_lines) for _ in range(repeat))
+        click.echo(f"{name:<28} {best:>12,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
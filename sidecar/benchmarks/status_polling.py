@@ -0,0 +1,101 @@
+"""
+Measures requests per second for polling the status of past (finished) queries,
+with QueryViews compared to building a Query for every request.
+
+    python -m sidecar.benchmarks.status_polling --num-queries 5000
+"""
+
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+import click
+
+
+def write_status_histories(store, num_queries: int) -> list[str]:
+    # pylint: disable=import-outside-toplevel
+    from sidecar.app.query.status import Status, StatusChangeEvent
+
+    query_ids = [str(uuid4()) for _ in range(num_queries)]
+    for query_id in query_ids:
+        for i, status in enumerate(
+            [Status.STARTING, Status.COMPILING, Status.IN_PROGRESS, Status.COMPLETE]
+        ):
+            store.append(query_id, None, StatusChangeEvent(status, float(i)))
+    return query_ids
+
+
+def measure_lookups(query_manager, query_cls, query_ids: list[str], num: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(num):
+        query = query_manager.get_from_query_id(query_cls, random.choice(query_ids))
+        assert query.status_event_json["status"] == "COMPLETE"
+    return num / (time.perf_counter() - start_time)
+
+
+def measure_requests(client, query_ids: list[str], num: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(num):
+        response = client.get(f"/start/{random.choice(query_ids)}/status")
+        assert response.status_code == 200
+    return num / (time.perf_counter() - start_time)
+
+
+@click.command()
+@click.option("--num-queries", type=int, default=5000)
+@click.option("--num-requests", type=int, default=5000)
+def main(num_queries: int, num_requests: int):
+    # pylint: disable=import-outside-toplevel,too-many-locals
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.update(
+            {
+                "ROLE": "0",
+                "ROOT_PATH": tmp_dir,
+                "CONFIG_PATH": str(Path("local_dev/config")),
+                "NETWORK_CONFIG_PATH": str(
+                    Path("local_dev/config") / Path("network.toml")
+                ),
+                "HELPER_PORT": str(17440),
+            }
+        )
+        # settings are loaded from the environment, so import after setting it
+        from fastapi.testclient import TestClient
+
+        from sidecar.app.main import app
+        from sidecar.app.query.base import Query
+        from sidecar.app.query.status_store import get_status_store
+
+        query_ids = write_status_histories(get_status_store(), num_queries)
+        client = TestClient(app)
+        query_manager = app.state.QUERY_MANAGER
+
+        def build_query(_cls, query_id):
+            # how finished queries were loaded before QueryViews
+            return Query(query_id)
+
+        query_manager.get_from_query_id = build_query
+        before = (
+            measure_lookups(query_manager, Query, query_ids, num_requests),
+            measure_requests(client, query_ids, num_requests),
+        )
+        del query_manager.get_from_query_id
+        # fill the cache, as it would be after the dashboard's first poll
+        measure_lookups(query_manager, Query, query_ids, num_queries)
+        after = (
+            measure_lookups(query_manager, Query, query_ids, num_requests),
+            measure_requests(client, query_ids, num_requests),
+        )
+
+    click.echo(f"{'':<20} {'lookups/s':>12} {'requests/s':>12}")
+    for name, (lookups, requests) in [
+        ("Query per request", before),
+        ("cached QueryView", after),
+    ]:
+        click.echo(f"{name:<20} {lookups:>12,.0f} {requests:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,44 @@
+from sidecar.app.query.admission import (
+    AdmissionController,
+    HostResources,
+    ResourceEstimate,
+)
+
+GiB = 1024**3
+
+
+def admission_controller(available_memory_bytes, load_average=0.0, cores=4):
+    return AdmissionController(
+        memory_reserve_bytes=0,
+        sample_resources=lambda: HostResources(
+            available_memory_bytes=available_memory_bytes,
+            load_average=load_average,
+            cores=cores,
+        ),
+    )
+
+
+def test_fits_idle_host():
+    controller = admission_controller(8 * GiB)
+    assert controller.fits(ResourceEstimate(memory_bytes=4 * GiB, cores=4), [])
+
+
+def test_does_not_fit_memory():
+    controller = admission_controller(2 * GiB)
+    assert not controller.fits(ResourceEstimate(memory_bytes=4 * GiB, cores=1), [])
+
+
+def test_running_queries_reserve_memory_until_peak():
+    controller = admission_controller(8 * GiB)
+    estimate = ResourceEstimate(memory_bytes=4 * GiB, cores=1)
+    # the running query has only used 1GiB of its 6GiB estimate so far
+    running = [(ResourceEstimate(memory_bytes=6 * GiB, cores=1), 1 * GiB)]
+    assert not controller.fits(estimate, running)
+    running = [(ResourceEstimate(memory_bytes=6 * GiB, cores=1), 6 * GiB)]
+    assert controller.fits(estimate, running)
+
+
+def test_does_not_fit_load():
+    controller = admission_controller(8 * GiB, load_average=3.5, cores=4)
+    assert controller.fits(ResourceEstimate(cores=0.5), [])
+    assert not controller.fits(ResourceEstimate(cores=1), [])
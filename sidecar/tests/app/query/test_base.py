@@ -1,12 +1,22 @@
+import json
 import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import ClassVar
 from unittest import mock
 from uuid import uuid4
 
 import pytest
 
 from sidecar.app.query.base import MaxQueriesRunningError, Query, QueryManager
+from sidecar.app.query.command import Command
+from sidecar.app.query.pipeline import Pipeline
 from sidecar.app.query.status import Status
+from sidecar.app.query.status_store import get_status_store
+from sidecar.app.query.step import CommandStep, Stage, Step
+from sidecar.app.settings import get_settings
 
 
 @pytest.fixture(autouse=True)
@@ -24,10 +34,10 @@ def mock_settings_env_vars(tmp_path):
 
 def test_query_files():
     query = Query(str(uuid4()))
-    assert not query.status_file_path.exists()
+    assert not get_status_store().exists(query.query_id)
     assert query.log_file_path.exists()
     query.status = Status.STARTING
-    assert query.status_file_path.exists()
+    assert get_status_store().exists(query.query_id)
 
 
 def test_query_started():
@@ -138,3 +148,209 @@ def test_query_manager_run_query_exception():
 
     assert query.query_id not in query_manager.running_queries
     assert query_manager.capacity_available
+
+
+def test_query_manager_submit_queues_at_capacity():
+    query_manager = QueryManager(max_parallel_queries=1)
+    query = Query(str(uuid4()))
+    query2 = Query(str(uuid4()))
+    assert query_manager.submit(query, "query", {}) is None
+    assert query.query_id in query_manager.running_queries
+    assert query_manager.submit(query2, "query", {}) == 0
+    assert query2.status == Status.QUEUED
+    assert query_manager.get_from_query_id(Query, query2.query_id) == query2
+
+
+def test_query_manager_promotes_queued_query():
+    query_manager = QueryManager(max_parallel_queries=1)
+    query = Query(str(uuid4()))
+    query2 = Query(str(uuid4()))
+    query_manager.submit(query, "query", {})
+    query_manager.submit(query2, "query", {})
+
+    with mock.patch(
+        "sidecar.app.query.base.QueryManager.start_query"
+    ) as mock_start_query, mock.patch("sidecar.app.query.base.Query.start"):
+        query_manager.run_query(query)
+        mock_start_query.assert_called_once_with(query2)
+
+    assert query2.query_id in query_manager.running_queries
+    assert query_manager.queue_position(query2.query_id) is None
+
+
+def test_query_manager_skips_killed_queued_query():
+    query_manager = QueryManager(max_parallel_queries=1)
+    query = Query(str(uuid4()))
+    query2 = Query(str(uuid4()))
+    query_manager.submit(query, "query", {})
+    query_manager.submit(query2, "query", {})
+    query2.kill()
+    assert query2.status == Status.KILLED
+
+    with mock.patch(
+        "sidecar.app.query.base.QueryManager.start_query"
+    ) as mock_start_query, mock.patch("sidecar.app.query.base.Query.start"):
+        query_manager.run_query(query)
+        mock_start_query.assert_not_called()
+
+    assert query_manager.capacity_available
+
+
+def test_query_manager_restore_queue(tmp_path):
+    query_manager = QueryManager(max_parallel_queries=1)
+    query_manager.restore_queue(tmp_path / Path("queue.json"), {})
+    query = Query(str(uuid4()))
+    query2 = Query(str(uuid4()))
+    query_manager.submit(query, "query", {})
+    query_manager.submit(query2, "query", {})
+
+    restored_query_manager = QueryManager(max_parallel_queries=0)
+    restored_query_manager.restore_queue(
+        tmp_path / Path("queue.json"), {"query": Query}
+    )
+    restored_query = restored_query_manager.get_from_query_id(Query, query2.query_id)
+    assert restored_query.query_id == query2.query_id
+    assert restored_query.status == Status.QUEUED
+    assert restored_query_manager.queue_position(query2.query_id) == 0
+
+
+def test_query_manager_admission():
+    admission = mock.Mock()
+    admission.fits.return_value = False
+    query_manager = QueryManager(max_parallel_queries=2, admission=admission)
+    query = Query(str(uuid4()))
+    query2 = Query(str(uuid4()))
+    # always admit onto an idle host
+    assert query_manager.submit(query, "query", {}) is None
+    admission.fits.assert_not_called()
+    assert query_manager.submit(query2, "query", {}) == 0
+    admission.fits.assert_called_once()
+    assert not query_manager.capacity_available
+
+
+def test_query_manager_start_query_runs_on_worker_pool():
+    query_manager = QueryManager(max_parallel_queries=1)
+    query = Query(str(uuid4()))
+    with mock.patch("sidecar.app.query.base.Query.start") as mock_start:
+        query_manager.start_query(query).result(timeout=5)
+        mock_start.assert_called_once()
+    assert query_manager.worker_stats["query"]["completed"] == 1
+    assert query_manager.capacity_available
+
+
+def test_query_manager_start_build_once():
+    query_manager = QueryManager()
+    query = Query(str(uuid4()))
+    with mock.patch("sidecar.app.query.base.WorkerPool.submit") as mock_submit:
+        assert query_manager.start_build(query) is not None
+        assert query_manager.start_build(query) is None
+        mock_submit.assert_called_once()
+
+
+def test_query_manager_start_build_resets_status_when_admitted():
+    query_manager = QueryManager()
+    query_id = str(uuid4())
+    # e.g., left by an earlier build that crashed
+    Query(query_id).status = Status.CRASHED
+    query = Query(query_id)
+    running = Query(query_id)
+    assert query.status == Status.CRASHED
+    with mock.patch("sidecar.app.query.base.WorkerPool.submit"):
+        assert query_manager.start_build(query) is not None
+        assert query.status == Status.UNKNOWN
+        query.status = Status.STARTING
+        assert query_manager.start_build(running) is None
+    # a build that isn't admitted leaves the running build's status alone
+    assert Query(query_id).status == Status.STARTING
+
+
+def test_query_manager_shutdown():
+    query_manager = QueryManager(max_parallel_queries=1)
+    query = Query(str(uuid4()))
+    query2 = Query(str(uuid4()))
+    query_manager.submit(query, "query", {})
+    query_manager.submit(query2, "query", {})
+    query.status = Status.STARTING
+
+    query_manager.shutdown()
+    assert query.status == Status.KILLED
+    # queued queries are kept, to be restored after a restart
+    assert query_manager.queue_position(query2.query_id) == 0
+    with mock.patch(
+        "sidecar.app.query.base.QueryManager.start_query"
+    ) as mock_start_query:
+        query_manager.promote_queued_queries()
+        mock_start_query.assert_not_called()
+
+
+def test_query_logs_to_log_file():
+    query = Query(str(uuid4()))
+    query.logger.info("hello")
+    query.logger.complete()
+    with query.log_file_path.open("r", encoding="utf8") as f:
+        messages = [json.loads(line)["record"]["message"] for line in f]
+    assert "hello" in messages
+
+
+def test_query_lookup_adds_no_sinks():
+    query = Query(str(uuid4()))
+    query.status = Status.COMPLETE
+    query_manager = QueryManager()
+    # pylint: disable=protected-access
+    num_handlers = len(query.logger._core.handlers)
+    for _ in range(5):
+        query_manager.get_from_query_id(Query, query.query_id)
+    assert len(query.logger._core.handlers) == num_handlers
+
+
+@dataclass(kw_only=True)
+class SleepStep(CommandStep):
+    status: ClassVar[Status] = Status.IN_PROGRESS
+
+    @classmethod
+    def build_from_query(cls, query: Query):
+        return cls()
+
+    def build_command(self) -> Command:
+        return Command(cmd="sleep 0.3")
+
+
+@dataclass
+class SleepQuery(Query):
+    step_classes: ClassVar[list[type[Step]]] = [SleepStep]
+
+
+def test_query_samples_step_resources():
+    query = SleepQuery(str(uuid4()))
+    with mock.patch.object(get_settings(), "resource_sample_interval_seconds", 0.02):
+        query.start()
+    samples = query.sampler.samples_since(0)
+    assert any(sample.processes == 1 for sample in samples)
+    assert max(sample.memory_rss_usage for sample in samples) > 0
+    # stopped with the step
+    sequence = query.sampler.sequence
+    time.sleep(0.05)
+    assert query.sampler.sequence == sequence
+    assert query.memory_rss_usage == 0
+
+
+def test_query_waiting_for_stage_is_running():
+    pipeline = Pipeline(max_parallel_runs=1)
+    blocking_query = Query(str(uuid4()))
+    assert pipeline.acquire(blocking_query, Stage.RUN)
+    query = SleepQuery(str(uuid4()))
+    query.pipeline = pipeline
+    thread = threading.Thread(target=query.start)
+    thread.start()
+    try:
+        deadline = time.time() + 2
+        while pipeline.stats["run"]["waiting"] != [query.query_id]:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        # pollers see a started query, not an UNKNOWN one
+        assert query.status == Status.STARTING
+        assert query.running
+    finally:
+        pipeline.release(blocking_query, Stage.RUN)
+        thread.join(timeout=5)
+    assert query.status == Status.COMPLETE
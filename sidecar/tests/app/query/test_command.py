@@ -0,0 +1,113 @@
+import subprocess
+import threading
+import time
+from unittest import mock
+
+from sidecar.app.query.command import (
+    Command,
+    FileOutputCommand,
+    LineSplitter,
+    LoggerOutputCommand,
+)
+
+
+def test_command_start():
+    command = Command(cmd="true")
+    command.start()
+    assert command.finished
+    assert command.returncode == 0
+
+
+def test_file_output_command_start(tmp_path):
+    output_file_path = tmp_path / "output.txt"
+    command = FileOutputCommand(cmd="echo hello", output_file_path=output_file_path)
+    command.start()
+    assert output_file_path.read_text() == "hello\n"
+
+
+def start_in_thread(command: Command) -> threading.Thread:
+    thread = threading.Thread(target=command.start)
+    thread.start()
+    while not command.started:
+        time.sleep(0.01)
+    return thread
+
+
+def test_terminate_from_another_thread():
+    command = Command(cmd="sleep 30")
+    thread = start_in_thread(command)
+    command.terminate(timeout=5)
+    thread.join()
+    assert command.returncode == -15
+
+
+def test_terminate_escalates_to_kill():
+    # ignores SIGTERM, so terminate has to escalate to SIGKILL
+    command = Command(cmd="sh -c 'trap \"\" TERM; sleep 30'")
+    thread = start_in_thread(command)
+    time.sleep(0.1)
+    command.terminate(timeout=0.2)
+    thread.join()
+    assert command.returncode == -9
+
+
+def test_kill_gives_up_waiting():
+    command = Command(cmd="sleep 30")
+    thread = start_in_thread(command)
+    # let start wait for the process, before its wait is patched
+    time.sleep(0.1)
+    # as if the process didn't exit, e.g., while stuck in uninterruptible I/O
+    with mock.patch.object(
+        command.process,
+        "wait",
+        side_effect=subprocess.TimeoutExpired(command.cmd, 0.1),
+    ):
+        command.kill(timeout=0.1)
+    thread.join()
+    assert command.returncode == -9
+
+
+def test_line_splitter():
+    splitter = LineSplitter()
+    assert splitter.feed(b"one\ntw") == ["one"]
+    assert splitter.feed(b"o\nthree\n\nfo") == ["two", "three", ""]
+    assert splitter.flush() == ["fo"]
+    assert splitter.flush() == []
+
+
+def test_logger_output_command_start():
+    logger = mock.Mock()
+    # a partial line on stdout must not block the line on stderr
+    command = LoggerOutputCommand(
+        cmd="sh -c 'printf partial; echo err 1>&2; sleep 0.1; echo end'",
+        logger=logger,
+    )
+    command.start()
+    assert command.returncode == 0
+    logged = [call.args[0] for call in logger.info.call_args_list]
+    assert logged == ["err", "partialend"]
+
+
+def test_logger_output_command_batches_lines():
+    logger = mock.Mock()
+    command = LoggerOutputCommand(
+        cmd="python -c 'print(\"\\n\".join(map(str, range(1000))))'",
+        logger=logger,
+    )
+    command.start()
+    logged = [
+        line for call in logger.info.call_args_list for line in call.args[0].split("\n")
+    ]
+    assert logged == [str(i) for i in range(1000)]
+    assert logger.info.call_count < 1000
+
+
+def test_process_psutil_is_kept():
+    command = Command(cmd="sleep 1")
+    assert command.pid is None
+    command.process = command.build_process()
+    try:
+        assert command.process_psutil is command.process_psutil
+        assert command.process_psutil.pid == command.pid
+    finally:
+        command.kill()
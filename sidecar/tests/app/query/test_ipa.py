@@ -0,0 +1,480 @@
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+
+from sidecar.app.callbacks import HelperStatusBoard, StatusCallback
+from sidecar.app.local_paths import Paths
+from sidecar.app.query.command import LoggerOutputCommand
+from sidecar.app.query.ipa import (
+    GateType,
+    IPABuildQuery,
+    IPACheckoutCommitStep,
+    IPACoordinatorGenerateTestDataStep,
+    IPACoordinatorWaitForHelpersStep,
+    IPAHelperCompileStep,
+    IPAHelperQuery,
+    IPAStartHelperStep,
+    events_file_name,
+)
+from sidecar.app.query.pipeline import Pipeline
+from sidecar.app.query.status import Status
+from sidecar.app.query.step import Stage
+from sidecar.app.settings import get_settings
+
+
+@pytest.fixture(autouse=True)
+def mock_settings_env_vars(tmp_path):
+    env_vars = {
+        "ROLE": "1",
+        "ROOT_PATH": str(tmp_path),
+        "CONFIG_PATH": str(Path("local_dev/config")),
+        "NETWORK_CONFIG_PATH": str(Path("local_dev/config") / Path("network.toml")),
+        "HELPER_PORT": str(17440),
+    }
+    with mock.patch.dict(os.environ, env_vars):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def no_status_callbacks():
+    # helpers sign callbacks with their key by default, so don't send any
+    with mock.patch(
+        "sidecar.app.query.ipa.get_status_callback_sender", return_value=None
+    ):
+        yield
+
+
+@pytest.fixture(name="helper_query")
+def _helper_query(tmp_path):
+    paths = Paths(
+        repo_path=tmp_path / Path("ipa"),
+        config_path=Path("local_dev/config"),
+        compiled_id="abcd1234_compact-gate",
+        commit_hash="abcd1234",
+    )
+    return IPAHelperQuery(
+        query_id=str(uuid4()),
+        paths=paths,
+        commit_hash="abcd1234",
+        port=17440,
+        gate_type=GateType.COMPACT,
+        stall_detection=False,
+        multi_threading=False,
+        disable_metrics=False,
+        reveal_aggregation=False,
+    )
+
+
+def test_paths_worktree(helper_query):
+    paths = helper_query.paths
+    assert paths.worktree_path == paths.repo_path.parent / Path(
+        "ipa-worktrees/abcd1234"
+    )
+    assert paths.manifest_path == paths.worktree_path / Path("Cargo.toml")
+
+
+def test_steps_not_prebuilt(helper_query):
+    step_classes = [type(step) for step in helper_query.steps]
+    assert IPACheckoutCommitStep in step_classes
+    assert IPAHelperCompileStep in step_classes
+
+
+def test_steps_prebuilt(helper_query):
+    helper_query.binary_path.parent.mkdir(parents=True)
+    helper_query.binary_path.touch()
+    step_classes = [type(step) for step in helper_query.steps]
+    assert step_classes == [IPAStartHelperStep]
+
+
+def test_steps_look_up_target_cache_once(helper_query):
+    target_cache = mock.Mock()
+    target_cache.lookup.return_value = False
+    with mock.patch(
+        "sidecar.app.query.ipa.get_target_cache", return_value=target_cache
+    ):
+        steps = list(helper_query.steps)
+        compile_step = steps[[type(step) for step in steps].index(IPAHelperCompileStep)]
+        # e.g., built by another query while this one waited for the build stage
+        helper_query.binary_path.parent.mkdir(parents=True)
+        helper_query.binary_path.touch()
+        compile_step.pre_run()
+    assert compile_step.skip
+    target_cache.lookup.assert_called_once_with(
+        helper_query.paths.compiled_id, helper_query.binary_path
+    )
+
+
+def test_checkout_commit_checks_worktree_under_git_lock(helper_query):
+    step = IPACheckoutCommitStep.build_from_query(helper_query)
+    assert "worktree add" in step.command.cmd
+    # e.g., added by another query for the same commit since the step was built
+    step.worktree_path.mkdir(parents=True)
+    with mock.patch.object(LoggerOutputCommand, "start") as mock_start:
+        step.run()
+    mock_start.assert_called_once()
+    assert step.command.cmd.endswith("checkout -f abcd1234")
+
+
+def test_helper_waits_for_coordinator_to_run(helper_query):
+    helper_query.pipeline = Pipeline()
+    helper_query.status = Status.COMPILING
+    assert helper_query.enter_stage(Stage.BUILD)
+    build_slots = helper_query.pipeline.stages[Stage.BUILD]
+
+    def coordinator_status(query_id):
+        assert query_id == helper_query.query_id
+        # other queries can build while this one waits
+        assert not build_slots.active
+        return next(statuses)
+
+    statuses = iter([Status.NOT_FOUND, Status.QUEUED, Status.WAITING_TO_START])
+    with mock.patch.object(get_settings(), "helper_poll_interval", 0.01), mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        side_effect=coordinator_status,
+    ) as mock_get_status:
+        assert helper_query.enter_stage(Stage.RUN)
+    assert mock_get_status.call_count == 3
+    assert helper_query.current_stage == Stage.RUN
+    helper_query.leave_stage()
+
+
+def test_helper_crashes_when_coordinator_query_finished(helper_query):
+    helper_query.status = Status.COMPILING
+    with mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        return_value=Status.KILLED,
+    ), mock.patch("sidecar.app.query.ipa.broadcast", return_value={}):
+        assert not helper_query.enter_stage(Stage.RUN)
+    assert helper_query.status == Status.CRASHED
+
+
+@pytest.fixture(name="board")
+def _board():
+    board = HelperStatusBoard()
+    with mock.patch(
+        "sidecar.app.query.ipa.get_helper_status_board", return_value=board
+    ):
+        yield board
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def test_start_helper_step_probes_port(helper_query):
+    port = free_port()
+    listen = (
+        "import socket, time; s = socket.socket(); "
+        f"s.bind(('localhost', {port})); s.listen(); time.sleep(1)"
+    )
+    step = IPAStartHelperStep.build_from_query(helper_query)
+    step.port = port
+    step.on_ready = mock.Mock()
+    step.command = LoggerOutputCommand(
+        cmd=f'{sys.executable} -c "{listen}"', logger=helper_query.logger
+    )
+    step.start()
+    assert step.success
+    step.on_ready.assert_called_once()
+
+
+def test_start_helper_step_not_ready_if_port_closed(helper_query):
+    step = IPAStartHelperStep.build_from_query(helper_query)
+    step.port = free_port()
+    step.on_ready = mock.Mock()
+    step.command = LoggerOutputCommand(
+        cmd=f'{sys.executable} -c "import time; time.sleep(0.3)"',
+        logger=helper_query.logger,
+    )
+    step.start()
+    step.on_ready.assert_not_called()
+
+
+def test_helper_query_ready(helper_query):
+    helper_query.status = Status.COMPILING
+    helper_query.ready()
+    assert helper_query.status == Status.COMPILING
+    helper_query.status = Status.IN_PROGRESS
+    helper_query.ready()
+    assert helper_query.status == Status.READY
+    helper_query.status = Status.KILLED
+    helper_query.ready()
+    assert helper_query.status == Status.KILLED
+
+
+def generate_test_data_step(
+    output_file_path: Path, binary_path: str, max_breakdown_key: int = 32
+):
+    return IPACoordinatorGenerateTestDataStep(
+        query_id=str(uuid4()),
+        output_file_path=output_file_path,
+        report_collector_binary_path=Path(binary_path),
+        size=10,
+        max_breakdown_key=max_breakdown_key,
+        max_trigger_value=7,
+    )
+
+
+def test_generate_test_data_for_each_set_of_parameters(tmp_path):
+    steps = [
+        generate_test_data_step(
+            tmp_path / "input" / events_file_name(10, max_breakdown_key, 7),
+            "echo",
+            max_breakdown_key,
+        )
+        for max_breakdown_key in [32, 64]
+    ]
+    for step in steps:
+        step.start()
+        assert not step.skip
+    # same size, but different data
+    assert "--max-breakdown-key 32 " in steps[0].output_file_path.read_text()
+    assert "--max-breakdown-key 64 " in steps[1].output_file_path.read_text()
+
+
+def test_generate_test_data_moves_complete_file_into_place(tmp_path):
+    output_file_path = tmp_path / "input" / "events-10.txt"
+    step = generate_test_data_step(output_file_path, "echo")
+    step.start()
+    assert step.success
+    assert output_file_path.read_text().startswith("gen-ipa-inputs -n 10 ")
+    assert list(output_file_path.parent.iterdir()) == [output_file_path]
+
+    # while another query reads it, the complete file is left as it is
+    with output_file_path.open("rb") as f:
+        step = generate_test_data_step(output_file_path, "echo")
+        step.start()
+        assert step.skip
+        assert f.read().startswith(b"gen-ipa-inputs")
+
+
+def test_generate_test_data_failure_leaves_no_file(tmp_path):
+    output_file_path = tmp_path / "input" / "events-10.txt"
+    step = generate_test_data_step(output_file_path, "false")
+    step.start()
+    assert not step.success
+    assert not list(output_file_path.parent.iterdir())
+
+
+def test_helper_query_ready_while_killed(helper_query):
+    helper_query.status = Status.IN_PROGRESS
+    status_getter = type(helper_query).status.fget
+    reads = []
+    checked = threading.Event()
+    killing = threading.Event()
+    errors = []
+
+    def status(query):
+        current = status_getter(query)
+        if threading.current_thread().name == "probe":
+            reads.append(current)
+            # the last check before READY is added, so kill right after it
+            if len(reads) == 3:
+                checked.set()
+                killing.wait(1)
+                time.sleep(0.05)
+        return current
+
+    def probe():
+        try:
+            helper_query.ready()
+        except AssertionError as e:
+            errors.append(e)
+
+    with mock.patch.object(
+        type(helper_query), "status", property(status, type(helper_query).status.fset)
+    ):
+        thread = threading.Thread(target=probe, name="probe")
+        thread.start()
+        assert checked.wait(1)
+        killing.set()
+        helper_query.kill()
+        thread.join()
+    assert not errors
+    assert helper_query.status == Status.KILLED
+
+
+def wait_for_helpers_step(**kwargs):
+    return IPACoordinatorWaitForHelpersStep(query_id=str(uuid4()), timings={}, **kwargs)
+
+
+def test_helper_query_pushes_status_changes(helper_query):
+    sender = mock.Mock()
+    with mock.patch(
+        "sidecar.app.query.ipa.get_status_callback_sender", return_value=sender
+    ):
+        helper_query.status = Status.STARTING
+        helper_query.status = Status.STARTING
+    sender.send.assert_called_once_with(helper_query.query_id, Status.STARTING)
+
+
+def test_wait_for_helpers_polls_concurrently_with_backoff(board):
+    settings = get_settings()
+    num_helpers = len(settings.other_helpers)
+    statuses = iter(
+        [Status.STARTING] * num_helpers * 3
+        # in progress isn't enough, the helper binary must be accepting connections
+        + [Status.IN_PROGRESS] * num_helpers
+        + [Status.READY] * num_helpers
+    )
+    step = wait_for_helpers_step()
+    # no status is pushed, so every helper is polled after each timeout
+    board.wait_for_change = mock.Mock(return_value=False)
+    with mock.patch.object(settings, "helper_poll_interval", 1.0), mock.patch.object(
+        settings, "helper_poll_backoff", 2.0
+    ), mock.patch.object(settings, "helper_poll_max_interval", 3.0), mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        side_effect=lambda *args: next(statuses),
+    ) as mock_get_status:
+        step.start()
+
+    assert step.success
+    assert mock_get_status.call_count == num_helpers * 5
+    intervals = [call.args[2] for call in board.wait_for_change.call_args_list]
+    # unchanged statuses back off, and a change resets the interval
+    assert intervals == [1.0, 2.0, 3.0, 1.0]
+    assert step.timings["wait_for_helpers_polls"] == 5
+    assert "wait_for_helpers_seconds" in step.timings
+
+
+def test_wait_for_helpers_fails_when_helper_killed(board):
+    step = wait_for_helpers_step()
+    board.wait_for_change = mock.Mock(return_value=False)
+    with mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        return_value=Status.KILLED,
+    ):
+        step.start()
+    assert step.success is False
+
+
+def advance_clock_on_wait(board, advance, changed=False):
+    """Waiting for a change advances the monotonic clock by advance(interval)."""
+    clock = [0.0]
+
+    def wait_for_change(query_id, version, interval, stopped):
+        # pylint: disable=unused-argument
+        clock[0] += advance(interval)
+        return changed
+
+    board.wait_for_change = mock.Mock(side_effect=wait_for_change)
+    return mock.patch("sidecar.app.query.ipa.time.monotonic", lambda: clock[0])
+
+
+def test_wait_for_helpers_fails_when_helper_stays_queued(board):
+    # e.g., the helper admitted another query first, which waits on this one
+    step = wait_for_helpers_step(max_queued_status_wait_time=3)
+    with advance_clock_on_wait(board, lambda interval: interval), mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        return_value=Status.QUEUED,
+    ), mock.patch.object(get_settings(), "helper_poll_max_interval", 1.0):
+        step.start()
+    assert step.success is False
+    assert board.wait_for_change.call_count == 3
+
+
+def test_wait_for_helpers_counts_time_waited_not_intervals(board):
+    num_helpers = len(get_settings().other_helpers)
+    statuses = iter([Status.QUEUED] * num_helpers * 10 + [Status.READY] * num_helpers)
+    step = wait_for_helpers_step(max_queued_status_wait_time=3)
+    # woken up by pushes long before each interval has passed
+    with advance_clock_on_wait(board, lambda interval: 0.1, changed=True), mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        side_effect=lambda *args: next(statuses),
+    ), mock.patch.object(get_settings(), "helper_poll_interval", 1.0):
+        step.start()
+    assert step.success
+
+
+def test_wait_for_helpers_stops_when_terminated(
+    board,
+):  # pylint: disable=unused-argument
+    step = IPACoordinatorWaitForHelpersStep(query_id=str(uuid4()), timings={})
+    step.terminate()
+    with mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        return_value=Status.COMPILING,
+    ) as mock_get_status:
+        step.start()
+    assert mock_get_status.call_count == len(get_settings().other_helpers)
+    assert "wait_for_helpers_seconds" not in step.timings
+
+
+def test_wait_for_helpers_uses_pushed_statuses(board):
+    step = wait_for_helpers_step()
+    for helper in get_settings().other_helpers:
+        board.update(
+            StatusCallback(
+                query_id=step.query_id,
+                role=helper.role,
+                status=Status.READY,
+                timestamp=time.time(),
+            )
+        )
+    with mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+    ) as mock_get_status:
+        step.start()
+    assert step.success
+    mock_get_status.assert_not_called()
+    assert step.timings["wait_for_helpers_polls"] == 0
+
+
+def test_wait_for_helpers_wakes_on_push(board):
+    step = wait_for_helpers_step(max_unknown_status_wait_time=1000)
+    helpers = get_settings().other_helpers
+
+    def push_statuses():
+        for helper in helpers:
+            board.update(
+                StatusCallback(
+                    query_id=step.query_id,
+                    role=helper.role,
+                    status=Status.READY,
+                    timestamp=time.time(),
+                )
+            )
+
+    with mock.patch(
+        "sidecar.app.helpers.Helper.get_current_query_status",
+        return_value=Status.STARTING,
+    ) as mock_get_status, mock.patch.object(get_settings(), "helper_poll_interval", 60):
+        timer = threading.Timer(0.1, push_statuses)
+        timer.start()
+        step.start()
+        timer.join()
+    assert step.success
+    # only polled once, before anything was pushed
+    assert mock_get_status.call_count == len(helpers)
+    assert step.timings["wait_for_helpers_seconds"] < 60
+
+
+def test_send_kill_signals(helper_query):
+    with mock.patch(
+        "sidecar.app.helpers.Helper.kill_query",
+        autospec=True,
+        side_effect=lambda helper, query_id: f"killed {query_id} on {helper.role}",
+    ) as mock_kill_query:
+        helper_query.send_kill_signals()
+    assert {call.args[0].role for call in mock_kill_query.call_args_list} == {
+        helper.role for helper in get_settings().other_helpers
+    }
+
+
+def test_ipa_query_requires_binary_path():
+    with pytest.raises(TypeError):
+        # pylint: disable=abstract-class-instantiated
+        IPABuildQuery(
+            query_id=str(uuid4()),
+            paths=mock.Mock(),
+            commit_hash="abcd1234",
+        )
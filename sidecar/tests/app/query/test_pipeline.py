@@ -0,0 +1,65 @@
+import threading
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+from sidecar.app.query.pipeline import Pipeline, StageSlots
+from sidecar.app.query.step import Stage
+
+
+def fake_query():
+    return SimpleNamespace(query_id=str(uuid4()), finished=False, timings={})
+
+
+def test_stage_slots_acquire_release():
+    slots = StageSlots(Stage.BUILD, capacity=1)
+    query = fake_query()
+    assert slots.acquire(query)
+    assert slots.stats["active"] == [query.query_id]
+    slots.release(query)
+    assert slots.stats["active"] == []
+    assert slots.stats["completed"] == 1
+    assert "build_wait_seconds" in query.timings
+    assert "build_seconds" in query.timings
+
+
+def test_stage_slots_wait_for_capacity():
+    slots = StageSlots(Stage.RUN, capacity=1)
+    query = fake_query()
+    query2 = fake_query()
+    slots.acquire(query)
+    acquired = threading.Event()
+
+    def acquire_second():
+        slots.acquire(query2, poll_interval=0.01)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire_second)
+    thread.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+    assert slots.stats["waiting"] == [query2.query_id]
+    slots.release(query)
+    thread.join(timeout=1)
+    assert acquired.is_set()
+    assert slots.stats["active"] == [query2.query_id]
+
+
+def test_stage_slots_finished_while_waiting():
+    slots = StageSlots(Stage.RUN, capacity=1)
+    query = fake_query()
+    query2 = fake_query()
+    slots.acquire(query)
+    query2.finished = True
+    assert not slots.acquire(query2, poll_interval=0.01)
+    assert slots.stats["waiting"] == []
+
+
+def test_pipeline_stages_are_independent():
+    pipeline = Pipeline(max_parallel_builds=1, max_parallel_runs=1)
+    building_query = fake_query()
+    running_query = fake_query()
+    assert pipeline.acquire(running_query, Stage.RUN)
+    assert pipeline.acquire(building_query, Stage.BUILD)
+    assert pipeline.stats["build"]["active"] == [building_query.query_id]
+    assert pipeline.stats["run"]["active"] == [running_query.query_id]
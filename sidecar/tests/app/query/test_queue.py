@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from sidecar.app.query.queue import AdmissionQueue
+
+
+def test_queue_fifo():
+    queue = AdmissionQueue()
+    assert queue.push("a", "demo-logger", {}) == 0
+    assert queue.push("b", "demo-logger", {}) == 1
+    assert len(queue) == 2
+    assert queue.pop().query_id == "a"
+    assert queue.pop().query_id == "b"
+    assert queue.pop() is None
+
+
+def test_queue_priority():
+    queue = AdmissionQueue()
+    queue.push("low", "demo-logger", {})
+    queue.push("low2", "demo-logger", {})
+    assert queue.push("high", "demo-logger", {}, priority=1) == 0
+    assert queue.position("low") == 1
+    assert [queue.pop().query_id for _ in range(3)] == ["high", "low", "low2"]
+
+
+def test_queue_remove():
+    queue = AdmissionQueue()
+    queue.push("a", "demo-logger", {})
+    queue.push("b", "demo-logger", {})
+    assert queue.remove("a")
+    assert not queue.remove("a")
+    assert "a" not in queue
+    assert queue.position("b") == 0
+
+
+def test_queue_persisted(tmp_path):
+    path = tmp_path / Path("queue.json")
+    queue = AdmissionQueue(path=path)
+    queue.push("a", "demo-logger", {"num_lines": 10})
+    queue.push("b", "demo-logger", {}, priority=2)
+    queue.pop()
+    restored_queue = AdmissionQueue(path=path)
+    assert len(restored_queue) == 1
+    entry = restored_queue.pop()
+    assert entry.query_id == "a"
+    assert entry.params == {"num_lines": 10}
+    assert restored_queue.push("c", "demo-logger", {}) == 0
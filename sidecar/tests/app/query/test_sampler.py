@@ -0,0 +1,69 @@
+import subprocess
+import sys
+import time
+
+import psutil
+import pytest
+
+from sidecar.app.query.sampler import ProcessTreeSampler
+
+# a process which keeps a busy child
+PARENT_CMD = [
+    sys.executable,
+    "-c",
+    "import subprocess, sys; subprocess.run([sys.executable, '-c', "
+    "'import time\\nend = time.time() + 5\\nwhile time.time() < end: pass'])",
+]
+
+
+@pytest.fixture(name="process_tree")
+def _process_tree():
+    process = subprocess.Popen(PARENT_CMD)
+    yield process
+    for child in psutil.Process(process.pid).children(recursive=True):
+        child.kill()
+    process.kill()
+    process.wait()
+
+
+def test_samples_process_tree(process_tree):
+    sampler = ProcessTreeSampler(lambda: process_tree.pid)
+    deadline = time.time() + 5
+    while sampler.sample().processes < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)
+    sample = sampler.sample()
+    assert sample.processes == 2
+    # measured since the last sample, so the busy child is counted
+    assert sample.cpu_percent > 10
+    assert sample.memory_rss_usage > 0
+    assert sample.num_threads >= 2
+    assert sample.ctx_switches > 0
+
+
+def test_samples_without_process():
+    sampler = ProcessTreeSampler(lambda: None)
+    sample = sampler.sample()
+    assert sample.processes == 0
+    assert sample.cpu_percent == 0
+    assert sampler.latest == sample
+
+
+def test_ring_buffer():
+    sampler = ProcessTreeSampler(lambda: None, max_samples=3)
+    for _ in range(5):
+        sampler.sample()
+    assert [sample.sequence for sample in sampler.samples_since(0)] == [3, 4, 5]
+    assert [sample.sequence for sample in sampler.samples_since(4)] == [5]
+    assert not sampler.samples_since(5)
+
+
+def test_samples_on_background_thread():
+    sampler = ProcessTreeSampler(lambda: None, interval=0.01)
+    sampler.start()
+    time.sleep(0.2)
+    sampler.stop()
+    sequence = sampler.sequence
+    assert sequence > 2
+    time.sleep(0.05)
+    assert sampler.sequence == sequence
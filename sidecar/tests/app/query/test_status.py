@@ -5,12 +5,21 @@ import loguru
 import pytest
 
 from sidecar.app.query.status import Status, StatusChangeEvent, StatusHistory
+from sidecar.app.query.status_store import FileStatusStore, SQLiteStatusStore
+
+
+@pytest.fixture(name="status_store_fixture", params=["file", "sqlite"])
+def _status_store_fixture(request, tmp_path):
+    if request.param == "file":
+        return FileStatusStore(tmp_path)
+    return SQLiteStatusStore(tmp_path / Path("status.db"))
 
 
 @pytest.fixture(name="status_history_fixture")
-def _status_history_fixture(tmp_path):
+def _status_history_fixture(status_store_fixture):
     status_history = StatusHistory(
-        file_path=tmp_path / Path("status"),
+        query_id="status",
+        store=status_store_fixture,
         logger=loguru.logger,
     )
 
@@ -46,17 +55,25 @@ def test_status_history_add(status_history_fixture):
     )
 
 
-def test_status_history_add_write_to_file(status_history_fixture):
-    status_history_fixture.add(Status.COMPILING, 1.0)
-    status_history_fixture.add(Status.IN_PROGRESS, 2.0)
-    with status_history_fixture.file_path.open("r", encoding="utf-8") as f:
+def test_status_history_add_write_to_file(tmp_path):
+    status_history = StatusHistory(
+        query_id="status",
+        store=FileStatusStore(tmp_path),
+        logger=loguru.logger,
+    )
+    status_history.add(Status.COMPILING, 1.0)
+    status_history.add(Status.IN_PROGRESS, 2.0)
+    with (tmp_path / Path("status")).open("r", encoding="utf-8") as f:
         assert f.readline() == "COMPILING,1.0\n"
         assert f.readline() == "IN_PROGRESS,2.0\n"
 
 
-def test_status_history_add_load_from_file(tmp_path, full_status_history_fixture):
+def test_status_history_add_load_from_store(
+    status_store_fixture, full_status_history_fixture
+):
     status_history = StatusHistory(
-        file_path=tmp_path / Path("status"),
+        query_id="status",
+        store=status_store_fixture,
         logger=loguru.logger,
     )
     assert status_history == full_status_history_fixture
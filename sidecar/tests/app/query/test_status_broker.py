@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+from sidecar.app.query.status_broker import StatusBroker
+
+
+def test_publish_without_subscribers():
+    broker = StatusBroker()
+    broker.publish("abc", {"status": "STARTING"})
+    assert broker.stats == {"topics": 0, "subscribers": 0, "published": 0}
+
+
+def test_subscribers_share_topic():
+    broker = StatusBroker()
+    with broker.subscribe("abc") as topic, broker.subscribe("abc") as other_topic:
+        assert topic is other_topic
+        assert broker.stats["topics"] == 1
+        assert broker.stats["subscribers"] == 2
+        broker.publish("abc", {"status": "STARTING"})
+        assert topic.event_json == {"status": "STARTING"}
+        assert topic.version == 1
+    assert broker.stats["topics"] == 0
+    assert broker.stats["published"] == 1
+
+
+def test_wait_for_change():
+    broker = StatusBroker()
+
+    async def wait():
+        with broker.subscribe("abc") as topic:
+            assert not await broker.wait_for_change(topic, topic.version, 0.01)
+            timer = threading.Timer(
+                0.05, broker.publish, args=("abc", {"status": "COMPLETE"})
+            )
+            timer.start()
+            changed = await broker.wait_for_change(topic, 0, 10)
+            timer.join()
+            # a change before waiting is seen straight away
+            assert await broker.wait_for_change(topic, 0, 0)
+            return changed, topic.event_json
+
+    assert asyncio.run(wait()) == (True, {"status": "COMPLETE"})
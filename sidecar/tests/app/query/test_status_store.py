@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import pytest
+
+from sidecar.app.query.status import Status, StatusChangeEvent
+from sidecar.app.query.status_store import FileStatusStore, SQLiteStatusStore
+
+
+@pytest.fixture(name="status_store", params=["file", "sqlite"])
+def _status_store(request, tmp_path):
+    if request.param == "file":
+        status_dir_path = tmp_path / Path("status")
+        status_dir_path.mkdir()
+        return FileStatusStore(status_dir_path)
+    return SQLiteStatusStore(tmp_path / Path("status.db"))
+
+
+def add_query(store, query_id, query_type, statuses, start):
+    for i, status in enumerate(statuses):
+        store.append(query_id, query_type, StatusChangeEvent(status, start + i))
+
+
+def test_append_load_delete(status_store):
+    assert status_store.load("a") == []
+    assert status_store.version("a") is None
+    add_query(status_store, "a", "ipa-query", [Status.STARTING], 1.0)
+    version = status_store.version("a")
+    assert version is not None
+    add_query(status_store, "a", "ipa-query", [Status.COMPLETE], 2.0)
+    assert status_store.load("a") == [
+        StatusChangeEvent(Status.STARTING, 1.0),
+        StatusChangeEvent(Status.COMPLETE, 2.0),
+    ]
+    status_store.delete("a")
+    assert not status_store.exists("a")
+
+
+def test_list_queries(status_store):
+    add_query(status_store, "a", None, [Status.STARTING, Status.COMPLETE], 1.0)
+    add_query(status_store, "b", None, [Status.STARTING, Status.KILLED], 10.0)
+    add_query(status_store, "c", None, [Status.STARTING], 20.0)
+
+    records = status_store.list_queries()
+    assert [record.query_id for record in records] == ["c", "b", "a"]
+    assert records[1].status == Status.KILLED
+    assert records[1].created_at == 10.0
+    assert records[1].end_time == 11.0
+    assert records[0].end_time is None
+
+    assert [r.query_id for r in status_store.list_queries(status=Status.KILLED)] == [
+        "b"
+    ]
+    assert [r.query_id for r in status_store.list_queries(since=5, until=20)] == ["b"]
+    assert [r.query_id for r in status_store.list_queries(limit=1, offset=1)] == ["b"]
+
+
+def test_sqlite_list_queries_by_type(tmp_path):
+    store = SQLiteStatusStore(tmp_path / Path("status.db"))
+    add_query(store, "a", "ipa-query", [Status.STARTING], 1.0)
+    add_query(store, "b", "build", [Status.STARTING], 2.0)
+    records = store.list_queries(query_type="build")
+    assert [record.query_id for record in records] == ["b"]
+    assert records[0].query_type == "build"
+
+
+def test_sqlite_wal_mode(tmp_path):
+    store = SQLiteStatusStore(tmp_path / Path("status.db"))
+    # pylint: disable=protected-access
+    journal_mode = store._connection.execute("PRAGMA journal_mode").fetchone()[0]
+    assert journal_mode == "wal"
+
+
+def test_sqlite_query_sizes(tmp_path):
+    store = SQLiteStatusStore(tmp_path / Path("status.db"))
+    add_query(store, "a", None, [Status.STARTING], 1.0)
+    add_query(store, "b", None, [Status.STARTING, Status.IN_PROGRESS], 5.0)
+    sizes = {
+        query_id: (updated, size) for query_id, updated, size in store.query_sizes()
+    }
+    assert sizes["a"][0] == 1.0
+    assert sizes["b"][0] == 6.0
+    # shared out by rows, so b has 3 of the 5
+    assert sizes["b"][1] > sizes["a"][1] > 0
+
+
+def test_migrate_status_files(tmp_path):
+    status_dir_path = tmp_path / Path("status")
+    status_dir_path.mkdir()
+    file_store = FileStatusStore(status_dir_path)
+    add_query(file_store, "a", None, [Status.STARTING, Status.COMPLETE], 1.0)
+    add_query(file_store, "b", None, [Status.STARTING], 5.0)
+
+    store = SQLiteStatusStore(tmp_path / Path("status.db"))
+    assert store.migrate_status_files(status_dir_path) == 2
+    assert store.load("a") == file_store.load("migrated/a")
+    assert [record.query_id for record in store.list_queries()] == ["b", "a"]
+    # migrated files are moved out of the way, so they are only imported once
+    assert not any(p.is_file() for p in status_dir_path.iterdir())
+    assert store.migrate_status_files(status_dir_path) == 0
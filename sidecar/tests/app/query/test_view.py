@@ -0,0 +1,93 @@
+import os
+from pathlib import Path
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+
+from sidecar.app.query.base import Query, QueryManager
+from sidecar.app.query.status import Status
+from sidecar.app.query.view import QueryView, QueryViewCache
+
+
+@pytest.fixture(autouse=True)
+def mock_settings_env_vars(tmp_path):
+    env_vars = {
+        "ROLE": "0",
+        "ROOT_PATH": str(tmp_path),
+        "CONFIG_PATH": str(Path("local_dev/config")),
+        "NETWORK_CONFIG_PATH": str(Path("local_dev/config") / Path("network.toml")),
+        "HELPER_PORT": str(17440),
+    }
+    with mock.patch.dict(os.environ, env_vars):
+        yield
+
+
+def finished_query(status: Status = Status.COMPLETE) -> Query:
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    query.status = status
+    return query
+
+
+def test_query_view_matches_query():
+    query = finished_query()
+    view = QueryViewCache().get(query.query_id)
+    assert view.status == query.status
+    assert view.status_event_json == query.status_event_json
+    assert view.finished and view.started and not view.running
+    assert view.log_file_path == query.log_file_path
+
+
+def test_query_view_cache_hits():
+    query = finished_query()
+    views = QueryViewCache()
+    view = views.get(query.query_id)
+    assert views.get(query.query_id) is view
+    assert views.stats["hits"] == 1
+    assert views.stats["misses"] == 1
+
+
+def test_query_view_cache_invalidated_by_version():
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    views = QueryViewCache()
+    assert views.get(query.query_id).status == Status.STARTING
+    query.status = Status.KILLED
+    assert views.get(query.query_id).status == Status.KILLED
+
+
+def test_query_view_cache_bounded():
+    queries = [finished_query() for _ in range(3)]
+    views = QueryViewCache(max_size=2)
+    for query in queries:
+        views.get(query.query_id)
+    assert views.stats["size"] == 2
+    views.get(queries[0].query_id)
+    assert views.stats["misses"] == 4
+
+
+def test_query_view_cache_missing():
+    assert QueryViewCache().get(str(uuid4())) is None
+
+
+def test_get_from_query_id_finished_returns_view():
+    query = finished_query(Status.CRASHED)
+    query_manager = QueryManager()
+    view = query_manager.get_from_query_id(Query, query.query_id)
+    assert isinstance(view, QueryView)
+    assert view.status == Status.CRASHED
+    assert query_manager.get_from_query_id(Query, query.query_id) is view
+
+
+def test_get_from_query_id_unfinished_returns_query():
+    # e.g., left behind by a previous process, so it can still be killed
+    query = Query(str(uuid4()))
+    query.status = Status.IN_PROGRESS
+    query_manager = QueryManager()
+    loaded_query = query_manager.get_from_query_id(Query, query.query_id)
+    assert isinstance(loaded_query, Query)
+    loaded_query.kill()
+    assert query_manager.get_from_query_id(Query, query.query_id).status == (
+        Status.KILLED
+    )
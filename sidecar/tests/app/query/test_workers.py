@@ -0,0 +1,35 @@
+import threading
+
+from sidecar.app.query.workers import WorkerPool
+
+
+def test_worker_pool_runs_on_named_threads():
+    pool = WorkerPool("test", max_workers=2)
+    thread_name = pool.submit(lambda: threading.current_thread().name).result()
+    assert thread_name.startswith("test-worker")
+    pool.shutdown()
+
+
+def test_worker_pool_stats():
+    pool = WorkerPool("test", max_workers=2)
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        started.set()
+        release.wait(timeout=5)
+
+    future = pool.submit(work)
+    started.wait(timeout=5)
+    stats = pool.stats
+    assert stats["busy"] == 1
+    assert stats["pending"] == 0
+    assert stats["utilization"] == 0.5
+
+    release.set()
+    future.result(timeout=5)
+    stats = pool.stats
+    assert stats["busy"] == 0
+    assert stats["completed"] == 1
+    assert stats["average_utilization"] > 0
+    pool.shutdown()
@@ -0,0 +1,96 @@
+from unittest import mock
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from sidecar.app.helpers import Role
+from sidecar.app.main import app
+from sidecar.app.settings import get_settings
+
+client = TestClient(app)
+
+BUILD_DATA = {
+    "gate_type": "compact",
+    "stall_detection": True,
+    "multi_threading": True,
+    "disable_metrics": False,
+    "reveal_aggregation": False,
+}
+
+
+def mock_role(role: Role):
+    settings = get_settings()
+    settings.role = role
+    return settings
+
+
+def test_start_build_helper():
+    mock_role(Role.HELPER_1)
+    with mock.patch(
+        "sidecar.app.query.base.QueryManager.start_build"
+    ) as mock_start_build, mock.patch(
+        "sidecar.app.helpers.Helper.start_build"
+    ) as mock_helper_start_build:
+        response = client.post("/build/abcd1234", data=BUILD_DATA)
+        assert response.status_code == 202
+        assert response.json()["build_id"] == (
+            "build-abcd1234_compact_stall-detection_multi-threading"
+        )
+        assert response.json()["message"] == "Build started successfully"
+        mock_start_build.assert_called_once()
+        mock_helper_start_build.assert_not_called()
+
+
+def test_start_build_already_running():
+    mock_role(Role.HELPER_1)
+    with mock.patch(
+        "sidecar.app.query.base.QueryManager.start_build", return_value=None
+    ) as mock_start_build:
+        response = client.post("/build/abcd1234", data=BUILD_DATA)
+        assert response.status_code == 202
+        assert response.json()["message"] == "Build already running"
+        mock_start_build.assert_called_once()
+
+
+def test_start_build_coordinator_fan_out():
+    mock_role(Role.COORDINATOR)
+    with mock.patch(
+        "sidecar.app.query.base.QueryManager.start_build"
+    ) as mock_start_build, mock.patch(
+        "sidecar.app.helpers.Helper.start_build", return_value="started"
+    ) as mock_helper_start_build:
+        response = client.post("/build/abcd1234", data={**BUILD_DATA, "fan_out": True})
+        assert response.status_code == 202
+        assert response.json()["build_id"] == "build-abcd1234"
+        assert response.json()["helper_responses"] == ["started"] * 3
+        mock_start_build.assert_called_once()
+        assert mock_helper_start_build.call_count == 3
+
+
+def test_start_build_fan_out_reports_failed_helper():
+    mock_role(Role.COORDINATOR)
+    with mock.patch("sidecar.app.query.base.QueryManager.start_build"), mock.patch(
+        "sidecar.app.helpers.Helper.start_build",
+        side_effect=["started", RuntimeError("unreachable"), "started"],
+    ):
+        response = client.post("/build/abcd1234", data={**BUILD_DATA, "fan_out": True})
+        assert response.status_code == 202
+        helper_responses = response.json()["helper_responses"]
+        assert helper_responses.count("started") == 2
+        assert any("unreachable" in response for response in helper_responses)
+
+
+def test_get_build_status_not_found():
+    response = client.get(f"/build/{uuid4()}/status")
+    assert response.status_code == 404
+
+
+def test_start_build_requires_build_options():
+    mock_role(Role.HELPER_1)
+    data = {key: value for key, value in BUILD_DATA.items() if key != "gate_type"}
+    with mock.patch(
+        "sidecar.app.query.base.QueryManager.start_build"
+    ) as mock_start_build:
+        response = client.post("/build/abcd1234", data=data)
+        assert response.status_code == 422
+        mock_start_build.assert_not_called()
@@ -0,0 +1,93 @@
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from sidecar.app.callbacks import (
+    SIGNATURE_HEADER,
+    StatusCallback,
+    get_helper_status_board,
+    load_private_key,
+    sign,
+)
+from sidecar.app.helpers import Role
+from sidecar.app.main import app
+from sidecar.app.query.status import Status
+
+client = TestClient(app)
+
+private_key = load_private_key(Path("local_dev/config/h1.key"))
+
+
+def post_callback(callback: StatusCallback, signature=None):
+    body = callback.to_body()
+    return client.post(
+        "/callbacks/status",
+        content=body,
+        headers={SIGNATURE_HEADER: signature or sign(private_key, body)},
+    )
+
+
+def test_status_callback():
+    query_id = str(uuid4())
+    callback = StatusCallback(
+        query_id=query_id,
+        role=Role.HELPER_1,
+        status=Status.IN_PROGRESS,
+        timestamp=time.time(),
+    )
+    response = post_callback(callback)
+    assert response.status_code == 200
+    assert response.json()["changed"]
+    assert get_helper_status_board().statuses(query_id) == {
+        Role.HELPER_1: Status.IN_PROGRESS
+    }
+
+    response = post_callback(callback)
+    assert response.status_code == 200
+    assert not response.json()["changed"]
+
+
+def test_status_callback_wrong_signer():
+    # signed with helper 1's key, but claiming to be from helper 2
+    callback = StatusCallback(
+        query_id=str(uuid4()),
+        role=Role.HELPER_2,
+        status=Status.IN_PROGRESS,
+        timestamp=time.time(),
+    )
+    response = post_callback(callback)
+    assert response.status_code == 403
+    assert get_helper_status_board().statuses(callback.query_id) == {}
+
+
+def test_status_callback_from_coordinator():
+    callback = StatusCallback(
+        query_id=str(uuid4()),
+        role=Role.COORDINATOR,
+        status=Status.IN_PROGRESS,
+        timestamp=time.time(),
+    )
+    assert post_callback(callback).status_code == 403
+
+
+def test_status_callback_expired():
+    callback = StatusCallback(
+        query_id=str(uuid4()),
+        role=Role.HELPER_1,
+        status=Status.IN_PROGRESS,
+        timestamp=time.time() - 3600,
+    )
+    assert post_callback(callback).status_code == 403
+
+
+def test_status_callback_invalid():
+    response = client.post(
+        "/callbacks/status",
+        content=b"not json",
+        headers={SIGNATURE_HEADER: sign(private_key, b"not json")},
+    )
+    assert response.status_code == 400
+    response = client.post("/callbacks/status", content=b"{}")
+    assert response.status_code == 422
@@ -0,0 +1,30 @@
+import pytest
+from fastapi import HTTPException
+
+from sidecar.app.routes.http_helpers import parse_byte_range
+
+
+@pytest.mark.parametrize(
+    "header,byte_range",
+    [
+        (None, None),
+        ("bytes=0-9", (0, 10)),
+        ("bytes=6-", (6, 18)),
+        ("bytes=-6", (12, 18)),
+        ("bytes=-100", (0, 18)),
+        ("bytes=10-100", (10, 18)),
+        ("bytes=0-5,12-17", None),
+        ("lines=0-5", None),
+        ("bytes=-", None),
+    ],
+)
+def test_parse_byte_range(header, byte_range):
+    assert parse_byte_range(header, 18) == byte_range
+
+
+@pytest.mark.parametrize("header", ["bytes=18-", "bytes=-0", "bytes=5-4"])
+def test_parse_byte_range_not_satisfiable(header):
+    with pytest.raises(HTTPException) as e:
+        parse_byte_range(header, 18)
+    assert e.value.status_code == 416
+    assert e.value.headers == {"Content-Range": "bytes */18"}
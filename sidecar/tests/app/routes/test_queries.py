@@ -0,0 +1,33 @@
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from sidecar.app.main import app
+from sidecar.app.query.base import Query
+from sidecar.app.query.status import Status
+
+client = TestClient(app)
+
+
+def test_list_queries():
+    queries = [Query(str(uuid4())) for _ in range(3)]
+    for query in queries:
+        query.status = Status.STARTING
+    queries[0].status = Status.KILLED
+
+    response = client.get("/queries", params={"status": "killed"})
+    assert response.status_code == 200
+    assert queries[0].query_id in [
+        record["query_id"] for record in response.json()["queries"]
+    ]
+    assert all(record["status"] == "KILLED" for record in response.json()["queries"])
+
+    response = client.get("/queries", params={"limit": 1})
+    assert response.status_code == 200
+    assert len(response.json()["queries"]) == 1
+    assert response.json()["next_offset"] == 1
+
+
+def test_list_queries_unknown_status():
+    response = client.get("/queries", params={"status": "not-a-status"})
+    assert response.status_code == 400
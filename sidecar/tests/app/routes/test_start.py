@@ -1,3 +1,4 @@
+import json
 from unittest import mock
 from uuid import uuid4
 
@@ -5,6 +6,7 @@ import pytest
 from fastapi.testclient import TestClient
 
 from sidecar.app.helpers import Role
+from sidecar.app.log_segments import compress_segment, rotate
 from sidecar.app.main import app
 from sidecar.app.query.status import Status
 from sidecar.app.routes.start import IncorrectRoleError, Query
@@ -40,8 +42,17 @@ def test_capacity_available():
 
 
 def test_not_capacity_available(running_query):
-    assert running_query.query_id in app.state.QUERY_MANAGER.running_queries
+    query_manager = app.state.QUERY_MANAGER
+    assert running_query.query_id in query_manager.running_queries
+    # one query can build while another one runs, so fill up every slot
+    other_queries = [
+        Query(str(uuid4())) for _ in range(query_manager.max_parallel_queries - 1)
+    ]
+    for query in other_queries:
+        query_manager.running_queries[query.query_id] = query
     response = client.get("/start/capacity-available")
+    for query in other_queries:
+        del query_manager.running_queries[query.query_id]
     assert response.status_code == 200
     assert response.json() == {"capacity_available": False}
 
@@ -56,7 +67,7 @@ def test_start_ipa_helper(mock_role):
     settings = mock_role(Role.HELPER_1)
     with mock.patch("sidecar.app.routes.start.get_settings", return_value=settings):
         with mock.patch(
-            "sidecar.app.query.base.QueryManager.run_query"
+            "sidecar.app.query.base.QueryManager.start_query"
         ) as mock_query_manager:
             query_id = str(uuid4())
             response = client.post(
@@ -72,13 +83,15 @@ def test_start_ipa_helper(mock_role):
             )
             assert response.status_code == 200
             mock_query_manager.assert_called_once()
+            # start_query is mocked, so release the capacity reserved for the query
+            del app.state.QUERY_MANAGER.running_queries[query_id]
 
 
 def test_start_ipa_helper_as_coordinator(mock_role):
     settings = mock_role(Role.COORDINATOR)
     with pytest.raises(IncorrectRoleError):
         with mock.patch("sidecar.app.routes.start.get_settings", return_value=settings):
-            with mock.patch("sidecar.app.query.base.QueryManager.run_query"):
+            with mock.patch("sidecar.app.query.base.QueryManager.start_query"):
                 query_id = str(uuid4())
                 client.post(
                     f"/start/ipa-helper/{query_id}",
@@ -97,7 +110,7 @@ def test_start_ipa_query(mock_role):
     settings = mock_role(Role.COORDINATOR)
     with mock.patch("sidecar.app.routes.start.get_settings", return_value=settings):
         with mock.patch(
-            "sidecar.app.query.base.QueryManager.run_query"
+            "sidecar.app.query.base.QueryManager.start_query"
         ) as mock_query_manager:
             query_id = str(uuid4())
             response = client.post(
@@ -113,13 +126,15 @@ def test_start_ipa_query(mock_role):
             )
             assert response.status_code == 200
             mock_query_manager.assert_called_once()
+            # start_query is mocked, so release the capacity reserved for the query
+            del app.state.QUERY_MANAGER.running_queries[query_id]
 
 
 def test_start_ipa_query_as_helper(mock_role):
     settings = mock_role(Role.HELPER_1)
     with pytest.raises(IncorrectRoleError):
         with mock.patch("sidecar.app.routes.start.get_settings", return_value=settings):
-            with mock.patch("sidecar.app.query.base.QueryManager.run_query"):
+            with mock.patch("sidecar.app.query.base.QueryManager.start_query"):
                 query_id = str(uuid4())
                 client.post(
                     f"/start/ipa-query/{query_id}",
@@ -134,6 +149,49 @@ def test_start_ipa_query_as_helper(mock_role):
                 )
 
 
+def test_start_ipa_query_queued(mock_role, running_query):
+    settings = mock_role(Role.COORDINATOR)
+    query_manager = app.state.QUERY_MANAGER
+    other_queries = [
+        Query(str(uuid4())) for _ in range(query_manager.max_parallel_queries - 1)
+    ]
+    for query in other_queries:
+        query_manager.running_queries[query.query_id] = query
+    with mock.patch("sidecar.app.routes.start.get_settings", return_value=settings):
+        with mock.patch(
+            "sidecar.app.query.base.QueryManager.start_query"
+        ) as mock_query_manager:
+            query_id = str(uuid4())
+            response = client.post(
+                f"/start/ipa-query/{query_id}",
+                data={
+                    "commit_hash": "abcd1234",
+                    "size": 10,
+                    "max_breakdown_key": 16,
+                    "max_trigger_value": 10,
+                    "per_user_credit_cap": 5,
+                    "malicious_security": True,
+                },
+            )
+            mock_query_manager.assert_not_called()
+    for query in other_queries:
+        del query_manager.running_queries[query.query_id]
+
+    assert response.status_code == 202
+    assert response.json()["queue_position"] == 0
+    response = client.get(f"/start/{query_id}/status")
+    assert response.json()["status"] == Status.QUEUED.name
+    assert response.json()["queue_position"] == 0
+    response = client.get("/start/queue")
+    assert response.json()["queued_queries"][0]["query_id"] == query_id
+
+    response = client.post(f"/stop/kill/{query_id}")
+    assert response.status_code == 200
+    assert query_manager.queue_position(query_id) is None
+    response = client.get(f"/start/{query_id}/status")
+    assert response.json()["status"] == Status.KILLED.name
+
+
 def test_get_status_not_found():
     query_id = str(uuid4())
     response = client.get(f"/start/{query_id}/status")
@@ -159,6 +217,16 @@ def test_get_status_complete(running_query):
     assert "end_time" in status_event_json
 
 
+def test_get_query_timings(running_query):
+    running_query.timings["build_seconds"] = 1.5
+    response = client.get(f"/start/{running_query.query_id}/timings")
+    assert response.status_code == 200
+    assert response.json() == {
+        "stage": None,
+        "timings": {"build_seconds": 1.5},
+    }
+
+
 def test_get_ipa_helper_log_file_not_found():
     query_id = str(uuid4())
     response = client.get(f"/start/{query_id}/log-file")
@@ -166,8 +234,169 @@ def test_get_ipa_helper_log_file_not_found():
 
 
 def test_get_ipa_helper_log_file(running_query):
+    for i in range(3):
+        running_query.logger.info(f"log {i}")
+    running_query.logger.complete()
+    response = client.get(f"/start/{running_query.query_id}/log-file")
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert [line.split(" - ", 1)[1] for line in lines[-3:]] == [
+        "log 0",
+        "log 1",
+        "log 2",
+    ]
+    # rendered from the log, if there is no text rendering
+    settings = get_settings()
+    settings.log_writer.close(running_query.query_id)
+    settings.log_writer.text_file_path(running_query.query_id).unlink()
+    assert client.get(f"/start/{running_query.query_id}/log-file").text == (
+        response.text
+    )
+
+
+def test_get_ipa_helper_log_file_raw(running_query):
     test_file_content = "log 1\nlog 2\nlog 3\n"
     running_query.log_file_path.write_text(test_file_content, encoding="utf-8")
-    response = client.get(f"/start/{running_query.query_id}/log-file")
+    response = client.get(
+        f"/start/{running_query.query_id}/log-file", params={"format": "raw"}
+    )
     assert response.status_code == 200
     assert response.text.startswith(test_file_content)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "identity"])
+def test_get_ipa_helper_log_file_encoding(running_query, encoding):
+    running_query.logger.info("log 0")
+    running_query.logger.complete()
+    response = client.get(
+        f"/start/{running_query.query_id}/log-file",
+        headers={"Accept-Encoding": encoding},
+    )
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding", "identity") == encoding
+    assert response.text.endswith("log 0\n")
+
+
+def test_get_ipa_helper_log_file_range(running_query):
+    test_file_content = "log 1\nlog 2\nlog 3\n"
+    running_query.log_file_path.write_text(test_file_content, encoding="utf-8")
+    response = client.get(
+        f"/start/{running_query.query_id}/log-file",
+        params={"format": "raw"},
+        headers={"Range": "bytes=6-11"},
+    )
+    assert response.status_code == 206
+    assert response.text == "log 2\n"
+
+
+def test_get_ipa_helper_log_file_from_line(running_query):
+    running_query.logger.complete()
+    test_file_content = "log 1\nlog 2\nlog 3\n"
+    running_query.log_file_path.write_text(test_file_content, encoding="utf-8")
+    response = client.get(
+        f"/start/{running_query.query_id}/log-file", params={"line": 1}
+    )
+    assert response.status_code == 200
+    assert response.text == "log 2\nlog 3\n"
+
+
+@pytest.mark.parametrize(
+    "byte_range,status_code,content",
+    [
+        ("bytes=6-", 206, "log 2\nlog 3\n"),
+        ("bytes=0-5,12-17", 200, "log 1\nlog 2\nlog 3\n"),
+        ("bytes=100000-", 416, None),
+    ],
+)
+def test_get_ipa_helper_log_file_ranges(
+    running_query, byte_range, status_code, content
+):
+    running_query.log_file_path.write_text("log 1\nlog 2\nlog 3\n", encoding="utf-8")
+    response = client.get(
+        f"/start/{running_query.query_id}/log-file",
+        params={"format": "raw"},
+        headers={"Range": byte_range},
+    )
+    assert response.status_code == status_code
+    # the query logs to the file as it's read, so only its start is known
+    if content is not None:
+        assert response.text.startswith(content)
+    else:
+        assert response.headers["content-range"].startswith("bytes */")
+
+
+def test_get_ipa_helper_log_file_rotated(running_query):
+    running_query.logger.complete()
+    log_file_path = running_query.log_file_path
+    log_file_path.write_text("log 1\n", encoding="utf-8")
+    compress_segment(rotate(log_file_path), "gzip")
+    log_file_path.write_text("log 2\n", encoding="utf-8")
+    response = client.get(
+        f"/start/{running_query.query_id}/log-file",
+        params={"format": "raw"},
+        headers={"Range": "bytes=3-8"},
+    )
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 3-8/12"
+    assert response.text == " 1\nlog"
+
+
+def test_search_logs(running_query):
+    running_query.logger.info("widget 1")
+    running_query.logger.error("failed: boom")
+    running_query.logger.info("widget 2")
+    running_query.logger.error("failed: again")
+    running_query.logger.complete()
+    url = f"/start/{running_query.query_id}/logs"
+
+    response = client.get(url, params={"level": "error"})
+    assert response.status_code == 200
+    assert [r["message"] for r in response.json()["records"]] == [
+        "failed: boom",
+        "failed: again",
+    ]
+    assert {r["level"] for r in response.json()["records"]} == {"ERROR"}
+    assert response.json()["next_offset"] is None
+
+    response = client.get(url, params={"q": "widget"})
+    assert [r["message"] for r in response.json()["records"]] == [
+        "widget 1",
+        "widget 2",
+    ]
+
+
+def test_search_logs_pages(running_query):
+    running_query.logger.error("failed: boom")
+    running_query.logger.error("failed: again")
+    running_query.logger.complete()
+    url = f"/start/{running_query.query_id}/logs"
+
+    first = client.get(url, params={"level": "ERROR", "limit": 1}).json()
+    assert [r["message"] for r in first["records"]] == ["failed: boom"]
+    assert first["next_offset"] is not None
+    second = client.get(
+        url, params={"level": "ERROR", "limit": 1, "offset": first["next_offset"]}
+    ).json()
+    assert [r["message"] for r in second["records"]] == ["failed: again"]
+    assert second["records"][0]["line"] > first["records"][0]["line"]
+    assert second["next_offset"] is None
+
+
+def test_search_logs_stream(running_query):
+    running_query.logger.error("failed: boom")
+    running_query.logger.complete()
+    response = client.get(
+        f"/start/{running_query.query_id}/logs",
+        params={"level": "ERROR", "stream": True},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["message"] for r in records] == ["failed: boom"]
+
+
+def test_search_logs_unknown_level(running_query):
+    response = client.get(
+        f"/start/{running_query.query_id}/logs", params={"level": "LOUD"}
+    )
+    assert response.status_code == 400
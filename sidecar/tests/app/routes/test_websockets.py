@@ -0,0 +1,176 @@
+import json
+import threading
+from uuid import uuid4
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from sidecar.app.main import app
+from sidecar.app.query.base import Query
+from sidecar.app.query.sampler import ProcessTreeSampler
+from sidecar.app.query.status import Status
+from sidecar.app.query.status_broker import get_status_broker
+
+client = TestClient(app)
+
+
+def test_status_websocket_pushes_changes():
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    query_manager = app.state.QUERY_MANAGER
+    query_manager.running_queries[query.query_id] = query
+    try:
+        with client.websocket_connect(f"/ws/status/{query.query_id}") as websocket:
+            assert websocket.receive_json()["status"] == "STARTING"
+            threading.Timer(
+                0.05, lambda: setattr(query, "status", Status.IN_PROGRESS)
+            ).start()
+            assert websocket.receive_json()["status"] == "IN_PROGRESS"
+            threading.Timer(
+                0.05, lambda: setattr(query, "status", Status.COMPLETE)
+            ).start()
+            event = websocket.receive_json()
+            assert event["status"] == "COMPLETE"
+            assert "end_time" in event
+    finally:
+        del query_manager.running_queries[query.query_id]
+    assert get_status_broker().stats["topics"] == 0
+
+
+def test_status_websocket_finished_query():
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    query.status = Status.KILLED
+    with client.websocket_connect(f"/ws/status/{query.query_id}") as websocket:
+        assert websocket.receive_json()["status"] == "KILLED"
+
+
+def receive_records(websocket) -> list[dict]:
+    return [json.loads(line) for line in websocket.receive_text().split("\n") if line]
+
+
+def test_logs_websocket_tails_running_query():
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    query_manager = app.state.QUERY_MANAGER
+    query_manager.running_queries[query.query_id] = query
+    try:
+        with client.websocket_connect(f"/ws/logs/{query.query_id}") as websocket:
+            query.logger.info("first")
+            query.logger.info("second")
+            messages = []
+            while "second" not in messages:
+                messages += [
+                    record["record"]["message"] for record in receive_records(websocket)
+                ]
+            assert messages.index("first") < messages.index("second")
+            query.status = Status.COMPLETE
+            # the websocket closes once the query isn't running
+            with pytest.raises(WebSocketDisconnect):
+                while True:
+                    websocket.receive_text()
+    finally:
+        del query_manager.running_queries[query.query_id]
+
+
+def test_logs_websocket_finished_query():
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    for i in range(3):
+        query.logger.info(f"line {i}")
+    query.status = Status.COMPLETE
+    query.logger.complete()
+    with client.websocket_connect(f"/ws/logs/{query.query_id}") as websocket:
+        messages = [
+            record["record"]["message"] for record in receive_records(websocket)
+        ]
+    lines = [message for message in messages if message.startswith("line")]
+    assert lines == ["line 0", "line 1", "line 2"]
+
+
+def test_logs_websocket_resumes_from_line():
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    for i in range(5):
+        query.logger.info(f"line {i}")
+    query.status = Status.COMPLETE
+    query.logger.complete()
+    with client.websocket_connect(f"/ws/logs/{query.query_id}") as websocket:
+        records = receive_records(websocket)
+    line = next(
+        i for i, record in enumerate(records) if record["record"]["message"] == "line 3"
+    )
+    with client.websocket_connect(
+        f"/ws/logs/{query.query_id}?line={line}"
+    ) as websocket:
+        messages = [
+            record["record"]["message"] for record in receive_records(websocket)
+        ]
+    assert messages[:2] == ["line 3", "line 4"]
+
+
+def test_stats_websocket_sends_samples():
+    query = Query(str(uuid4()))
+    query.status = Status.STARTING
+    query.sampler = ProcessTreeSampler(lambda: None, interval=0.01)
+    query.sampler.sample()
+    query.sampler.sample()
+    query_manager = app.state.QUERY_MANAGER
+    query_manager.running_queries[query.query_id] = query
+    try:
+        with client.websocket_connect(f"/ws/stats/{query.query_id}") as websocket:
+            # the buffered samples, and then each new one
+            assert websocket.receive_json()["sequence"] == 1
+            assert websocket.receive_json()["sequence"] == 2
+            query.sampler.sample()
+            sample = websocket.receive_json()
+            assert sample["sequence"] == 3
+            assert {"cpu_percent", "memory_rss_usage", "timestamp"} <= set(sample)
+            query.status = Status.COMPLETE
+            with pytest.raises(WebSocketDisconnect):
+                while True:
+                    websocket.receive_json()
+    finally:
+        del query_manager.running_queries[query.query_id]
+
+
+def test_status_websocket_follows_queued_query():
+    query = Query(str(uuid4()))
+    query.status = Status.QUEUED
+    query_manager = app.state.QUERY_MANAGER
+    query_manager.queued_queries[query.query_id] = query
+    try:
+        with client.websocket_connect(f"/ws/status/{query.query_id}") as websocket:
+            assert websocket.receive_json()["status"] == "QUEUED"
+            threading.Timer(
+                0.05, lambda: setattr(query, "status", Status.STARTING)
+            ).start()
+            assert websocket.receive_json()["status"] == "STARTING"
+            threading.Timer(
+                0.05, lambda: setattr(query, "status", Status.COMPLETE)
+            ).start()
+            assert websocket.receive_json()["status"] == "COMPLETE"
+    finally:
+        del query_manager.queued_queries[query.query_id]
+
+
+def test_logs_websocket_follows_queued_query():
+    query = Query(str(uuid4()))
+    query.status = Status.QUEUED
+    query_manager = app.state.QUERY_MANAGER
+    query_manager.queued_queries[query.query_id] = query
+    try:
+        with client.websocket_connect(f"/ws/logs/{query.query_id}") as websocket:
+            query.logger.info("started")
+            messages = []
+            while "started" not in messages:
+                messages += [
+                    record["record"]["message"] for record in receive_records(websocket)
+                ]
+            query.status = Status.KILLED
+            with pytest.raises(WebSocketDisconnect):
+                while True:
+                    websocket.receive_text()
+    finally:
+        del query_manager.queued_queries[query.query_id]
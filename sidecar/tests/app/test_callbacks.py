@@ -0,0 +1,176 @@
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+from uuid import uuid4
+
+import httpx
+
+from sidecar.app.callbacks import (
+    SIGNATURE_HEADER,
+    HelperStatusBoard,
+    StatusCallback,
+    StatusCallbackSender,
+    get_status_callback_sender,
+    load_private_key,
+    sign,
+    verify,
+)
+from sidecar.app.helpers import Role
+from sidecar.app.query.status import Status
+from sidecar.app.settings import get_settings
+
+PRIVATE_KEY_PEM_PATH = Path("local_dev/config/h1.key")
+
+
+def status_callback(query_id: str, status: Status, role=Role.HELPER_1):
+    return StatusCallback(
+        query_id=query_id, role=role, status=status, timestamp=time.time()
+    )
+
+
+def test_sign_verify():
+    private_key = load_private_key(PRIVATE_KEY_PEM_PATH)
+    helpers = get_settings().helpers
+    body = status_callback(str(uuid4()), Status.STARTING).to_body()
+    signature = sign(private_key, body)
+    assert verify(helpers[Role.HELPER_1].public_key, body, signature)
+    assert not verify(helpers[Role.HELPER_2].public_key, body, signature)
+    assert not verify(helpers[Role.HELPER_1].public_key, body + b" ", signature)
+    assert not verify(helpers[Role.HELPER_1].public_key, body, "not-base64!")
+
+
+def test_status_callback_body():
+    callback = status_callback(str(uuid4()), Status.COMPILING)
+    assert StatusCallback.from_body(callback.to_body()) == callback
+
+
+def test_board_update():
+    board = HelperStatusBoard()
+    query_id = str(uuid4())
+    assert board.statuses(query_id) == {}
+    assert board.version(query_id) == 0
+
+    assert board.update(status_callback(query_id, Status.COMPILING))
+    assert board.version(query_id) == 1
+    # an older status, delivered late, is ignored
+    assert not board.update(status_callback(query_id, Status.STARTING))
+    assert board.version(query_id) == 1
+    assert board.update(status_callback(query_id, Status.IN_PROGRESS))
+    assert board.statuses(query_id) == {Role.HELPER_1: Status.IN_PROGRESS}
+    assert board.version(query_id) == 2
+
+
+def test_board_evicts_oldest_query():
+    board = HelperStatusBoard(max_queries=2)
+    query_ids = [str(uuid4()) for _ in range(3)]
+    for query_id in query_ids:
+        board.update(status_callback(query_id, Status.STARTING))
+    assert board.statuses(query_ids[0]) == {}
+    assert board.version(query_ids[0]) == 0
+    assert board.statuses(query_ids[2]) == {Role.HELPER_1: Status.STARTING}
+
+
+def test_board_wait_for_change():
+    board = HelperStatusBoard()
+    query_id = str(uuid4())
+    assert not board.wait_for_change(query_id, 0, 0.01)
+
+    timer = threading.Timer(
+        0.05, board.update, args=(status_callback(query_id, Status.STARTING),)
+    )
+    timer.start()
+    assert board.wait_for_change(query_id, 0, 10)
+    timer.join()
+
+    stopped = threading.Event()
+    threading.Timer(0.05, lambda: (stopped.set(), board.notify_all())).start()
+    assert not board.wait_for_change(query_id, 1, 10, stopped)
+
+
+def test_sender_posts_signed_callback():
+    settings = get_settings()
+    coordinator = settings.helpers[Role.COORDINATOR]
+    private_key = load_private_key(PRIVATE_KEY_PEM_PATH)
+    sender = StatusCallbackSender(
+        role=Role.HELPER_1,
+        coordinator=coordinator,
+        private_key=private_key,
+    )
+    query_id = str(uuid4())
+    with mock.patch.object(
+        coordinator.client, "request", return_value=httpx.Response(200)
+    ) as mock_request:
+        sender.send(query_id, Status.IN_PROGRESS)
+        sender._executor.shutdown(wait=True)  # pylint: disable=protected-access
+
+    # over the coordinator's pooled client
+    mock_request.assert_called_once()
+    method, url = mock_request.call_args.args[:2]
+    body = mock_request.call_args.kwargs["content"]
+    signature = mock_request.call_args.kwargs["headers"][SIGNATURE_HEADER]
+    assert method == "POST"
+    assert url == coordinator.status_callback_url()
+    assert StatusCallback.from_body(body).status == Status.IN_PROGRESS
+    assert verify(settings.helpers[Role.HELPER_1].public_key, body, signature)
+
+
+def test_sender_retries_unavailable_coordinator():
+    coordinator = get_settings().helpers[Role.COORDINATOR]
+    sender = StatusCallbackSender(
+        role=Role.HELPER_1,
+        coordinator=coordinator,
+        private_key=load_private_key(PRIVATE_KEY_PEM_PATH),
+    )
+    with mock.patch.object(
+        httpx.Client,
+        "request",
+        side_effect=[httpx.Response(503), httpx.Response(200)],
+    ) as mock_request, mock.patch.object(coordinator.client, "retry_backoff", 0):
+        sender.send(str(uuid4()), Status.STARTING)
+        sender._executor.shutdown(wait=True)  # pylint: disable=protected-access
+    assert mock_request.call_count == 2
+
+
+def test_sender_ignores_http_errors():
+    coordinator = get_settings().helpers[Role.COORDINATOR]
+    sender = StatusCallbackSender(
+        role=Role.HELPER_1,
+        coordinator=coordinator,
+        private_key=load_private_key(PRIVATE_KEY_PEM_PATH),
+    )
+    with mock.patch.object(
+        coordinator.client, "request", side_effect=httpx.ConnectError("refused")
+    ) as mock_request:
+        sender.send(str(uuid4()), Status.STARTING)
+        sender._executor.shutdown(wait=True)  # pylint: disable=protected-access
+    mock_request.assert_called_once()
+
+
+def test_sender_signs_with_helper_key_by_default():
+    settings = get_settings()
+    with mock.patch.object(settings, "role", Role.HELPER_2), mock.patch.object(
+        settings, "config_path", Path("local_dev/config")
+    ), mock.patch.object(settings, "private_key_pem_path", None):
+        assert settings.callback_private_key_path == Path("local_dev/config/h2.key")
+        get_status_callback_sender.cache_clear()
+        try:
+            sender = get_status_callback_sender()
+        finally:
+            get_status_callback_sender.cache_clear()
+    assert sender is not None
+    body = status_callback(str(uuid4()), Status.READY, Role.HELPER_2).to_body()
+    signature = sign(sender.private_key, body)
+    assert verify(settings.helpers[Role.HELPER_2].public_key, body, signature)
+
+
+def test_no_sender_without_private_key(tmp_path):
+    settings = get_settings()
+    with mock.patch.object(settings, "role", Role.HELPER_1), mock.patch.object(
+        settings, "private_key_pem_path", tmp_path / "missing.key"
+    ):
+        get_status_callback_sender.cache_clear()
+        try:
+            assert get_status_callback_sender() is None
+        finally:
+            get_status_callback_sender.cache_clear()
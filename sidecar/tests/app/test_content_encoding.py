@@ -0,0 +1,18 @@
+import gzip
+
+from sidecar.app.content_encoding import encode_chunks, negotiate_encoding
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("br, GZIP;q=0.5") == "gzip"
+
+
+def test_encode_chunks_gzip():
+    chunks = [b"line 1\n" * 1000, b"line 2\n" * 1000]
+    encoded = b"".join(encode_chunks(chunks, "gzip"))
+    assert gzip.decompress(encoded) == b"".join(chunks)
+    assert list(encode_chunks(chunks, None)) == chunks
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import httpx
+import pytest
+
+from sidecar.app.helpers import HelperClient, Role, broadcast
+from sidecar.app.settings import get_settings
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # status codes to reply with, before replying 200
+    failures: list[int] = []
+    methods: list[str] = []
+
+    def reply(self):
+        self.methods.append(self.command)
+        status_code = self.failures.pop(0) if self.failures else 200
+        body = json.dumps({"status": "IN_PROGRESS"}).encode("utf8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.reply()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.reply()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="server_url")
+def _server_url():
+    Handler.failures = []
+    Handler.methods = []
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_reuses_connection(server_url):
+    client = HelperClient()
+    for _ in range(3):
+        assert client.get(f"{server_url}/status").status_code == 200
+    client.close()
+    assert client.stats["requests"] == 3
+    assert client.stats["connections"] == 1
+    assert client.stats["failures"] == 0
+
+
+def test_client_retries_unavailable(server_url):
+    Handler.failures = [503, 502]
+    client = HelperClient(retry_backoff=0)
+    assert client.get(f"{server_url}/status").status_code == 200
+    client.close()
+    assert client.stats["requests"] == 3
+    assert client.stats["retries"] == 2
+    assert client.stats["failures"] == 2
+
+
+def test_client_gives_up_after_max_retries(server_url):
+    Handler.failures = [503, 503, 503, 503]
+    client = HelperClient(max_retries=1, retry_backoff=0)
+    assert client.get(f"{server_url}/status").status_code == 503
+    client.close()
+    assert client.stats["requests"] == 2
+
+
+def test_client_retries_transport_errors():
+    client = HelperClient(retry_backoff=0)
+    with mock.patch.object(
+        httpx.Client, "request", side_effect=httpx.ConnectError("refused")
+    ) as mock_request:
+        with pytest.raises(httpx.ConnectError):
+            client.get("http://localhost:1/status")
+    client.close()
+    assert mock_request.call_count == 3
+    assert client.stats["failures"] == 3
+
+
+def test_kill_query_only_posts():
+    helper = get_settings().helpers[Role.HELPER_2]
+    response = httpx.Response(200, text="killed")
+    with mock.patch.object(helper.client, "request", return_value=response) as m:
+        message = helper.kill_query("abc")
+    assert "killed" in message
+    m.assert_called_once_with("POST", helper.query_kill_url("abc"))
+
+
+def test_kill_query_unreachable():
+    helper = get_settings().helpers[Role.HELPER_2]
+    with mock.patch.object(
+        helper.client, "request", side_effect=httpx.ConnectError("refused")
+    ):
+        message = helper.kill_query("abc")
+    assert message.startswith("failed to send kill signal")
+
+
+def test_broadcast_is_concurrent():
+    helpers = get_settings().other_helpers
+
+    def send(helper):
+        time.sleep(0.2)
+        return f"sent to {helper.role}"
+
+    start = time.perf_counter()
+    responses = broadcast(helpers, send)
+    assert time.perf_counter() - start < 0.2 * len(helpers)
+    assert responses == {helper.role: f"sent to {helper.role}" for helper in helpers}
+
+
+def test_broadcast_deadline():
+    helpers = get_settings().other_helpers
+    unreachable = helpers[0].role
+    released = threading.Event()
+
+    def send(helper):
+        if helper.role == unreachable:
+            released.wait(10)
+            return "too late"
+        if helper.role == helpers[1].role:
+            raise httpx.ConnectError("refused")
+        return "sent"
+
+    start = time.perf_counter()
+    responses = broadcast(helpers, send, deadline=0.1)
+    released.set()
+    assert time.perf_counter() - start < 1
+    assert responses[unreachable].startswith("no response")
+    assert responses[helpers[1].role].startswith("failed to signal")
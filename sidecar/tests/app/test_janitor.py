@@ -0,0 +1,113 @@
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from sidecar.app.janitor import (
+    ArtifactClass,
+    Janitor,
+    RetentionQuota,
+    StatusStoreClass,
+    queries_in_use,
+    query_key,
+)
+from sidecar.app.query.status import Status, StatusChangeEvent
+from sidecar.app.query.status_store import SQLiteStatusStore
+
+
+def write(path: Path, size: int, age: float):
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def log_class(log_dir_path: Path, quota: RetentionQuota) -> ArtifactClass:
+    return ArtifactClass("logs", log_dir_path, "*", quota, key=query_key)
+
+
+def test_groups_files_by_query(tmp_path):
+    write(tmp_path / "a.log", 10, age=30)
+    write(tmp_path / "a.log.idx", 1, age=20)
+    write(tmp_path / "a.log.0000000000000010.gz", 5, age=40)
+    write(tmp_path / "b.log", 7, age=10)
+    artifacts = log_class(tmp_path, RetentionQuota()).artifacts()
+    assert [(a.key, a.size_bytes, len(a.paths)) for a in artifacts] == [
+        ("a", 16, 3),
+        ("b", 7, 1),
+    ]
+
+
+def test_evicts_expired(tmp_path):
+    write(tmp_path / "old.log", 10, age=100)
+    write(tmp_path / "old.txt", 10, age=100)
+    write(tmp_path / "new.log", 10, age=1)
+    janitor = Janitor([log_class(tmp_path, RetentionQuota(max_age_seconds=50))])
+    assert [artifact.key for artifact in janitor.run()] == ["old"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["new.log"]
+    assert janitor.stats["reclaimed_bytes"] == 20
+    assert janitor.stats["classes"]["logs"]["artifacts"] == 1
+
+
+def test_evicts_oldest_over_quota(tmp_path):
+    for i, age in enumerate([40, 30, 20, 10]):
+        write(tmp_path / f"q{i}.log", 10, age=age)
+    janitor = Janitor([log_class(tmp_path, RetentionQuota(max_bytes=25))])
+    assert [artifact.key for artifact in janitor.run()] == ["q0", "q1"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["q2.log", "q3.log"]
+    # within quota, so nothing more is deleted
+    assert not janitor.run()
+    assert janitor.stats["runs"] == 2
+    assert janitor.stats["classes"]["logs"]["total_bytes"] == 20
+
+
+def test_skips_in_use(tmp_path):
+    for i, age in enumerate([40, 30, 20]):
+        write(tmp_path / f"q{i}.log", 10, age=age)
+    janitor = Janitor(
+        [log_class(tmp_path, RetentionQuota(max_bytes=15))], in_use=lambda: {"q0"}
+    )
+    assert [artifact.key for artifact in janitor.run()] == ["q1", "q2"]
+    assert [p.name for p in tmp_path.iterdir()] == ["q0.log"]
+    assert janitor.stats["classes"]["logs"]["skipped_in_use"] == 1
+
+
+def test_missing_directory(tmp_path):
+    janitor = Janitor([log_class(tmp_path / "missing", RetentionQuota(max_bytes=0))])
+    assert not janitor.run()
+
+
+def status_store_class(tmp_path: Path, quota: RetentionQuota) -> StatusStoreClass:
+    store = SQLiteStatusStore(tmp_path / "status.db")
+    now = time.time()
+    for query_id, age in [("old", 100), ("running", 90), ("new", 1)]:
+        store.append(query_id, None, StatusChangeEvent(Status.STARTING, now - age))
+    return StatusStoreClass("status", tmp_path, "status.db", quota, store=store)
+
+
+def test_evicts_expired_status_rows(tmp_path):
+    status_class = status_store_class(tmp_path, RetentionQuota(max_age_seconds=50))
+    janitor = Janitor([status_class], in_use=lambda: {"running"})
+    assert [artifact.key for artifact in janitor.run()] == ["old"]
+    assert not status_class.store.exists("old")
+    assert status_class.store.exists("running")
+    assert status_class.store.exists("new")
+    assert janitor.stats["classes"]["status"]["skipped_in_use"] == 1
+
+
+def test_evicts_status_rows_over_quota(tmp_path):
+    status_class = status_store_class(tmp_path, RetentionQuota(max_bytes=0))
+    janitor = Janitor([status_class])
+    assert [artifact.key for artifact in janitor.run()] == ["old", "running", "new"]
+    assert not status_class.store.list_queries()
+
+
+def test_queries_in_use():
+    query_manager = SimpleNamespace(
+        running_queries={
+            "a": SimpleNamespace(
+                query_id="a", test_data_file=Path("input/events-10.txt")
+            ),
+        },
+        queued_queries={"b": SimpleNamespace(query_id="b")},
+    )
+    assert queries_in_use(query_manager) == {"a", "b", "events-10.txt"}
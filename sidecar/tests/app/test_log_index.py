@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from sidecar.app.log_index import LogIndex, index_file_path
+
+
+def record(i: int) -> bytes:
+    # a cut down serialized loguru record
+    data = {"text": f"line {i}", "record": {"time": {"timestamp": 1000.0 + i}}}
+    return (json.dumps(data) + "\n").encode("utf8")
+
+
+@pytest.fixture(name="log_file_path")
+def _log_file_path(tmp_path):
+    log_file_path = tmp_path / "query.log"
+    log_file_path.write_bytes(b"".join(record(i) for i in range(95)))
+    return log_file_path
+
+
+def line_offset(log_file_path, line: int) -> int:
+    return sum(
+        len(log_line) for log_line in log_file_path.read_bytes().splitlines(True)[:line]
+    )
+
+
+def test_offset_for_line(log_file_path):
+    index = LogIndex(log_file_path, interval=10)
+    for line in [0, 1, 9, 10, 11, 50, 94]:
+        assert index.offset_for_line(line) == line_offset(log_file_path, line)
+    assert index.offset_for_line(1000) == log_file_path.stat().st_size
+    assert index.lines == 95
+    assert [c.line for c in index.checkpoints] == list(range(0, 95, 10))
+
+
+def test_offset_for_time(log_file_path):
+    index = LogIndex(log_file_path, interval=10)
+    assert index.offset_for_time(0) == 0
+    assert index.offset_for_time(1042) == line_offset(log_file_path, 42)
+    assert index.offset_for_time(1042.5) == line_offset(log_file_path, 43)
+    assert index.offset_for_time(5000) == log_file_path.stat().st_size
+
+
+def test_index_is_extended_and_saved(log_file_path):
+    index = LogIndex(log_file_path, interval=10)
+    index.update()
+    with log_file_path.open("ab") as f:
+        f.write(b"".join(record(i) for i in range(95, 120)))
+        f.write(b'{"partial')
+    assert index.offset_for_line(110) == line_offset(log_file_path, 110)
+    assert index.lines == 120
+    assert index_file_path(log_file_path).exists()
+
+    loaded = LogIndex(log_file_path, interval=10)
+    assert loaded.checkpoints == index.checkpoints
+    assert loaded.lines == 120
+    assert loaded.indexed_offset == index.indexed_offset
+
+
+def test_stale_index_is_reset(log_file_path):
+    LogIndex(log_file_path, interval=10).update()
+    log_file_path.write_bytes(record(0))
+    index = LogIndex(log_file_path, interval=10)
+    assert index.lines == 0
+    assert index.offset_for_line(1) == len(record(0))
+
+
+def leveled_record(i: int, level: int) -> bytes:
+    data = {
+        "text": f"line {i}",
+        "record": {"time": {"timestamp": 1000.0 + i}, "level": {"no": level}},
+    }
+    return (json.dumps(data) + "\n").encode("utf8")
+
+
+def test_blocks_by_level(tmp_path):
+    log_file_path = tmp_path / "query.log"
+    # an error on line 25, and a warning on line 42
+    levels = {25: 40, 42: 30}
+    log_file_path.write_bytes(
+        b"".join(leveled_record(i, levels.get(i, 20)) for i in range(55))
+    )
+    index = LogIndex(log_file_path, interval=10)
+    assert [checkpoint.line for checkpoint, _ in index.blocks()] == list(
+        range(0, 55, 10)
+    )
+    assert index.levels == [20, 20, 40, 20, 30, 20]
+    assert [checkpoint.line for checkpoint, _ in index.blocks(min_level=30)] == [
+        20,
+        40,
+    ]
+    blocks = index.blocks(line_offset(log_file_path, 33), min_level=30)
+    assert [(c.line, end) for c, end in blocks] == [
+        (40, line_offset(log_file_path, 50))
+    ]
+    assert LogIndex(log_file_path, interval=10).levels == index.levels
+
+
+def test_blocks_of_an_index_without_levels(log_file_path):
+    index = LogIndex(log_file_path, interval=10)
+    index.update()
+    # an index saved before levels were indexed
+    lines = index_file_path(log_file_path).read_text(encoding="utf8").splitlines()
+    index_file_path(log_file_path).write_text(
+        "".join(line + "\n" for line in lines if '"block"' not in line),
+        encoding="utf8",
+    )
+    loaded = LogIndex(log_file_path, interval=10)
+    assert len(loaded.blocks(min_level=40)) == len(loaded.checkpoints)
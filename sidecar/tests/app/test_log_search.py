@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from sidecar.app.log_index import LogIndex
+from sidecar.app.log_search import LogMatch, search_log
+
+
+def record(i: int, level: str, level_no: int, message: str) -> bytes:
+    data = {
+        "text": message,
+        "record": {
+            "time": {"timestamp": 1000.0 + i},
+            "level": {"name": level, "no": level_no},
+            "message": message,
+        },
+    }
+    return (json.dumps(data) + "\n").encode("utf8")
+
+
+@pytest.fixture(name="index")
+def _index(tmp_path):
+    log_file_path = tmp_path / "query.log"
+    log_file_path.write_bytes(
+        b"".join(
+            (
+                record(i, "ERROR", 40, f"failed {i}")
+                if i % 20 == 7
+                else record(i, "INFO", 20, f"step {i}")
+            )
+            for i in range(50)
+        )
+        + b"not a record\n"
+    )
+    return LogIndex(log_file_path, interval=10)
+
+
+def offsets(index) -> list[int]:
+    lines = index.log_file_path.read_bytes().splitlines(True)
+    return [sum(len(line) for line in lines[:i]) for i in range(len(lines))]
+
+
+def test_search_by_level(index):
+    matches = list(search_log(index, min_level=40))
+    assert matches == [
+        LogMatch(7, offsets(index)[7], 1007.0, "ERROR", "failed 7"),
+        LogMatch(27, offsets(index)[27], 1027.0, "ERROR", "failed 27"),
+        LogMatch(47, offsets(index)[47], 1047.0, "ERROR", "failed 47"),
+    ]
+
+
+def test_search_by_text(index):
+    assert [match.line for match in search_log(index, text="step 1")] == [1] + list(
+        range(10, 20)
+    )
+    assert list(search_log(index, text="not a")) == [
+        LogMatch(50, offsets(index)[50], None, None, "not a record")
+    ]
+
+
+def test_search_from_offset(index):
+    # from mid block, the line numbers are still counted
+    matches = search_log(index, start=offsets(index)[25], end=offsets(index)[45])
+    assert [match.line for match in matches] == list(range(25, 45))
+    matches = search_log(index, start=offsets(index)[8], min_level=40)
+    assert [match.line for match in matches] == [27, 47]
@@ -0,0 +1,106 @@
+import gzip
+
+import pytest
+
+from sidecar.app.log_segments import (
+    compress_segment,
+    delete_log,
+    iter_log_bytes,
+    list_segments,
+    log_size,
+    open_log,
+    rotate,
+)
+from sidecar.app.log_tailer import iter_file_chunks, read_lines
+
+
+@pytest.fixture(name="log_file_path")
+def _log_file_path(tmp_path):
+    return tmp_path / "query.log"
+
+
+def append(path, data: bytes):
+    with path.open("ab") as f:
+        f.write(data)
+
+
+def write_rotated(log_file_path, *parts: bytes, compress: bool = True):
+    """Writes each part but the last to a segment, and the last to the live file."""
+    for part in parts[:-1]:
+        append(log_file_path, part)
+        segment = rotate(log_file_path)
+        if compress:
+            compress_segment(segment, "gzip")
+    append(log_file_path, parts[-1])
+
+
+def test_unrotated_log(log_file_path):
+    append(log_file_path, b"one\ntwo\n")
+    assert [s.path for s in list_segments(log_file_path)] == [log_file_path]
+    assert log_size(log_file_path) == 8
+    with open_log(log_file_path) as f:
+        assert f.read() == b"one\ntwo\n"
+
+
+def test_missing_log(log_file_path):
+    assert log_size(log_file_path) == 0
+    with open_log(log_file_path) as f:
+        assert f.read() == b""
+
+
+def test_rotate_names_segment_by_end_offset(log_file_path):
+    append(log_file_path, b"one\n")
+    segment = rotate(log_file_path)
+    assert segment.name == "query.log.0000000000000004"
+    assert not log_file_path.exists()
+    assert rotate(log_file_path) is None
+    append(log_file_path, b"two\n")
+    assert rotate(log_file_path).name == "query.log.0000000000000008"
+
+
+def test_compress_segment(log_file_path):
+    append(log_file_path, b"one\n")
+    compressed = compress_segment(rotate(log_file_path), "gzip")
+    assert compressed.name == "query.log.0000000000000004.gz"
+    assert gzip.decompress(compressed.read_bytes()) == b"one\n"
+    assert [p.name for p in log_file_path.parent.iterdir()] == [compressed.name]
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_reads_across_segments(log_file_path, compress):
+    write_rotated(
+        log_file_path, b"one\n", b"two\nthree\n", b"four\n", compress=compress
+    )
+    assert log_size(log_file_path) == 19
+    with open_log(log_file_path) as f:
+        assert f.read() == b"one\ntwo\nthree\nfour\n"
+    with open_log(log_file_path) as f:
+        f.seek(6)
+        assert f.readline() == b"o\n"
+        assert f.readline() == b"three\n"
+    assert b"".join(iter_log_bytes(log_file_path, 2, 17, chunk_bytes=3)) == (
+        b"e\ntwo\nthree\nfou"
+    )
+    assert read_lines(log_file_path, 4) == b"two\nthree\nfour\n"
+    assert list(iter_file_chunks(log_file_path, chunk_bytes=6)) == [
+        b"one\n",
+        b"two\n",
+        b"three\n",
+        b"four\n",
+    ]
+
+
+def test_reader_follows_rotation(log_file_path):
+    append(log_file_path, b"one\n")
+    with open_log(log_file_path) as f:
+        assert f.read() == b"one\n"
+        append(log_file_path, b"two\n")
+        compress_segment(rotate(log_file_path), "gzip")
+        append(log_file_path, b"three\n")
+        assert f.read() == b"two\nthree\n"
+
+
+def test_delete_log(log_file_path):
+    write_rotated(log_file_path, b"one\n", b"two\n")
+    delete_log(log_file_path)
+    assert not list(log_file_path.parent.iterdir())
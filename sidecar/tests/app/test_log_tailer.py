@@ -0,0 +1,146 @@
+import asyncio
+import sys
+import time
+from unittest import mock
+
+import pytest
+
+from sidecar.app.log_tailer import (
+    READ_CHUNK_BYTES,
+    FileWatcher,
+    LogTailer,
+    LogTailers,
+    line_boundary,
+    read_file_batches,
+    read_lines,
+)
+
+
+def test_read_lines(tmp_path):
+    file_path = tmp_path / "test.log"
+    file_path.write_bytes(b"one\ntwo\nthr")
+    assert read_lines(file_path, 0) == b"one\ntwo\n"
+    assert read_lines(file_path, 4) == b"two\n"
+    assert read_lines(file_path, 0, 6) == b"one\n"
+    assert read_lines(file_path, 8) == b""
+    assert line_boundary(file_path) == 8
+
+
+def test_read_lines_long_line(tmp_path):
+    file_path = tmp_path / "test.log"
+    file_path.write_bytes(b"x" * (READ_CHUNK_BYTES + 10) + b"\n")
+    assert len(read_lines(file_path, 0)) == READ_CHUNK_BYTES
+
+
+def test_read_file_batches(tmp_path):
+    file_path = tmp_path / "test.log"
+    lines = [f"line {i}\n".encode() for i in range(20000)]
+    file_path.write_bytes(b"".join(lines))
+
+    async def read():
+        return [batch async for batch in read_file_batches(file_path)]
+
+    batches = asyncio.run(read())
+    assert len(batches) > 1
+    assert all(batch.endswith(b"\n") for batch in batches)
+    assert b"".join(batches) == b"".join(lines)
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is only on linux")
+def test_file_watcher_inotify(tmp_path):
+    file_path = tmp_path / "test.log"
+    file_path.touch()
+    watcher = FileWatcher(file_path, poll_interval=10)
+    assert watcher.uses_inotify
+
+    async def wait():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, file_path.write_text, "line\n")
+        start = time.perf_counter()
+        await watcher.wait(5)
+        return time.perf_counter() - start
+
+    assert asyncio.run(wait()) < 1
+    watcher.close()
+
+
+def test_file_watcher_polling_fallback(tmp_path):
+    file_path = tmp_path / "test.log"
+    file_path.touch()
+    with mock.patch(
+        "sidecar.app.log_tailer.inotify_watch", side_effect=OSError("no inotify")
+    ):
+        watcher = FileWatcher(file_path, poll_interval=0.01)
+    assert not watcher.uses_inotify
+    asyncio.run(watcher.wait(5))
+
+
+def test_tailer_broadcasts_to_subscribers(tmp_path):
+    file_path = tmp_path / "test.log"
+    file_path.write_text("before 1\nbefore 2\n")
+    running = True
+    tailers = LogTailers()
+
+    async def subscriber():
+        async with tailers.subscribe("abc", file_path, lambda: running) as tailer:
+            return b"".join([batch async for batch in tailer.batches()])
+
+    async def write():
+        nonlocal running
+        await asyncio.sleep(0.05)
+        assert tailers.stats == {"tailers": 1, "subscribers": 2}
+        for i in range(100):
+            with file_path.open("a") as f:
+                f.write(f"during {i}\n")
+            await asyncio.sleep(0)
+        running = False
+
+    async def main():
+        return await asyncio.gather(subscriber(), subscriber(), write())
+
+    first, second, _ = asyncio.run(main())
+    assert first == second == file_path.read_bytes()
+    assert tailers.stats == {"tailers": 0, "subscribers": 0}
+
+
+def test_tailer_subscriber_behind_buffer(tmp_path):
+    file_path = tmp_path / "test.log"
+    file_path.write_text("before\n")
+
+    async def main():
+        running = True
+        tailer = LogTailer(file_path, lambda: running, max_batches=1)
+        await tailer.start()
+        for i in range(5):
+            with file_path.open("a") as f:
+                f.write(f"during {i}\n")
+            # wait for the tailer to read each write as its own batch
+            while tailer.offset < file_path.stat().st_size:
+                await asyncio.sleep(0.01)
+        running = False
+        return b"".join([batch async for batch in tailer.batches()])
+
+    assert asyncio.run(main()) == file_path.read_bytes()
+
+
+def test_tailer_resumes_mid_batch(tmp_path):
+    file_path = tmp_path / "test.log"
+    file_path.write_text("")
+
+    async def main():
+        running = True
+        tailer = LogTailer(file_path, lambda: running)
+        await tailer.start()
+        for text in ["line 1\nline 2\n", "line 3\n"]:
+            with file_path.open("a") as f:
+                f.write(text)
+            while tailer.offset < file_path.stat().st_size:
+                await asyncio.sleep(0.01)
+        running = False
+        # offset 7 is the start of line 2, inside the first batch
+        batches = tailer.batches(7)
+        return b"".join(
+            [await asyncio.wait_for(anext(batches), 1) for _ in range(2)]
+        ) + b"".join([batch async for batch in batches])
+
+    assert asyncio.run(main()) == b"line 2\nline 3\n"
@@ -0,0 +1,104 @@
+import json
+
+from loguru import logger
+
+from sidecar.app.log_segments import open_log
+from sidecar.app.log_writer import QueryLogWriter, render_log_line
+
+
+def write_logs(log_writer, records):
+    sink_id = logger.add(log_writer, serialize=True, filter=QueryLogWriter.filter)
+    try:
+        for task, message in records:
+            if task is None:
+                logger.info(message)
+            else:
+                logger.bind(task=task).info(message)
+    finally:
+        logger.remove(sink_id)
+
+
+def read_messages(path):
+    with path.open("r", encoding="utf8") as f:
+        return [json.loads(line)["record"]["message"] for line in f]
+
+
+def test_routes_records_by_task(tmp_path):
+    log_writer = QueryLogWriter(tmp_path)
+    write_logs(
+        log_writer,
+        [("a", "one"), ("b", "two"), (None, "untagged"), ("a", "three")],
+    )
+    assert read_messages(log_writer.log_file_path("a")) == ["one", "three"]
+    assert read_messages(log_writer.log_file_path("b")) == ["two"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "a.log",
+        "a.txt",
+        "b.log",
+        "b.txt",
+    ]
+
+
+def test_writes_text_rendering(tmp_path):
+    log_writer = QueryLogWriter(tmp_path)
+    write_logs(log_writer, [("a", "one"), ("a", "two\nlines")])
+    text = log_writer.text_file_path("a").read_text(encoding="utf8")
+    # the same rendering as rendering the log after the fact
+    with log_writer.log_file_path("a").open("rb") as f:
+        assert text == "".join(render_log_line(line) for line in f)
+    assert " - one\n" in text
+    assert text.endswith(" - two\nlines\n")
+
+
+def test_bounded_open_files(tmp_path):
+    log_writer = QueryLogWriter(tmp_path, max_open_files=2)
+    sink_id = logger.add(log_writer, serialize=True, filter=QueryLogWriter.filter)
+    try:
+        for task in ["a", "b", "c", "a"]:
+            logger.bind(task=task).info(task)
+            assert len(log_writer.open_files) <= 2
+        assert log_writer.open_files == ["c", "a"]
+        log_writer.close("a")
+        assert log_writer.open_files == ["c"]
+    finally:
+        logger.remove(sink_id)
+    # removing the sink closes the remaining files
+    assert not log_writer.open_files
+    assert read_messages(log_writer.log_file_path("a")) == ["a", "a"]
+
+
+def test_drops_records_after_close(tmp_path):
+    log_writer = QueryLogWriter(tmp_path, max_closed_tasks=1)
+    write_logs(log_writer, [("a", "one")])
+    log_writer.close("a")
+    write_logs(log_writer, [("a", "late")])
+    # the closed file isn't reopened, to be held open until it's evicted
+    assert not log_writer.open_files
+    assert read_messages(log_writer.log_file_path("a")) == ["one"]
+
+    log_writer.reopen("a")
+    write_logs(log_writer, [("a", "two")])
+    assert read_messages(log_writer.log_file_path("a")) == ["one", "two"]
+
+    # only the last max_closed_tasks closed tasks are remembered
+    log_writer.close("a")
+    log_writer.close("b")
+    write_logs(log_writer, [("a", "three"), ("b", "late")])
+    assert read_messages(log_writer.log_file_path("a"))[-1] == "three"
+    assert not log_writer.log_file_path("b").exists()
+
+
+def test_rotates_and_compresses_segments(tmp_path):
+    log_writer = QueryLogWriter(tmp_path, max_segment_bytes=1024)
+    # removing the sink waits for the segments to be compressed
+    write_logs(log_writer, [("a", f"line {i}") for i in range(20)])
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert "a.log" in names and "a.txt" in names
+    segments = [name for name in names if name.startswith("a.log.")]
+    assert segments and all(name.endswith(".gz") for name in segments)
+    # every record is read back, in order, across the segments
+    with open_log(log_writer.log_file_path("a")) as f:
+        messages = [json.loads(line)["record"]["message"] for line in f]
+    assert messages == [f"line {i}" for i in range(20)]
+    with open_log(log_writer.text_file_path("a")) as f:
+        assert f.read().decode("utf8").count(" - line ") == 20
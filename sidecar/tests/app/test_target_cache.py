@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import pytest
+
+from sidecar.app.target_cache import TargetCache
+
+
+def build_target(repo_path: Path, compiled_id: str, size: int) -> Path:
+    target_path = repo_path / Path(f"target-{compiled_id}")
+    binary_path = target_path / Path("release/helper")
+    binary_path.parent.mkdir(parents=True)
+    binary_path.write_bytes(b"0" * size)
+    return target_path
+
+
+@pytest.fixture(name="target_cache")
+def _target_cache(tmp_path):
+    return TargetCache(manifest_path=tmp_path / Path("target_cache.json"))
+
+
+def test_lookup_hit_and_miss(tmp_path, target_cache):
+    binary_path = tmp_path / Path("target-abc/release/helper")
+    assert not target_cache.lookup("abc", binary_path)
+    target_path = build_target(tmp_path, "abc", 10)
+    target_cache.record_build("abc", target_path)
+    assert target_cache.lookup("abc", binary_path)
+    assert target_cache.hits == 1
+    assert target_cache.misses == 1
+    assert target_cache.hit_rate == 0.5
+    assert target_cache.stats["targets"][0]["hits"] == 1
+
+
+def test_manifest_persists(tmp_path, target_cache):
+    target_path = build_target(tmp_path, "abc", 10)
+    target_cache.record_build("abc", target_path)
+    target_cache2 = TargetCache(manifest_path=target_cache.manifest_path)
+    assert target_cache2.total_bytes == 10
+    assert target_cache2.stats["targets"][0]["compiled_id"] == "abc"
+
+
+def test_evict_least_recently_used(tmp_path, target_cache):
+    target_cache.max_bytes = 25
+    old_path = build_target(tmp_path, "old", 10)
+    target_cache.record_build("old", old_path)
+    new_path = build_target(tmp_path, "new", 10)
+    target_cache.record_build("new", new_path)
+    newest_path = build_target(tmp_path, "newest", 10)
+    target_cache.record_build("newest", newest_path)
+    assert not old_path.exists()
+    assert new_path.exists()
+    assert newest_path.exists()
+    assert target_cache.total_bytes == 20
+
+
+def test_evict_skips_pinned(tmp_path, target_cache):
+    target_cache.max_bytes = 15
+    old_path = build_target(tmp_path, "old", 10)
+    target_cache.record_build("old", old_path)
+    with target_cache.pin("old"), target_cache.pin("new"):
+        new_path = build_target(tmp_path, "new", 10)
+        target_cache.record_build("new", new_path)
+        assert old_path.exists()
+        assert new_path.exists()
+    assert target_cache.evict() == ["old"]
+    assert new_path.exists()
+
+
+def test_adopt_existing(tmp_path, target_cache):
+    build_target(tmp_path, "abc", 10)
+    target_cache.adopt_existing(tmp_path)
+    assert target_cache.total_bytes == 10
@@ -0,0 +1,131 @@
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+
+from sidecar.app.worktrees import WorktreePool
+
+
+def git(*args):
+    return subprocess.run(
+        ["git", *args], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@pytest.fixture(name="worktree_pool")
+def _worktree_pool(tmp_path):
+    repo_path = tmp_path / Path("ipa")
+    git("init", "-q", str(repo_path))
+    git(
+        "-C",
+        str(repo_path),
+        "-c",
+        "user.name=draft",
+        "-c",
+        "user.email=draft@example.com",
+        "commit",
+        "-q",
+        "--allow-empty",
+        "-m",
+        "first",
+    )
+    return WorktreePool(
+        repo_path=repo_path,
+        worktrees_path=tmp_path / Path("ipa-worktrees"),
+    )
+
+
+def add_worktree(worktree_pool, commit_hash):
+    worktree_path = worktree_pool.worktree_path(commit_hash)
+    git(
+        "-C",
+        str(worktree_pool.repo_path),
+        "worktree",
+        "add",
+        "--detach",
+        str(worktree_path),
+        commit_hash,
+    )
+    return worktree_path
+
+
+def commit(worktree_pool, message):
+    git(
+        "-C",
+        str(worktree_pool.repo_path),
+        "-c",
+        "user.name=draft",
+        "-c",
+        "user.email=draft@example.com",
+        "commit",
+        "-q",
+        "--allow-empty",
+        "-m",
+        message,
+    )
+    return git("-C", str(worktree_pool.repo_path), "rev-parse", "HEAD")
+
+
+def test_idle_worktree_kept(worktree_pool):
+    commit_hash = git("-C", str(worktree_pool.repo_path), "rev-parse", "HEAD")
+    with worktree_pool.use(commit_hash) as worktree_path:
+        add_worktree(worktree_pool, commit_hash)
+        with worktree_pool.use(commit_hash):
+            assert worktree_pool.active_worktrees == {commit_hash: 2}
+        assert worktree_path.exists()
+    assert worktree_path.exists()
+    assert worktree_pool.active_worktrees == {}
+    assert worktree_pool.idle_worktrees == [commit_hash]
+    # used again, so no longer idle
+    with worktree_pool.use(commit_hash):
+        assert worktree_pool.idle_worktrees == []
+    assert worktree_pool.idle_worktrees == [commit_hash]
+
+
+def test_least_recently_used_idle_worktree_removed(worktree_pool):
+    worktree_pool.max_idle_worktrees = 1
+    first_hash = git("-C", str(worktree_pool.repo_path), "rev-parse", "HEAD")
+    second_hash = commit(worktree_pool, "second")
+    with worktree_pool.use(first_hash) as first_path:
+        add_worktree(worktree_pool, first_hash)
+    with worktree_pool.use(second_hash) as second_path:
+        add_worktree(worktree_pool, second_hash)
+    assert not first_path.exists()
+    assert second_path.exists()
+    assert worktree_pool.idle_worktrees == [second_hash]
+    assert first_hash not in git("-C", str(worktree_pool.repo_path), "worktree", "list")
+
+
+def test_remove_skips_worktree_used_again(worktree_pool):
+    commit_hash = git("-C", str(worktree_pool.repo_path), "rev-parse", "HEAD")
+    with worktree_pool.use(commit_hash) as worktree_path:
+        add_worktree(worktree_pool, commit_hash)
+        worktree_pool.remove(commit_hash)
+        assert worktree_path.exists()
+
+
+def test_remove_waits_for_git_lock_without_lock(worktree_pool):
+    commit_hash = git("-C", str(worktree_pool.repo_path), "rev-parse", "HEAD")
+    worktree_path = add_worktree(worktree_pool, commit_hash)
+    with worktree_pool.git_lock:
+        thread = threading.Thread(target=worktree_pool.remove, args=(commit_hash,))
+        thread.start()
+        thread.join(timeout=0.1)
+        assert thread.is_alive()
+        # queries can still start using worktrees while remove waits
+        with worktree_pool.use(commit_hash):
+            pass
+    thread.join()
+    # idle again by the time remove got the git lock
+    assert worktree_path.exists()
+
+
+def test_gc_skips_worktrees_in_use(worktree_pool):
+    commit_hash = git("-C", str(worktree_pool.repo_path), "rev-parse", "HEAD")
+    stale_path = add_worktree(worktree_pool, "HEAD")
+    with worktree_pool.use(commit_hash):
+        worktree_path = add_worktree(worktree_pool, commit_hash)
+        worktree_pool.gc()
+        assert worktree_path.exists()
+        assert not stale_path.exists()